@@ -9,6 +9,7 @@ logger = logging.getLogger(__name__)
 
 REPLICA_ID = os.getenv('REPLICA_ID', 'replica-add')
 BACKEND_VERSION = 'v1.0.0-python'
+ADD_BATCH_LIMIT = int(os.getenv('ADD_BATCH_LIMIT', '1000'))
 
 
 def add_phrase_handler(event, context):
@@ -29,7 +30,7 @@ def add_phrase_handler(event, context):
             phrase = body.get('phrase', '').strip()
             author = body.get('author', '').strip()
             description = body.get('description', '').strip()
-            print(phrase, author, description)
+            logger.debug(f"Новая фраза: {phrase!r}, автор {author!r}, описание {description!r}")
 
             if not phrase or not author:
                 return {
@@ -79,4 +80,75 @@ def add_phrase_handler(event, context):
             'body': json.dumps(
                 {'error': 'Internal server error', 'backend_id': REPLICA_ID, 'backend_version': BACKEND_VERSION,
                  'details': str(e)}, ensure_ascii=False)
-        }
\ No newline at end of file
+        }
+
+
+def add_phrase_batch_handler(event, context):
+    """
+    Функция для пакетного добавления фраз
+    POST /phrase/batch
+    Body: { "phrases": [{ "phrase": "...", "author": "...", "description": "..." }, ...] }
+    """
+    try:
+        try:
+            if isinstance(event['body'], str):
+                body = json.loads(event['body'])
+            else:
+                body = event['body']
+
+            items = [{
+                'phrase': (item.get('phrase') or '').strip(),
+                'author': (item.get('author') or '').strip(),
+                'description': (item.get('description') or '').strip() or None,
+            } for item in body['phrases']]
+
+            if (not items or len(items) > ADD_BATCH_LIMIT
+                    or any(not item['phrase'] or not item['author'] for item in items)):
+                logger.warning("Пустая или слишком большая пачка, либо пропущена фраза или автор")
+                return {
+                    'statusCode': 400,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*',
+                                'Access-Control-Allow-Methods': 'POST, OPTIONS',
+                                'Access-Control-Allow-Headers': 'Content-Type'},
+                    'body': json.dumps({
+                        'error': f'From 1 to {ADD_BATCH_LIMIT} phrases with phrase and author are required',
+                        'backend_id': REPLICA_ID,
+                        'backend_version': BACKEND_VERSION
+                    }, ensure_ascii=False)
+                }
+
+        except (json.JSONDecodeError, TypeError, KeyError, AttributeError) as e:
+            return {
+                'statusCode': 400,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*',
+                            'Access-Control-Allow-Methods': 'POST, OPTIONS',
+                            'Access-Control-Allow-Headers': 'Content-Type'},
+                'body': json.dumps(
+                    {'error': 'Invalid request format', 'backend_id': REPLICA_ID, 'backend_version': BACKEND_VERSION},
+                    ensure_ascii=False)
+            }
+
+        logger.info(f"Добавляем {len(items)} фраз: {REPLICA_ID}")
+        result = ydb_client.aforism_searcher.add_batch(items)
+
+        return {
+            'statusCode': 201,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*',
+                        'Access-Control-Allow-Methods': 'POST, OPTIONS',
+                        'Access-Control-Allow-Headers': 'Content-Type'},
+            'body': json.dumps(
+                {'success': True, 'phrases': result, 'count': len(result), 'backend_id': REPLICA_ID,
+                 'backend_version': BACKEND_VERSION, 'timestamp': datetime.utcnow().isoformat()}, ensure_ascii=False)
+        }
+
+    except Exception as e:
+        logger.error(f"Ошибка в данных: {str(e)}", exc_info=True)
+        return {
+            'statusCode': 500,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*',
+                        'Access-Control-Allow-Methods': 'POST, OPTIONS',
+                        'Access-Control-Allow-Headers': 'Content-Type'},
+            'body': json.dumps(
+                {'error': 'Internal server error', 'backend_id': REPLICA_ID, 'backend_version': BACKEND_VERSION,
+                 'details': str(e)}, ensure_ascii=False)
+        }
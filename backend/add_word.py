@@ -9,6 +9,7 @@ logger = logging.getLogger(__name__)
 
 REPLICA_ID = os.getenv('REPLICA_ID', 'replica-add-word')
 BACKEND_VERSION = 'v1.0.0-python'
+ADD_BATCH_LIMIT = int(os.getenv('ADD_BATCH_LIMIT', '1000'))
 
 
 def add_word_handler(event, context):
@@ -28,7 +29,7 @@ def add_word_handler(event, context):
 
             word = body.get('word', '').strip()
             description = body.get('description', '').strip()
-            print(word, description)
+            logger.debug(f"Новое слово: {word!r}, описание {description!r}")
 
             if not word or not description:
                 logger.warning("Пропущено слово или описание")
@@ -79,3 +80,70 @@ def add_word_handler(event, context):
                                                'Access-Control-Allow-Headers': 'Content-Type'},
                 'body': json.dumps({'error': 'Internal server error', 'backend_id': REPLICA_ID,
                                     'backend_version': BACKEND_VERSION, 'details': str(e)}, ensure_ascii=False)}
+
+
+def add_word_batch_handler(event, context):
+    """
+    Функция для пакетного добавления слов
+    POST /word/batch
+    Body: { "words": [{ "word": "...", "description": "..." }, ...] }
+    """
+    try:
+        try:
+            if isinstance(event['body'], str):
+                body = json.loads(event['body'])
+            else:
+                body = event['body']
+
+            items = [{
+                'word': (item.get('word') or '').strip(),
+                'description': (item.get('description') or '').strip(),
+            } for item in body['words']]
+
+            if (not items or len(items) > ADD_BATCH_LIMIT
+                    or any(not item['word'] or not item['description'] for item in items)):
+                logger.warning("Пустая или слишком большая пачка, либо пропущено слово или описание")
+                return {
+                    'statusCode': 400,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*',
+                                'Access-Control-Allow-Methods': 'POST, OPTIONS',
+                                'Access-Control-Allow-Headers': 'Content-Type'},
+                    'body': json.dumps({
+                        'error': f'From 1 to {ADD_BATCH_LIMIT} words with word and description are required',
+                        'backend_id': REPLICA_ID,
+                        'backend_version': BACKEND_VERSION
+                    }, ensure_ascii=False)
+                }
+
+        except (json.JSONDecodeError, TypeError, KeyError, AttributeError) as e:
+            return {'statusCode': 400,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*',
+                                'Access-Control-Allow-Methods': 'POST, OPTIONS',
+                                'Access-Control-Allow-Headers': 'Content-Type'}, 'body': json.dumps(
+                    {'error': 'Invalid request format', 'backend_id': REPLICA_ID, 'backend_version': BACKEND_VERSION},
+                    ensure_ascii=False)}
+
+        logger.info(f"Добавляем {len(items)} слов: {REPLICA_ID}")
+        result = ydb_client.word_searcher.add_batch(items)
+
+        return {
+            'statusCode': 201,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*',
+                        'Access-Control-Allow-Methods': 'POST, OPTIONS',
+                        'Access-Control-Allow-Headers': 'Content-Type'},
+            'body': json.dumps({
+                'success': True,
+                'words': result,
+                'count': len(result),
+                'backend_id': REPLICA_ID,
+                'backend_version': BACKEND_VERSION,
+                'timestamp': datetime.utcnow().isoformat()
+            }, ensure_ascii=False)
+        }
+    except Exception as e:
+        logger.error(f"Ошибка в данных: {str(e)}", exc_info=True)
+        return {'statusCode': 500, 'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*',
+                                               'Access-Control-Allow-Methods': 'POST, OPTIONS',
+                                               'Access-Control-Allow-Headers': 'Content-Type'},
+                'body': json.dumps({'error': 'Internal server error', 'backend_id': REPLICA_ID,
+                                    'backend_version': BACKEND_VERSION, 'details': str(e)}, ensure_ascii=False)}
@@ -0,0 +1,117 @@
+import logging
+import os
+
+import numpy as np
+
+logger = logging.getLogger('ann_index')
+
+# Сколько кластеров просматривает запрос. benchmarks/ann_recall.py (100 тыс. строк, 384 измерения, limit=5):
+# probe=8 — полнота 0.91 при ускорении ~22x, 16 — 0.96 и ~14x, 32 — 0.985 и ~8x, 64 — 0.995 и ~4x.
+# На слабо кластеризованных корпусах полнота при том же probe заметно ниже (0.3–0.8 при 16), поэтому
+# по умолчанию 32; когда задержка важнее полноты, IVF_PROBE уменьшают, проверив корпус тем же отчётом
+DEFAULT_PROBE = 32
+
+
+class IVFIndex:
+    """
+    Приближённый поиск (IVF) на чистом NumPy: векторы разбиваются сферическим k-means на n_lists
+    кластеров, запрос просматривает n_probe ближайших кластеров. Кандидаты затем точно
+    переоцениваются по исходной матрице в Searcher._top_k.
+    n_probe — главный параметр компромисса полнота/задержка
+    """
+
+    def __init__(self, n_lists: int = 0, n_probe: int = DEFAULT_PROBE, min_rows: int = 10000,
+                 train_iterations: int = 10, train_sample: int = 32, seed: int = 0):
+        self.n_lists = n_lists
+        self.min_rows = min_rows
+        self.n_probe = n_probe
+        self.train_iterations = train_iterations
+        self.train_sample = train_sample
+        self.seed = seed
+        self.centroids = None
+        # _lists[i] — видимый читателям срез _buffers[i]; вставка пишет за его концом и подменяет срез,
+        # так что ёмкость растёт удвоением, а не копированием всего списка на каждую вставку
+        self._lists = []
+        self._buffers = []
+        self._assignment = []
+
+    def __len__(self) -> int:
+        return len(self._assignment)
+
+    @property
+    def built(self) -> bool:
+        return self.centroids is not None
+
+    def build(self, vectors: np.ndarray) -> None:
+        n_lists = self.n_lists or max(1, int(2 * np.sqrt(len(vectors))))
+        n_lists = min(n_lists, len(vectors))
+        rng = np.random.default_rng(self.seed)
+
+        sample_size = min(len(vectors), n_lists * self.train_sample)
+        sample = vectors[rng.choice(len(vectors), sample_size, replace=False)]
+        centroids = sample[rng.choice(sample_size, n_lists, replace=False)].astype(np.float32)
+
+        for _ in range(self.train_iterations):
+            labels = np.argmax(sample @ centroids.T, axis=1)
+            order = np.argsort(labels, kind='stable')
+            present, starts = np.unique(labels[order], return_index=True)
+            sums = np.zeros_like(centroids)
+            sums[present] = np.add.reduceat(sample[order], starts, axis=0)
+            empty = np.ones(n_lists, dtype=bool)
+            empty[present] = False
+            sums[empty] = sample[rng.choice(sample_size, int(empty.sum()))]
+            centroids = sums / np.maximum(np.linalg.norm(sums, axis=1, keepdims=True), 1e-12)
+
+        self.centroids = centroids
+        labels = self._assign(vectors)
+        order = np.argsort(labels, kind='stable')
+        bounds = np.searchsorted(labels[order], np.arange(n_lists + 1))
+        self._lists = [order[bounds[i]:bounds[i + 1]].astype(np.intp) for i in range(n_lists)]
+        self._buffers = list(self._lists)
+        self._assignment = labels.tolist()
+        logger.info(f"IVF-индекс построен: {len(vectors)} векторов, {n_lists} кластеров, n_probe={self.n_probe}")
+
+    def _assign(self, vectors: np.ndarray, chunk: int = 65536) -> np.ndarray:
+        return np.concatenate([
+            np.argmax(vectors[start:start + chunk] @ self.centroids.T, axis=1)
+            for start in range(0, len(vectors), chunk)
+        ]) if len(vectors) else np.empty(0, dtype=np.intp)
+
+    def add(self, index: int, vector) -> None:
+        label = int(np.argmax(self.centroids @ vector))
+        if index < len(self._assignment):
+            old = self._assignment[index]
+            # замена строки редка: копия одного списка без неё, читатели видят старый или новый срез целиком
+            self._buffers[old] = self._lists[old] = self._lists[old][self._lists[old] != index]
+            self._assignment[index] = label
+        else:
+            self._assignment.append(label)
+        self._append(label, index)
+
+    def _append(self, label: int, index: int) -> None:
+        buffer, size = self._buffers[label], len(self._lists[label])
+        if size == len(buffer):
+            buffer = np.empty(max(16, 2 * size), dtype=np.intp)
+            buffer[:size] = self._lists[label]
+            self._buffers[label] = buffer
+        buffer[size] = index
+        self._lists[label] = buffer[:size + 1]
+
+    def candidates(self, query_vector) -> np.ndarray:
+        n_probe = min(self.n_probe, len(self._lists))
+        probe = np.argpartition(self.centroids @ query_vector, -n_probe)[-n_probe:]
+        return np.concatenate([self._lists[i] for i in probe])
+
+
+def create_ann_index() -> IVFIndex | None:
+    """
+    ANN_INDEX=ivf включает IVF-индекс для корпусов от ANN_MIN_ROWS строк;
+    IVF_LISTS (0 — авто, ~2*sqrt(N)) и IVF_PROBE задают его параметры
+    """
+    if os.getenv('ANN_INDEX', '').lower() != 'ivf':
+        return None
+    return IVFIndex(
+        n_lists=int(os.getenv('IVF_LISTS', '0')),
+        n_probe=int(os.getenv('IVF_PROBE', str(DEFAULT_PROBE))),
+        min_rows=int(os.getenv('ANN_MIN_ROWS', '10000')),
+    )
@@ -1,56 +1,287 @@
 import os
+import json
 import logging
-import ydb
-import ydb.iam
+import threading
 
-from backend.aforism_searcher import AforismSearcher
-from backend.word_searcher import WordSearcher
+from metrics import stage
+from query_cache import QueryEmbeddingCache
+from response_cache import ResponseCache
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+UPSERT_BATCH_SIZE = 100
+BULK_UPSERT_BATCH_SIZE = int(os.getenv('YDB_BULK_UPSERT_BATCH_SIZE', '1000'))
+PAGE_SIZE = int(os.getenv('YDB_PAGE_SIZE', '1000'))
+
+
+def _decode(value):
+    return value.decode() if isinstance(value, bytes) else value
+
+
+def _settings(timeout: float = 10, operation_timeout: float = 8):
+    import ydb
+
+    return ydb.BaseRequestSettings().with_timeout(timeout).with_operation_timeout(operation_timeout)
+
+
+def _execute(session, query: str, parameters: dict, settings=None):
+    """
+    Выполняет запрос с объявленными параметрами. session.prepare кэширует план в сессии по тексту запроса,
+    поэтому тексты запросов постоянны, а все значения передаются параметрами
+    """
+    prepared = session.prepare(query)
+    return session.transaction().execute(prepared, parameters, commit_tx=True, settings=settings or _settings())
+
+
+# Схема таблиц (см. ydb_schema.yql): типы для DECLARE и bulk_upsert
+TABLE_COLUMNS = {
+    'aforisms': {
+        'id': 'Utf8', 'phrase': 'Utf8', 'author': 'Utf8', 'description': 'Utf8',
+        'embedding': 'Utf8', 'embedding_model': 'Utf8', 'content_hash': 'Utf8', 'version': 'Uint64',
+    },
+    'words': {
+        'id': 'Utf8', 'word': 'Utf8', 'description': 'Utf8',
+        'embedding': 'Utf8', 'embedding_model': 'Utf8', 'content_hash': 'Utf8', 'version': 'Uint64',
+    },
+}
+
+CORPUS_VERSION_QUERY = """
+DECLARE $name AS Utf8;
+SELECT version FROM corpus_versions WHERE name = $name;
+"""
+
+# версия корпуса только растёт: запись со старой версией (медленный писатель) не откатывает её назад,
+# иначе реплики, догружающие изменения с version - SYNC_OVERLAP_US, пропустили бы строки между ними
+UPSERT_CORPUS_VERSION = """
+$current = (SELECT version FROM corpus_versions WHERE name = $name);
+UPSERT INTO corpus_versions (name, version) VALUES ($name, MAX_OF(COALESCE($current, 0ul), $corpus_version));
+"""
+
+BUMP_CORPUS_VERSION = """
+DECLARE $name AS Utf8;
+DECLARE $corpus_version AS Uint64;
+""" + UPSERT_CORPUS_VERSION
+
+
+def _rows_type(table: str, columns: list[str]) -> str:
+    fields = ', '.join(f"{column}: {TABLE_COLUMNS[table][column]}?" for column in columns)
+    return f"List<Struct<{fields}>>"
+
 
 class YDBClient:
+    """
+    Клиент создаётся дёшево при импорте: драйвер, пул сессий, провайдер эмбеддингов и поисковики
+    (а с ними ydb и numpy) создаются и импортируются при первом обращении и дальше переиспользуются
+    """
+
     def __init__(self):
         self.endpoint: str = os.getenv('YDB_ENDPOINT')
         self.database: str = os.getenv('YDB_DATABASE')
         self.driver = None
         self.pool = None
 
-        self.aforism_searcher = AforismSearcher(self)
-        self.word_searcher = WordSearcher(self)
+        self.query_cache = QueryEmbeddingCache.from_env()
+        self.response_cache = ResponseCache.from_env()
+        self._embedding_provider = None
+        self._aforism_searcher = None
+        self._word_searcher = None
+        self._lock = threading.RLock()
+
+    @property
+    def embedding_provider(self):
+        if self._embedding_provider is None:
+            with self._lock:
+                if self._embedding_provider is None:
+                    from embeddings import create_embedding_provider
+
+                    self._embedding_provider = create_embedding_provider()
+        return self._embedding_provider
+
+    @property
+    def aforism_searcher(self):
+        if self._aforism_searcher is None:
+            with self._lock:
+                if self._aforism_searcher is None:
+                    from aforism_searcher import AforismSearcher
+
+                    self._aforism_searcher = AforismSearcher(self, self.embedding_provider, self.query_cache)
+        return self._aforism_searcher
+
+    @property
+    def word_searcher(self):
+        if self._word_searcher is None:
+            with self._lock:
+                if self._word_searcher is None:
+                    from word_searcher import WordSearcher
+
+                    self._word_searcher = WordSearcher(self, self.embedding_provider, self.query_cache)
+        return self._word_searcher
 
     def connect(self) -> None:
-        if not self.driver:
+        if self.driver:
+            return
+        with self._lock, stage('connect'):
+            if self.driver:
+                return
+            import ydb
+            import ydb.iam
+
             logger.info(f"Подключение к YDB: {self.endpoint}, {self.database}")
-            creds = ydb.iam.MetadataUrlCredentials()
+            if os.getenv('YDB_ANONYMOUS_CREDENTIALS') == '1':
+                # локальный контейнер YDB
+                creds = ydb.AnonymousCredentials()
+            else:
+                creds = ydb.iam.MetadataUrlCredentials()
 
-            print(f"Creds: {creds}")
+            logger.debug(f"Creds: {creds}")
             driver_config = ydb.DriverConfig(
                 endpoint=self.endpoint,
                 database=self.database,
                 credentials=creds
             )
+            driver = None
             try:
-                self.driver = ydb.Driver(driver_config)
-                print(f"Driver: {self.driver}")
-                self.driver.wait(timeout=30, fail_fast=True)
-                print("Дождались")
-                self.pool = ydb.SessionPool(self.driver, size=10)
-                print(f"Pool: {self.pool}")
+                driver = ydb.Driver(driver_config)
+                logger.debug(f"Driver: {driver}")
+                driver.wait(timeout=30, fail_fast=True)
+                self.pool = ydb.SessionPool(driver, size=10)
+                logger.debug(f"Pool: {self.pool}")
+                # драйвер публикуется последним: другие потоки не увидят его без готового пула
+                self.driver = driver
                 logger.info("Соединение с YDB установлено")
             except Exception as e:
                 logger.error(f"Не удалось подключиться к YDB: {e}", exc_info=True)
-                if self.driver:
-                    self.driver.stop()
+                if driver:
+                    driver.stop()
                 self.driver = None
 
+    def iter_pages(self, table: str, columns: tuple[str, ...], since_version: int | None = None,
+                   page_size: int = PAGE_SIZE):
+        """
+        Читает таблицу страницами (keyset-пагинация), чтобы не упираться в лимит 1000 строк на результат
+        и таймаут одного запроса. Без since_version обходит всю таблицу по id, с ним — только строки
+        с version > since_version по индексу version_index (колонки должны включать version).
+        Каждая страница отдаётся в колоночном виде: {колонка: [значения]}
+        """
+        if since_version is None:
+            query = f"""
+            DECLARE $last_id AS Utf8;
+            DECLARE $limit AS Uint64;
+            SELECT {', '.join(columns)} FROM {table}
+            WHERE id > $last_id
+            ORDER BY id LIMIT $limit;
+            """
+        else:
+            query = f"""
+            DECLARE $version AS Uint64;
+            DECLARE $last_id AS Utf8;
+            DECLARE $limit AS Uint64;
+            SELECT {', '.join(columns)} FROM {table} VIEW version_index
+            WHERE version >= $version AND (version > $version OR id > $last_id)
+            ORDER BY version, id LIMIT $limit;
+            """
+        parameters = {'$last_id': '', '$limit': page_size}
+        if since_version is not None:
+            # строго version > since_version: с пустым $last_id условие пропускает всю версию since_version + 1
+            parameters['$version'] = since_version + 1
+
+        while True:
+            def get_page(session, parameters=dict(parameters)):
+                rows = _execute(session, query, parameters)[0].rows
+                return {column: [_decode(getattr(row, column)) for row in rows] for column in columns}
+
+            page = self.pool.retry_operation_sync(get_page)
+            if not page['id']:
+                return
+            yield page
+            if len(page['id']) < page_size:
+                return
+            parameters['$last_id'] = page['id'][-1]
+            if since_version is not None:
+                parameters['$version'] = page['version'][-1]
+
+    def upsert_rows(self, table: str, rows: list[dict], corpus_version: int | None = None) -> None:
+        """
+        UPSERT строк пачками одним параметризованным запросом на пачку; обновляются только переданные колонки.
+        corpus_version в той же транзакции записывается в corpus_versions (если он больше сохранённого) —
+        по нему другие реплики узнают, что корпус изменился
+        """
+        columns = list(rows[0])
+        if corpus_version is None:
+            query = f"""
+            DECLARE $rows AS {_rows_type(table, columns)};
+            UPSERT INTO {table} SELECT * FROM AS_TABLE($rows);
+            """
+        else:
+            query = f"""
+            DECLARE $rows AS {_rows_type(table, columns)};
+            DECLARE $name AS Utf8;
+            DECLARE $corpus_version AS Uint64;
+            UPSERT INTO {table} SELECT * FROM AS_TABLE($rows);
+            """ + UPSERT_CORPUS_VERSION
+
+        for start in range(0, len(rows), UPSERT_BATCH_SIZE):
+            parameters = {'$rows': [{column: row.get(column) for column in columns}
+                                    for row in rows[start:start + UPSERT_BATCH_SIZE]]}
+            if corpus_version is not None:
+                parameters.update({'$name': table, '$corpus_version': corpus_version})
+
+            def execute_query(session, parameters=parameters):
+                _execute(session, query, parameters)
+
+            self.pool.retry_operation_sync(execute_query)
+
+    def bulk_upsert(self, table: str, rows: list[dict], corpus_version: int | None = None) -> None:
+        """
+        Массовая запись через BulkUpsert — без компиляции запроса и транзакции, пачками по BULK_UPSERT_BATCH_SIZE.
+        Версия корпуса обновляется после записи всех строк
+        """
+        import ydb
+
+        columns = list(rows[0])
+        column_types = ydb.BulkUpsertColumns()
+        for column in columns:
+            column_types.add_column(column, ydb.OptionalType(getattr(ydb.PrimitiveType, TABLE_COLUMNS[table][column])))
+
+        path = f"{self.database}/{table}"
+        for start in range(0, len(rows), BULK_UPSERT_BATCH_SIZE):
+            batch = [{column: row.get(column) for column in columns}
+                     for row in rows[start:start + BULK_UPSERT_BATCH_SIZE]]
+            self.driver.table_client.bulk_upsert(path, batch, column_types)
+
+        if corpus_version is not None:
+            self.pool.retry_operation_sync(
+                lambda session: _execute(session, BUMP_CORPUS_VERSION,
+                                         {'$name': table, '$corpus_version': corpus_version})
+            )
+
+    def get_corpus_version(self, table: str) -> int:
+        """
+        Версия корпуса таблицы — время последней записи в неё (0, если записей через add_data не было)
+        """
+        def execute_query(session):
+            rows = _execute(session, CORPUS_VERSION_QUERY, {'$name': table}, _settings(3, 2))[0].rows
+            return rows[0].version if rows else 0
+
+        return self.pool.retry_operation_sync(execute_query) or 0
+
+    def backfill_embeddings(self) -> None:
+        for searcher in (self.aforism_searcher, self.word_searcher):
+            try:
+                count = searcher.backfill_embeddings()
+                logger.info(f"Эмбеддинги {searcher.table} актуальны: {count} строк")
+            except Exception as e:
+                logger.error(f"Ошибка при дозаполнении эмбеддингов {searcher.table}: {e}", exc_info=True)
+
     def initialize_database(self) -> None:
         self.connect()
         if not self.pool:
             logger.error("Инициализация БД невозможна, нет пула сессий.")
             return
 
+        import ydb
+
         def create_tables(session) -> None:
             try:
                 session.execute_scheme_query("""...""")
@@ -87,4 +318,83 @@ class YDBClient:
             self.driver.stop()
 
 
-ydb_client = YDBClient()
+class InMemoryYDBClient(YDBClient):
+    """
+    Заменитель YDB в памяти процесса для локального запуска, импорта и бенчмарков: те же iter_pages,
+    upsert_rows, bulk_upsert и get_corpus_version поверх словарей {id: строка}.
+    С path таблицы читаются из JSON-файла при создании и сохраняются в него при close()
+    """
+
+    def __init__(self, path: str | None = None):
+        super().__init__()
+        self.path = path
+        self.tables: dict[str, dict[str, dict]] = {'aforisms': {}, 'words': {}}
+        self.corpus_versions: dict[str, int] = {}
+        self._data_lock = threading.Lock()
+        if path and os.path.isfile(path):
+            with open(path, encoding='utf-8') as f:
+                dump = json.load(f)
+            self.tables.update({table: {row['id']: row for row in rows} for table, rows in dump['tables'].items()})
+            self.corpus_versions.update(dump.get('corpus_versions', {}))
+            logger.info(f"Загружена БД в памяти из {path}: "
+                        f"{', '.join(f'{table} {len(rows)}' for table, rows in self.tables.items())}")
+
+    def connect(self) -> None:
+        # пул и драйвер не нужны, но проверки `if not ydb_client.pool` должны проходить
+        self.pool = self.driver = self
+
+    def iter_pages(self, table: str, columns: tuple[str, ...], since_version: int | None = None,
+                   page_size: int = 1000):
+        with self._data_lock:
+            rows = list(self.tables[table].values())
+        if since_version is None:
+            rows.sort(key=lambda row: row['id'])
+        else:
+            rows = sorted((row for row in rows if (row.get('version') or 0) > since_version),
+                          key=lambda row: (row['version'], row['id']))
+        for start in range(0, len(rows), page_size):
+            page = rows[start:start + page_size]
+            yield {column: [row.get(column) for row in page] for column in columns}
+
+    def upsert_rows(self, table: str, rows: list[dict], corpus_version: int | None = None) -> None:
+        with self._data_lock:
+            stored = self.tables.setdefault(table, {})
+            for row in rows:
+                stored.setdefault(row['id'], {}).update(row)
+            if corpus_version is not None:
+                self.corpus_versions[table] = max(self.corpus_versions.get(table, 0), corpus_version)
+
+    bulk_upsert = upsert_rows
+
+    def get_corpus_version(self, table: str) -> int:
+        return self.corpus_versions.get(table, 0)
+
+    def initialize_database(self) -> None:
+        self.connect()
+
+    def close(self):
+        if not self.path:
+            return
+        with self._data_lock:
+            dump = {
+                'tables': {table: list(rows.values()) for table, rows in self.tables.items()},
+                'corpus_versions': self.corpus_versions,
+            }
+        tmp = f"{self.path}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(dump, f, ensure_ascii=False)
+        os.replace(tmp, self.path)
+        logger.info(f"БД в памяти сохранена в {self.path}")
+
+
+def create_client() -> YDBClient:
+    """
+    Клиент по конфигурации: DB_BACKEND = ydb (по умолчанию) | memory — заменитель в памяти,
+    MEMORY_DB_PATH — JSON-файл, в котором он хранит таблицы между запусками
+    """
+    if os.getenv('DB_BACKEND', 'ydb') == 'memory':
+        return InMemoryYDBClient(os.getenv('MEMORY_DB_PATH'))
+    return YDBClient()
+
+
+ydb_client = create_client()
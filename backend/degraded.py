@@ -0,0 +1,25 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# Причины деградации текущего запроса: 'lexical' — ответ только по словам, без модели,
+# 'stale_embedding' — по устаревшему эмбеддингу запроса из кэша
+_reasons: ContextVar[list[str] | None] = ContextVar('degraded_reasons', default=None)
+
+
+@contextmanager
+def track_degraded():
+    """
+    Собирает причины деградации внутри блока; пустой список — ответ полноценный
+    """
+    reasons = []
+    token = _reasons.set(reasons)
+    try:
+        yield reasons
+    finally:
+        _reasons.reset(token)
+
+
+def mark_degraded(reason: str) -> None:
+    reasons = _reasons.get()
+    if reasons is not None and reason not in reasons:
+        reasons.append(reason)
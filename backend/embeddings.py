@@ -0,0 +1,372 @@
+import hashlib
+import logging
+import os
+import re
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
+
+import numpy as np
+
+from metrics import register_gauge
+
+logger = logging.getLogger('embeddings')
+
+DEFAULT_MODEL_ID = "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
+BATCH_SIZE = int(os.getenv('EMBEDDING_BATCH_SIZE', '64'))
+CONCURRENCY = int(os.getenv('EMBEDDING_CONCURRENCY', '4'))
+RETRIES = int(os.getenv('EMBEDDING_RETRIES', '3'))
+# таймаут HTTP-вызова HF API; должен быть заметно меньше таймаута функции (30 с)
+EMBEDDING_TIMEOUT = float(os.getenv('EMBEDDING_TIMEOUT', '10'))
+# защита интерактивных вызовов удалённой модели (HF API): бюджет времени на запрос,
+# повторы внутри бюджета, дублирующий (hedged) вызов после задержки по процентилю прошлых задержек
+EMBEDDING_GUARD = os.getenv('EMBEDDING_GUARD', '1') == '1'
+EMBEDDING_BUDGET_MS = float(os.getenv('EMBEDDING_BUDGET_MS', '3000'))
+EMBEDDING_GUARD_RETRIES = int(os.getenv('EMBEDDING_GUARD_RETRIES', '1'))
+EMBEDDING_HEDGE_PERCENTILE = float(os.getenv('EMBEDDING_HEDGE_PERCENTILE', '95'))
+EMBEDDING_HEDGE_MIN_MS = float(os.getenv('EMBEDDING_HEDGE_MIN_MS', '50'))
+# после BREAKER_FAILURES неудач подряд модель не вызывается BREAKER_COOLDOWN секунд
+BREAKER_FAILURES = int(os.getenv('EMBEDDING_BREAKER_FAILURES', '5'))
+BREAKER_COOLDOWN = float(os.getenv('EMBEDDING_BREAKER_COOLDOWN', '30'))
+
+
+class EmbeddingProvider(ABC):
+    model_id: str = None
+
+    @abstractmethod
+    def embed(self, texts: list[str]) -> np.ndarray:
+        """
+        Возвращает нормализованные эмбеддинги (float32, по строке на текст); при ошибке бросает исключение
+        """
+        pass
+
+    def embed_bulk(self, texts: list[str]) -> np.ndarray:
+        """
+        То же для офлайн-пачек (импорт, переиндексация): без ограничений интерактивного запроса
+        """
+        return self.embed(texts)
+
+
+class HFApiEmbeddingProvider(EmbeddingProvider):
+    def __init__(self, model_id: str = DEFAULT_MODEL_ID, timeout: float = EMBEDDING_TIMEOUT):
+        from huggingface_hub import InferenceClient
+
+        api_token = os.environ.get("HF_TOKEN")
+        if not api_token:
+            logger.error("HF_TOKEN не найден в переменных окружения!")
+            raise ValueError("HF_TOKEN не найден в переменных окружения!")
+
+        self.model_id = model_id
+        self.client = InferenceClient(token=api_token, timeout=timeout)
+
+    def embed(self, texts: list[str]) -> np.ndarray:
+        embeddings = self.client.feature_extraction(
+            text=texts,
+            model=self.model_id,
+            normalize=True,
+        )
+        return np.asarray(embeddings, dtype=np.float32)
+
+
+class LocalEmbeddingProvider(EmbeddingProvider):
+    """
+    Модель в процессе через sentence-transformers; backend='onnx' использует ONNX-экспорт той же модели
+    """
+
+    def __init__(self, model_id: str = DEFAULT_MODEL_ID, backend: str = 'torch'):
+        from sentence_transformers import SentenceTransformer
+
+        self.model_id = model_id
+        self.model = SentenceTransformer(model_id, backend=backend)
+
+    def embed(self, texts: list[str]) -> np.ndarray:
+        return self.model.encode(texts, normalize_embeddings=True, convert_to_numpy=True).astype(np.float32)
+
+
+class FakeEmbeddingProvider(EmbeddingProvider):
+    """
+    Детерминированные эмбеддинги для тестов: сумма псевдослучайных векторов токенов,
+    так что тексты с общими словами получаются похожими. latency (с) — задержка на вызов,
+    имитирующая сетевой API
+    """
+
+    def __init__(self, dim: int = 384, model_id: str = 'fake-embeddings', latency: float = 0.0):
+        self.dim = dim
+        self.model_id = model_id
+        self.latency = latency
+
+    def _token_vector(self, token: str) -> np.ndarray:
+        seed = int.from_bytes(hashlib.sha256(token.encode('utf-8')).digest()[:8], 'little')
+        return np.random.default_rng(seed).standard_normal(self.dim)
+
+    def embed(self, texts: list[str]) -> np.ndarray:
+        if self.latency:
+            time.sleep(self.latency)
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for i, text in enumerate(texts):
+            for token in re.findall(r'\w+', (text or '').lower()):
+                vectors[i] += self._token_vector(token)
+            norm = np.linalg.norm(vectors[i])
+            if norm:
+                vectors[i] /= norm
+        return vectors
+
+
+class CircuitOpenError(RuntimeError):
+    pass
+
+
+class CircuitBreaker:
+    """
+    Размыкатель: после failures неудач подряд вызовы отклоняются сразу, без сети, на cooldown секунд;
+    затем пропускается один пробный вызов — успех замыкает цепь, неудача размыкает её снова
+    """
+
+    def __init__(self, failures: int = 5, cooldown: float = 30.0):
+        self.failures = failures
+        self.cooldown = cooldown
+        self._consecutive = 0
+        self._opened_at = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._opened_at is None:
+                return 'closed'
+            return 'half-open' if time.monotonic() - self._opened_at >= self.cooldown else 'open'
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if self._trial or time.monotonic() - self._opened_at < self.cooldown:
+                return False
+            self._trial = True
+            return True
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self._opened_at is not None:
+                logger.info("Модель эмбеддингов снова отвечает, цепь замкнута")
+            self._consecutive = 0
+            self._opened_at = None
+            self._trial = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._consecutive += 1
+            if self._trial or (self._opened_at is None and self._consecutive >= self.failures):
+                logger.warning(f"Модель эмбеддингов не отвечает ({self._consecutive} неудач подряд), "
+                               f"цепь разомкнута на {self.cooldown:g} с")
+                self._opened_at = time.monotonic()
+            self._trial = False
+
+
+class LatencyTracker:
+    """
+    Скользящее окно длительностей успешных вызовов (мс) для задержки дублирующего вызова
+    """
+
+    def __init__(self, window: int = 256, min_samples: int = 20):
+        self.min_samples = min_samples
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, elapsed_ms: float) -> None:
+        with self._lock:
+            self._samples.append(elapsed_ms)
+
+    def percentile(self, p: float) -> float | None:
+        with self._lock:
+            if len(self._samples) < self.min_samples:
+                return None
+            samples = sorted(self._samples)
+        return samples[min(len(samples) - 1, int(len(samples) * p / 100))]
+
+
+class GuardedEmbeddingProvider(EmbeddingProvider):
+    """
+    Обёртка удалённого провайдера с ограниченной задержкой. Интерактивный вызов (embed) укладывается
+    в budget_ms: если первый вызов не ответил за p-й процентиль прошлых задержек, параллельно идёт дубль
+    и берётся первый ответ; неудачи повторяются, пока есть бюджет и retries. По исчерпании бюджета —
+    исключение, а зависший вызов дорабатывает в фоне (не больше max_workers одновременно).
+    Размыкатель общий для всех вызовов: пока модель недоступна, эмбеддинг сразу отклоняется
+    и поиск без задержки уходит в деградированный режим. Пачки embed_bulk идут в провайдер напрямую,
+    со своими повторами в embed_in_batches, но тоже через размыкатель
+    """
+
+    def __init__(self, provider: EmbeddingProvider, budget_ms: float = EMBEDDING_BUDGET_MS,
+                 retries: int = EMBEDDING_GUARD_RETRIES, hedge_percentile: float = EMBEDDING_HEDGE_PERCENTILE,
+                 hedge_min_ms: float = EMBEDDING_HEDGE_MIN_MS, breaker: CircuitBreaker | None = None,
+                 max_workers: int = 8):
+        self.provider = provider
+        self.model_id = provider.model_id
+        self.budget_ms = budget_ms
+        self.retries = retries
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_ms = hedge_min_ms
+        self.breaker = breaker or CircuitBreaker(BREAKER_FAILURES, BREAKER_COOLDOWN)
+        self.latencies = LatencyTracker()
+        self.hedged = 0
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='embed')
+
+    def _call(self, texts: list[str]) -> tuple[np.ndarray, float]:
+        started = time.perf_counter()
+        vectors = self.provider.embed(texts)
+        return vectors, (time.perf_counter() - started) * 1000
+
+    def hedge_delay_ms(self) -> float | None:
+        """
+        Через сколько мс дублировать вызов: p-й процентиль прошлых задержек, пока их мало — половина бюджета
+        """
+        if self.hedge_percentile <= 0:
+            return None
+        delay = self.latencies.percentile(self.hedge_percentile)
+        return max(self.hedge_min_ms, delay if delay is not None else self.budget_ms / 2)
+
+    def stats(self) -> dict:
+        """
+        Состояние размыкателя и число дублирующих вызовов для GET /metrics
+        """
+        return {'breaker': self.breaker.state, 'hedged': self.hedged}
+
+    def _check_breaker(self) -> None:
+        if not self.breaker.allow():
+            raise CircuitOpenError(f"Модель {self.model_id} недоступна, вызовы приостановлены")
+
+    def embed_bulk(self, texts: list[str]) -> np.ndarray:
+        self._check_breaker()
+        try:
+            vectors = self.provider.embed_bulk(texts)
+        except Exception:
+            self.breaker.record_failure()
+            raise
+        self.breaker.record_success()
+        return vectors
+
+    def embed(self, texts: list[str]) -> np.ndarray:
+        self._check_breaker()
+        started = time.monotonic()
+        deadline = started + self.budget_ms / 1000
+        hedge_delay = self.hedge_delay_ms()
+        hedge_at = started + hedge_delay / 1000 if hedge_delay is not None else None
+        pending = {self._executor.submit(self._call, texts)}
+        retries, error = self.retries, None
+        while pending:
+            now = time.monotonic()
+            if now >= deadline:
+                break
+            wake = deadline if hedge_at is None else min(deadline, hedge_at)
+            done, pending = wait(pending, timeout=max(0.0, wake - now), return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    vectors, elapsed = future.result()
+                except Exception as e:
+                    error = e
+                    continue
+                self.latencies.record(elapsed)
+                self.breaker.record_success()
+                return vectors
+            if done and not pending and retries > 0:
+                retries -= 1
+                pending = {self._executor.submit(self._call, texts)}
+            elif hedge_at is not None and time.monotonic() >= hedge_at:
+                hedge_at = None
+                self.hedged += 1
+                logger.info(f"Эмбеддинг не готов за {hedge_delay:.0f} мс, дублируем вызов")
+                pending.add(self._executor.submit(self._call, texts))
+
+        self.breaker.record_failure()
+        if error is not None and not pending:
+            raise error
+        raise TimeoutError(f"Эмбеддинг не получен за {self.budget_ms:.0f} мс")
+
+
+def create_embedding_provider(name: str | None = None) -> EmbeddingProvider:
+    """
+    Провайдер по конфигурации: EMBEDDING_PROVIDER = hf (по умолчанию) | local | fake,
+    EMBEDDING_MODEL — id модели, EMBEDDING_BACKEND — torch | onnx для local,
+    FAKE_EMBEDDING_LATENCY_MS — задержка на вызов для fake.
+    С EMBEDDING_GUARD=1 (по умолчанию) удалённый провайдер (hf) обёрнут в GuardedEmbeddingProvider,
+    его состояние видно в GET /metrics; локальной модели и fake бюджет и дубли не нужны
+    """
+    name = name or os.getenv('EMBEDDING_PROVIDER', 'hf')
+    provider = _create_provider(name)
+    if not EMBEDDING_GUARD or name != 'hf':
+        return provider
+    guarded = GuardedEmbeddingProvider(provider)
+    register_gauge('embeddings', guarded.stats)
+    return guarded
+
+
+def _create_provider(name: str) -> EmbeddingProvider:
+    model_id = os.getenv('EMBEDDING_MODEL', DEFAULT_MODEL_ID)
+
+    if name == 'hf':
+        return HFApiEmbeddingProvider(model_id)
+    if name == 'local':
+        return LocalEmbeddingProvider(model_id, backend=os.getenv('EMBEDDING_BACKEND', 'torch'))
+    if name == 'fake':
+        return FakeEmbeddingProvider(latency=float(os.getenv('FAKE_EMBEDDING_LATENCY_MS', '0')) / 1000)
+    raise ValueError(f"Неизвестный провайдер эмбеддингов: {name}")
+
+
+def embed_in_batches(provider: EmbeddingProvider, texts: list[str], batch_size: int = BATCH_SIZE,
+                     max_workers: int = CONCURRENCY, retries: int = RETRIES, backoff: float = 0.5):
+    """
+    Векторизует большой список текстов пачками по batch_size, не более max_workers запросов одновременно.
+    У каждой пачки свои повторы с экспоненциальной паузой, поэтому сбой одной пачки не теряет остальные.
+    Открытый автомат (CircuitOpenError) не повторяется: оставшиеся пачки отменяются и считаются невекторизованными.
+    Возвращает (матрица len(texts) x dim или None, маска успешно векторизованных строк)
+    """
+    ok = np.zeros(len(texts), dtype=bool)
+    if not texts:
+        return None, ok
+
+    def embed_chunk(chunk: list[str]):
+        for attempt in range(retries + 1):
+            try:
+                return provider.embed_bulk(chunk)
+            except CircuitOpenError:
+                raise
+            except Exception as e:
+                if attempt == retries:
+                    logger.error(f"Пачка из {len(chunk)} текстов не векторизована после {retries + 1} попыток: {e}")
+                    return None
+                time.sleep(backoff * 2 ** attempt)
+
+    vectors = None
+    done = 0
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        futures = {
+            executor.submit(embed_chunk, texts[start:start + batch_size]): start
+            for start in range(0, len(texts), batch_size)
+        }
+        for future in as_completed(futures):
+            start = futures[future]
+            try:
+                chunk_vectors = future.result()
+            except CircuitOpenError as e:
+                logger.warning(f"{e}: векторизовано {done} из {len(texts)} текстов, остальные пропущены")
+                for pending in futures:
+                    pending.cancel()
+                break
+            if chunk_vectors is None:
+                continue
+            if vectors is None:
+                vectors = np.zeros((len(texts), chunk_vectors.shape[1]), dtype=np.float32)
+            vectors[start:start + len(chunk_vectors)] = chunk_vectors
+            ok[start:start + len(chunk_vectors)] = True
+            done += len(chunk_vectors)
+            if len(futures) > 1:
+                logger.info(f"Векторизовано {done}/{len(texts)}")
+
+    elapsed = time.perf_counter() - started
+    logger.info(f"Векторизовано {done} из {len(texts)} текстов за {elapsed:.2f} с "
+                f"({done / elapsed if elapsed else 0.0:.1f} текстов/с)")
+    return vectors, ok
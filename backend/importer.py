@@ -0,0 +1,194 @@
+import itertools
+import json
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from uuid import NAMESPACE_URL, uuid5
+
+from embeddings import embed_in_batches
+from searcher import EMBEDDING_COLUMNS, content_hash, encode_vector, row_version
+
+logger = logging.getLogger('importer')
+
+IMPORT_BATCH_SIZE = int(os.getenv('IMPORT_BATCH_SIZE', '1000'))
+
+# Колонки таблиц -> поля исходных файлов (aforisms.json, words.json), берётся первое непустое
+FIELD_MAPS = {
+    'aforisms': {
+        'id': ('aforism_id', 'id'),
+        'phrase': ('aforism', 'phrase'),
+        'author': ('aforism_author', 'author'),
+        'description': ('aforism_description', 'description'),
+    },
+    'words': {
+        'id': ('word_id', 'id'),
+        'word': ('word',),
+        'description': ('word_description', 'description'),
+    },
+}
+DEFAULTS = {
+    'aforisms': {'author': "Народ", 'description': "Неизвестная фраза"},
+    'words': {'description': "Интересное словечко"},
+}
+
+
+def iter_records(path: str, chunk_size: int = 1 << 16):
+    """
+    Потоково читает JSON-массив объектов или JSONL, не загружая файл целиком.
+    Запись, которая не является объектом JSON, — ошибка (ValueError с её номером)
+    """
+    for number, record in enumerate(_iter_values(path, chunk_size)):
+        if not isinstance(record, dict):
+            raise ValueError(f"{path}: запись {number} не объект JSON: {str(record)[:100]!r}")
+        yield record
+
+
+def _iter_values(path: str, chunk_size: int):
+    """
+    Значения JSON-массива или строк JSONL; массив разбирается по одному элементу через raw_decode поверх буфера
+    """
+    decoder = json.JSONDecoder()
+    with open(path, encoding='utf-8') as f:
+        buffer = f.read(chunk_size).lstrip()
+        if not buffer.startswith('['):
+            # JSONL: по объекту на строку
+            for line in itertools.chain((buffer + f.readline()).splitlines(), f):
+                if line.strip():
+                    yield json.loads(line)
+            return
+
+        position, eof = 1, False
+        while True:
+            while position < len(buffer) and buffer[position] in ' \t\r\n,':
+                position += 1
+            if position < len(buffer) and buffer[position] == ']':
+                return
+            try:
+                record, end = decoder.raw_decode(buffer, position)
+                # число или литерал, дочитанный до конца буфера, может продолжаться в следующем куске
+                complete = end < len(buffer) or eof
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                complete = False
+            if not complete:
+                chunk = f.read(chunk_size)
+                eof = not chunk
+                buffer, position = buffer[position:] + chunk, 0
+                continue
+            yield record
+            position = end
+
+
+def map_record(table: str, record: dict) -> dict:
+    """
+    Строка таблицы из записи файла. Id стабильный: исходный id записи или uuid5 от содержимого,
+    поэтому повторный импорт того же файла перезаписывает строки, а не дублирует их
+    """
+    row = {}
+    for column, fields in FIELD_MAPS[table].items():
+        value = next((record[field] for field in fields if record.get(field) not in (None, '')), None)
+        if isinstance(value, str):
+            value = value.strip()
+        row[column] = value if value not in (None, '') else DEFAULTS[table].get(column)
+
+    if row['id'] is None:
+        key = '\x1f'.join(str(row[column]) for column in FIELD_MAPS[table] if column != 'id')
+        row['id'] = str(uuid5(NAMESPACE_URL, f"{table}:{key}"))
+    row['id'] = str(row['id'])
+    return row
+
+
+def _batches(records, size: int, skip: int):
+    batch = []
+    for number, record in enumerate(records):
+        if number < skip:
+            continue
+        batch.append(record)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _load_checkpoint(path: str, source: str, table: str) -> int:
+    if not os.path.isfile(path):
+        return 0
+    with open(path, encoding='utf-8') as f:
+        checkpoint = json.load(f)
+    if checkpoint.get('source') != os.path.abspath(source) or checkpoint.get('table') != table:
+        logger.warning(f"Чекпоинт {path} относится к другому импорту, начинаем сначала")
+        return 0
+    return checkpoint['rows']
+
+
+def _save_checkpoint(path: str, source: str, table: str, rows: int) -> None:
+    tmp = f"{path}.tmp"
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump({'source': os.path.abspath(source), 'table': table, 'rows': rows}, f)
+    os.replace(tmp, path)
+
+
+def import_file(ydb_client, embedding_provider, path: str, table: str, batch_size: int = IMPORT_BATCH_SIZE,
+                checkpoint: str | None = None, resume: bool = True) -> dict:
+    """
+    Импортирует файл в таблицу: пачки по batch_size векторизуются (embed_in_batches) и пишутся через
+    bulk_upsert, причём запись пачки идёт в фоне параллельно с векторизацией следующей.
+    После каждой записанной пачки в checkpoint сохраняется число импортированных записей,
+    и прерванный импорт продолжается с этого места. Возвращает статистику импорта
+    """
+    checkpoint = checkpoint or f"{path}.{table}.checkpoint"
+    skip = _load_checkpoint(checkpoint, path, table) if resume else 0
+    if skip:
+        logger.info(f"Продолжаем импорт {path} с записи {skip}")
+
+    ydb_client.connect()
+    done, unembedded = skip, 0
+    started = time.perf_counter()
+    pending = None
+
+    def write(rows: list[dict], done_after: int):
+        # версия ставится перед самой записью: пачка ждёт, пока запишется предыдущая
+        version = row_version()
+        for row in rows:
+            row['version'] = version
+        ydb_client.bulk_upsert(table, rows, corpus_version=version)
+        _save_checkpoint(checkpoint, path, table, done_after)
+
+    with ThreadPoolExecutor(max_workers=1) as writer:
+        for records in _batches(iter_records(path), batch_size, skip):
+            rows = [map_record(table, record) for record in records]
+            vectors, ok = embed_in_batches(embedding_provider, [row['description'] or '' for row in rows])
+            for i, row in enumerate(rows):
+                if ok[i]:
+                    row.update(embedding=encode_vector(vectors[i]), embedding_model=embedding_provider.model_id,
+                               content_hash=content_hash(row['description']))
+                else:
+                    row.update(dict.fromkeys(EMBEDDING_COLUMNS))
+            unembedded += int((~ok).sum())
+
+            if pending is not None:
+                pending.result()
+            done += len(rows)
+            pending = writer.submit(write, rows, done)
+
+            elapsed = time.perf_counter() - started
+            logger.info(f"{table}: {done} записей, {(done - skip) / elapsed:.1f} строк/с")
+        if pending is not None:
+            pending.result()
+
+    if os.path.isfile(checkpoint):
+        os.remove(checkpoint)
+    elapsed = time.perf_counter() - started
+    stats = {
+        'table': table,
+        'rows': done - skip,
+        'skipped': skip,
+        'unembedded': unembedded,
+        'seconds': round(elapsed, 3),
+        'rows_per_second': round((done - skip) / elapsed, 1) if elapsed else 0.0,
+    }
+    logger.info(f"Импорт {path} в {table} завершён: {stats}")
+    return stats
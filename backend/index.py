@@ -1,9 +1,12 @@
 import os
 
-from add_phrase import add_phrase_handler
-from add_word import add_word_handler
+import metrics
+from add_phrase import add_phrase_handler, add_phrase_batch_handler
+from add_word import add_word_handler, add_word_batch_handler
 from search_phrases import search_phrase_handler
 from search_words import search_words_handler
+from search_all import search_all_handler
+from search_batch import search_batch_handler
 from uuid import uuid4
 
 
@@ -30,23 +33,51 @@ def get_result(path, event, context):
             return search_phrase_handler(event, context)
         if path == "/word":
             return search_words_handler(event, context)
+        if path == "/search":
+            return search_all_handler(event, context)
 
     if http_method == 'POST':
         if path == "/phrase":
             return add_phrase_handler(event, context)
         if path == "/word":
             return add_word_handler(event, context)
+        if path == "/phrase/batch":
+            return add_phrase_batch_handler(event, context)
+        if path == "/word/batch":
+            return add_word_batch_handler(event, context)
+        if path in ("/phrase/search", "/word/search"):
+            return search_batch_handler(event, context)
 
     return response(404, {}, False, 'Данного пути не существует')
 
 
 def handler(event, context):
+    """
+    Точка входа функции: маршрутизация плюс замер этапов запроса (заголовок Server-Timing и строка лога metrics).
+    Потоковое тело (пакетный поиск в режиме сервера) замеряется до конца отдачи, Server-Timing уходит трейлером
+    """
     path = event.get('path')
+    if path and '?' in path:
+        path = path.split('?')[0]
 
-    if path:
-        if '?' in path:
-            path = path.split('?')[0]
-
-        return get_result(path, event, context)
-
-    return response(404, {}, False, 'Эту функцию следует вызывать при помощи api-gateway')
\ No newline at end of file
+    timings, token = metrics.begin_request()
+    result = None
+    try:
+        if path:
+            result = get_result(path, event, context)
+        else:
+            result = response(404, {}, False, 'Эту функцию следует вызывать при помощи api-gateway')
+        return result
+    finally:
+        status = result.get('statusCode') if result is not None else 500
+        body = result.get('body') if result is not None else None
+        if body is not None and not isinstance(body, (str, bytes)):
+            result['body'] = metrics.stream_request(timings, token, body, event.get('httpMethod'), path, status)
+            result['headers'] = {**(result.get('headers') or {}), 'Trailer': 'Server-Timing',
+                                 'Timing-Allow-Origin': '*'}
+            result['trailers'] = lambda: {'Server-Timing': timings.server_timing()}
+        else:
+            metrics.end_request(timings, token, event.get('httpMethod'), path, status)
+            if result is not None:
+                result['headers'] = {**(result.get('headers') or {}), 'Server-Timing': timings.server_timing(),
+                                     'Timing-Allow-Origin': '*'}
\ No newline at end of file
@@ -0,0 +1,252 @@
+import bisect
+import functools
+import heapq
+import itertools
+import math
+import os
+import re
+import unicodedata
+
+import numpy as np
+
+from row_table import RowTable
+
+LEXICAL_FAST_PATH = os.getenv('LEXICAL_FAST_PATH', 'exact')
+LEXICAL_PREFIX_SCORE = float(os.getenv('LEXICAL_PREFIX_SCORE', '0.9'))
+LEXICAL_PREFIX_MIN = int(os.getenv('LEXICAL_PREFIX_MIN', '3'))
+FUZZY_MIN_SIMILARITY = 0.5
+FUZZY_MAX_CANDIDATES = 50
+WORD_RE = re.compile(r'\w+')
+
+# Окончания для лёгкого стемминга (без словаря): снимается самое длинное, если от слова остаётся >= 3 букв
+RUSSIAN_ENDINGS = frozenset((
+    'иями', 'ями', 'ами', 'ого', 'его', 'ому', 'ему', 'ыми', 'ими', 'ией', 'ей', 'ой', 'ий', 'ый', 'ая', 'яя',
+    'ое', 'ее', 'ые', 'ие', 'ом', 'ем', 'ам', 'ям', 'ах', 'ях', 'ов', 'ев', 'ию', 'ия', 'ть', 'ешь', 'ет',
+    'ют', 'ут', 'ит', 'ат', 'ят', 'ся', 'сь', 'а', 'я', 'о', 'е', 'ы', 'и', 'у', 'ю', 'ь', 'й',
+))
+
+
+def normalize(text: str | None) -> str:
+    """
+    Нормализация для лексического поиска: без знаков ударения, нижний регистр, ё -> е, только буквы и цифры
+    """
+    text = unicodedata.normalize('NFC', text or '').replace('\u0301', '').replace('\u0300', '')
+    return ' '.join(WORD_RE.findall(text.lower().replace('ё', 'е')))
+
+
+@functools.lru_cache(maxsize=200000)
+def stem(token: str) -> str:
+    for length in range(min(4, len(token) - 3), 0, -1):
+        if token[-length:] in RUSSIAN_ENDINGS:
+            return token[:-length]
+    return token
+
+
+def tokenize(text: str | None) -> list[str]:
+    return [stem(token) for token in normalize(text).split()]
+
+
+def trigrams(token: str) -> set[str]:
+    padded = f"#{token}#"
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class SortedTerms:
+    """
+    Отсортированный набор строк для поиска по префиксу с дешёвой вставкой: основной отсортированный список
+    и небольшой отсортированный хвост новых строк. Вставка копирует только хвост; когда он длиннее sqrt
+    от основного, оба сливаются (амортизированно O(sqrt V) на вставку вместо O(V) на копию всего словаря).
+    Пара списков публикуется одной ссылкой, поэтому читатели без блокировки видят согласованный набор
+    """
+    MIN_TAIL = 64
+
+    def __init__(self, values=()):
+        self._lists = (sorted(values), [])
+
+    def __len__(self) -> int:
+        main, tail = self._lists
+        return len(main) + len(tail)
+
+    def add(self, value: str) -> None:
+        main, tail = self._lists
+        tail = list(tail)
+        bisect.insort(tail, value)
+        if len(tail) > max(self.MIN_TAIL, math.isqrt(len(main))):
+            main, tail = sorted(main + tail), []
+        self._lists = (main, tail)
+
+    @staticmethod
+    def _run(values: list[str], prefix: str):
+        for i in range(bisect.bisect_right(values, prefix), len(values)):
+            if not values[i].startswith(prefix):
+                return
+            yield values[i]
+
+    def continuations(self, prefix: str):
+        """
+        Строки, которые начинаются с prefix и длиннее него, по возрастанию
+        """
+        main, tail = self._lists
+        return heapq.merge(self._run(main, prefix), self._run(tail, prefix))
+
+
+class LexicalIndex:
+    """
+    Инвертированный индекс по строкам корпуса: основы слов по каждому полю -> позиции строк,
+    триграммы основ -> основы (для опечаток и недописанных слов) и нормализованный текст
+    основного поля -> позиции (точное и префиксное совпадение).
+    Как и данные поиска, только дописывается; замена строки пересобирает затронутые списки
+    копированием, поэтому читатели без блокировки не видят частично изменённых списков
+    """
+
+    def __init__(self, fields: dict[str, float], primary: str):
+        self.fields = fields
+        self.primary = primary
+        self._postings: dict[str, dict[str, list[int]]] = {field: {} for field in fields}
+        self._vocabulary: dict[str, None] = {}
+        self._sorted_vocabulary = SortedTerms()
+        self._trigrams: dict[str, list[str]] = {}
+        self._exact: dict[str, list[int]] = {}
+        self._keys = SortedTerms()
+        self._rows: list[tuple[dict[str, list[str]], str] | None] = []
+
+    @classmethod
+    def from_rows(cls, data: RowTable, fields: dict[str, float], primary: str) -> 'LexicalIndex':
+        index = cls(fields, primary)
+        for position, item in enumerate(data):
+            index.add(position, item, keep_sorted=False)
+        index._keys = SortedTerms(index._exact)
+        index._sorted_vocabulary = SortedTerms(index._vocabulary)
+        return index
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def add(self, position: int, item: dict, keep_sorted: bool = True) -> None:
+        """
+        Индексирует строку data[position] (новую или заменённую)
+        """
+        if position < len(self._rows) and self._rows[position] is not None:
+            self._remove(position)
+        while len(self._rows) <= position:
+            self._rows.append(None)
+
+        normalized = {field: normalize(item.get(field)) for field in self.fields | {self.primary: None}}
+        tokens = {field: sorted({stem(token) for token in normalized[field].split()}) for field in self.fields}
+        for field, field_tokens in tokens.items():
+            postings = self._postings[field]
+            for token in field_tokens:
+                postings.setdefault(token, []).append(position)
+                if token not in self._vocabulary:
+                    self._vocabulary[token] = None
+                    for trigram in trigrams(token):
+                        self._trigrams.setdefault(trigram, []).append(token)
+                    if keep_sorted:
+                        self._sorted_vocabulary.add(token)
+
+        key = normalized[self.primary]
+        if key:
+            if key not in self._exact and keep_sorted:
+                self._keys.add(key)
+            self._exact.setdefault(key, []).append(position)
+        self._rows[position] = (tokens, key)
+
+    def _remove(self, position: int) -> None:
+        tokens, key = self._rows[position]
+        for field, field_tokens in tokens.items():
+            postings = self._postings[field]
+            for token in field_tokens:
+                postings[token] = [p for p in postings[token] if p != position]
+        if key:
+            self._exact[key] = [p for p in self._exact[key] if p != position]
+
+    def exact(self, query: str, prefix: bool = False) -> tuple[list[int], list[int]]:
+        """
+        Строки, у которых основное поле совпадает с запросом после нормализации, и (prefix=True)
+        строки, у которых оно начинается с запроса
+        """
+        key = normalize(query)
+        if not key:
+            return [], []
+        exact = list(self._exact.get(key, ()))
+        prefixed = []
+        if prefix and len(key) >= LEXICAL_PREFIX_MIN:
+            for candidate in self._keys.continuations(key):
+                prefixed.extend(self._exact.get(candidate, ()))
+        return exact, prefixed
+
+    def _matches(self, token: str) -> list[tuple[str, float]]:
+        """
+        Основы словаря, подходящие к основе запроса: сама основа (1.0), продолжения недописанного слова
+        (LEXICAL_PREFIX_SCORE) и, если основы в словаре нет, похожие по триграммам (опечатки)
+        с весом по коэффициенту Жаккара
+        """
+        matches = [(token, 1.0)] if token in self._vocabulary else []
+        if len(token) >= LEXICAL_PREFIX_MIN:
+            for candidate in itertools.islice(self._sorted_vocabulary.continuations(token), FUZZY_MAX_CANDIDATES):
+                matches.append((candidate, LEXICAL_PREFIX_SCORE))
+        if matches:
+            return matches
+
+        query_trigrams = trigrams(token)
+        counts: dict[str, int] = {}
+        for trigram in query_trigrams:
+            for candidate in self._trigrams.get(trigram, ()):
+                counts[candidate] = counts.get(candidate, 0) + 1
+
+        fuzzy = []
+        for candidate, shared in counts.items():
+            # у основы из n букв (с границами #) не больше n триграмм
+            similarity = shared / (len(query_trigrams) + len(candidate) - shared)
+            if similarity >= FUZZY_MIN_SIMILARITY:
+                fuzzy.append((candidate, similarity))
+        fuzzy.sort(key=lambda match: -match[1])
+        return fuzzy[:FUZZY_MAX_CANDIDATES]
+
+    def search(self, query: str, size: int, rows: np.ndarray | None = None) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Лексические оценки строк в [0, 1]: для каждого поля — доля совпавших основ запроса с весом idf,
+        умноженная на вес поля; итог — максимум по полям. size — число строк в опубликованном состоянии,
+        более новые позиции отбрасываются. rows — возрастающие позиции (фильтр): оцениваются только они,
+        и работа пропорциональна их числу, а не размеру корпуса.
+        Возвращает (позиции, оценки) только для строк с совпадениями
+        """
+        if rows is not None:
+            rows = np.asarray(rows, dtype=np.intp)
+            rows = rows[:np.searchsorted(rows, size)]
+        width = size if rows is None else len(rows)
+        tokens = list(dict.fromkeys(tokenize(query)))
+        if not tokens or not width:
+            return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.float32)
+
+        matches = {token: self._matches(token) for token in tokens}
+        scores = {}
+        for field, weight in self.fields.items():
+            postings = self._postings[field]
+            idf = {token: math.log(1 + size / (1 + len(postings.get(token, ())))) for token in tokens}
+            total = sum(idf.values())
+            field_scores = np.zeros(width, dtype=np.float32)
+            for token, matched in matches.items():
+                best = np.zeros(width, dtype=np.float32)
+                for candidate, similarity in matched:
+                    np.maximum.at(best, self._slots(postings.get(candidate, ()), size, rows), similarity)
+                field_scores += best * (idf[token] / total)
+            scores[field] = field_scores * weight
+
+        combined = np.maximum.reduce(list(scores.values()))
+        found = np.flatnonzero(combined)
+        return found if rows is None else rows[found], combined[found]
+
+    @staticmethod
+    def _slots(positions: list[int], size: int, rows: np.ndarray | None) -> np.ndarray:
+        """
+        Номера ячеек массива оценок для позиций из списка совпадений: сами позиции меньше size
+        или, с фильтром, номера позиций в rows (позиции вне фильтра отбрасываются)
+        """
+        positions = np.asarray(positions, dtype=np.intp)
+        if rows is None:
+            return positions[positions < size]
+        slots = np.searchsorted(rows, positions)
+        inside = slots < len(rows)
+        slots, positions = slots[inside], positions[inside]
+        return slots[rows[slots] == positions]
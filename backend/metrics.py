@@ -0,0 +1,225 @@
+import json
+import logging
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable
+
+logger = logging.getLogger('metrics')
+
+# Этапы запроса в порядке выполнения: подключение к YDB, загрузка таблицы, эмбеддинг запроса,
+# оценка (векторы и лексический индекс), сборка результатов, сериализация ответа
+STAGES = ('connect', 'load', 'embed', 'score', 'build', 'serialize')
+METRICS_HISTOGRAM = os.getenv('METRICS_HISTOGRAM', '0') == '1'
+METRICS_LOG = os.getenv('METRICS_LOG', '1') == '1'
+
+_current: ContextVar['RequestTimings | None'] = ContextVar('request_timings', default=None)
+_cold_start = True
+_cold_start_lock = threading.Lock()
+_gauges: dict[str, Callable[[], dict]] = {}
+
+
+def _order(name: str) -> int:
+    return STAGES.index(name) if name in STAGES else len(STAGES)
+
+
+class RequestTimings:
+    """
+    Длительности этапов одного запроса (мс). Время вложенного этапа вычитается из внешнего,
+    поэтому этапы не пересекаются: загрузка таблицы не включает подключение к YDB внутри неё
+    """
+
+    def __init__(self, cold_start: bool):
+        self.cold_start = cold_start
+        self.stages: dict[str, float] = {}
+        self.started = time.perf_counter()
+        self.total = 0.0
+        self._stack: list[str] = []
+
+    def add(self, name: str, elapsed: float) -> None:
+        self.stages[name] = self.stages.get(name, 0.0) + elapsed
+
+    def finish(self) -> None:
+        self.total = (time.perf_counter() - self.started) * 1000
+        self.stages = dict(sorted(self.stages.items(), key=lambda item: _order(item[0])))
+
+    def server_timing(self) -> str:
+        parts = [f"{name};dur={duration:.1f}" for name, duration in self.stages.items()]
+        parts.append(f"total;dur={self.total:.1f}")
+        if self.cold_start:
+            parts.append('cold;desc="cold start"')
+        return ', '.join(parts)
+
+
+@contextmanager
+def stage(name: str):
+    """
+    Замер этапа текущего запроса; вне запроса (фоновая догрузка, импорт) ничего не делает
+    """
+    timings = _current.get()
+    if timings is None:
+        yield
+        return
+    parent = timings._stack[-1] if timings._stack else None
+    timings._stack.append(name)
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = (time.perf_counter() - started) * 1000
+        timings._stack.pop()
+        if name != parent:
+            timings.add(name, elapsed)
+            if parent is not None:
+                timings.add(parent, -elapsed)
+
+
+def mark_warm() -> None:
+    """
+    Индексы прогреты заранее (режим сервера): первый запрос не считается холодным стартом
+    """
+    global _cold_start
+    with _cold_start_lock:
+        _cold_start = False
+
+
+def begin_request() -> tuple[RequestTimings, object]:
+    global _cold_start
+    with _cold_start_lock:
+        cold_start, _cold_start = _cold_start, False
+    timings = RequestTimings(cold_start)
+    return timings, _current.set(timings)
+
+
+def end_request(timings: RequestTimings, token, method: str | None, path: str | None, status) -> None:
+    """
+    Закрывает замер: структурная строка лога и, если включена, запись в гистограммы
+    """
+    _current.reset(token)
+    _record(timings, method, path, status)
+
+
+def stream_request(timings: RequestTimings, token, chunks, method: str | None, path: str | None, status):
+    """
+    Как end_request для потокового тела: возвращает обёртку генератора, этапы которого при отдаче
+    попадают в замер, а сам замер закрывается, когда тело отдано целиком или отдача прервана
+    """
+    _current.reset(token)
+    return _timed_chunks(timings, iter(chunks), method, path, status)
+
+
+def _timed_chunks(timings: RequestTimings, chunks, method: str | None, path: str | None, status):
+    try:
+        while True:
+            token = _current.set(timings)
+            try:
+                chunk = next(chunks)
+            except StopIteration:
+                return
+            finally:
+                _current.reset(token)
+            yield chunk
+    finally:
+        close = getattr(chunks, 'close', None)
+        if close is not None:
+            close()
+        _record(timings, method, path, status)
+
+
+def _record(timings: RequestTimings, method: str | None, path: str | None, status) -> None:
+    timings.finish()
+    if METRICS_LOG:
+        logger.info(json.dumps({
+            'event': 'request',
+            'method': method,
+            'path': path,
+            'status': status,
+            'cold_start': timings.cold_start,
+            'total_ms': round(timings.total, 2),
+            'stages_ms': {name: round(duration, 2) for name, duration in timings.stages.items()},
+        }, ensure_ascii=False))
+    if METRICS_HISTOGRAM:
+        histograms.record('total', timings.total)
+        for name, duration in timings.stages.items():
+            histograms.record(name, duration)
+
+
+class Histogram:
+    """
+    Гистограмма длительностей с логарифмическими корзинами (шаг 5%, от 10 мкс до ~3 ч):
+    фиксированная память и процентили с относительной ошибкой не больше шага
+    """
+    MIN_MS = 0.01
+    GROWTH = 1.05
+    BUCKETS = 400
+
+    def __init__(self):
+        self.counts = [0] * self.BUCKETS
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def record(self, value: float) -> None:
+        value = max(value, 0.0)
+        bucket = 0 if value <= self.MIN_MS else int(math.log(value / self.MIN_MS, self.GROWTH)) + 1
+        self.counts[min(bucket, self.BUCKETS - 1)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def percentile(self, p: float) -> float:
+        if not self.count:
+            return 0.0
+        rank = math.ceil(self.count * p / 100)
+        seen = 0
+        for bucket, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return min(self.MIN_MS * self.GROWTH ** bucket, self.max)
+        return self.max
+
+
+class Histograms:
+    def __init__(self):
+        self._histograms: dict[str, Histogram] = {}
+        self._lock = threading.Lock()
+
+    def record(self, name: str, value: float) -> None:
+        with self._lock:
+            self._histograms.setdefault(name, Histogram()).record(value)
+
+    def dump(self) -> dict:
+        with self._lock:
+            return {
+                name: {
+                    'count': histogram.count,
+                    'mean_ms': round(histogram.sum / histogram.count, 2),
+                    'p50_ms': round(histogram.percentile(50), 2),
+                    'p95_ms': round(histogram.percentile(95), 2),
+                    'p99_ms': round(histogram.percentile(99), 2),
+                    'max_ms': round(histogram.max, 2),
+                }
+                for name, histogram in sorted(self._histograms.items(), key=lambda item: _order(item[0]))
+            }
+
+
+histograms = Histograms()
+
+
+def register_gauge(name: str, read: Callable[[], dict]) -> None:
+    """
+    Регистрирует текущий показатель компонента (например, состояние размыкателя модели) для report()
+    """
+    _gauges[name] = read
+
+
+def report() -> dict:
+    """
+    Гистограммы этапов (при METRICS_HISTOGRAM) и текущие значения зарегистрированных показателей
+    """
+    result = histograms.dump() if METRICS_HISTOGRAM else {}
+    result.update({name: read() for name, read in _gauges.items()})
+    return result
@@ -0,0 +1,84 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+class QueryEmbeddingCache:
+    """
+    LRU-кэш эмбеддингов запросов по ключу (модель, нормализованный текст)
+    с необязательным TTL и ограничениями по числу записей и объёму памяти
+    """
+
+    def __init__(self, max_entries: int = 10000, ttl: float | None = None, max_bytes: int | None = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @classmethod
+    def from_env(cls) -> 'QueryEmbeddingCache':
+        ttl = os.getenv('QUERY_CACHE_TTL')
+        max_bytes = os.getenv('QUERY_CACHE_MAX_BYTES')
+        return cls(
+            max_entries=int(os.getenv('QUERY_CACHE_SIZE', '10000')),
+            ttl=float(ttl) if ttl else None,
+            max_bytes=int(max_bytes) if max_bytes else None,
+        )
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        return ' '.join(text.lower().split())
+
+    def get(self, model_id: str, text: str):
+        key = (model_id, self.normalize(text))
+        with self._lock:
+            entry = self._entries.get(key)
+            # просроченная запись — промах, но остаётся до вытеснения: get_stale отдаст её, если модель недоступна
+            if entry is None or (self.ttl is not None and time.monotonic() - entry[1] > self.ttl):
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def get_stale(self, model_id: str, text: str):
+        """
+        Эмбеддинг запроса без учёта TTL — для деградированного режима
+        """
+        with self._lock:
+            entry = self._entries.get((model_id, self.normalize(text)))
+            return entry[0] if entry is not None else None
+
+    def put(self, model_id: str, text: str, vector) -> None:
+        key = (model_id, self.normalize(text))
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (vector, time.monotonic())
+            self._bytes += vector.nbytes
+            while self._entries and (len(self._entries) > self.max_entries
+                                     or (self.max_bytes is not None and self._bytes > self.max_bytes)):
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _remove(self, key) -> None:
+        vector, _ = self._entries.pop(key)
+        self._bytes -= vector.nbytes
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / total if total else 0.0,
+            }
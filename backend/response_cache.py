@@ -0,0 +1,92 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+from query_cache import QueryEmbeddingCache
+
+RESPONSE_CACHE_SIZE = int(os.getenv('RESPONSE_CACHE_SIZE', '2048'))
+RESPONSE_CACHE_CONTROL = os.getenv('RESPONSE_CACHE_CONTROL', 'public, max-age=60')
+BACKEND_VERSION = os.getenv('BACKEND_VERSION', 'v.3.0.1')
+
+
+class ResponseCache:
+    """
+    LRU найденных результатов поиска по ключу (маршрут, нормализованный текст, limit, поколение индекса).
+    Новое поколение индекса даёт новые ключи, а старые записи вытесняются по размеру — инвалидировать их не нужно
+    """
+
+    def __init__(self, max_entries: int = 2048):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def from_env(cls) -> 'ResponseCache':
+        return cls(max_entries=RESPONSE_CACHE_SIZE)
+
+    def get(self, key: tuple):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: tuple, value) -> None:
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {'entries': len(self._entries), 'hits': self.hits, 'misses': self.misses,
+                    'hit_rate': self.hits / total if total else 0.0}
+
+
+def cache_key(route: str, text: str, limit: int, version) -> tuple:
+    return route, QueryEmbeddingCache.normalize(text), limit, version
+
+
+def etag(key: tuple, results, model_id: str) -> str:
+    """
+    Слабый ETag (тело отличается хотя бы timestamp) из запроса (ключ кэша без поколения индекса), найденных
+    результатов, модели и версии бэкенда. Поколение своё у каждого экземпляра, а результаты при одном
+    корпусе одинаковы везде: If-None-Match срабатывает и на другом контейнере, и после перезапуска
+    """
+    digest = hashlib.sha256(json.dumps([*key[:-1], results, model_id, BACKEND_VERSION], ensure_ascii=False,
+                                       sort_keys=True, default=str).encode('utf-8'))
+    return f'W/"{digest.hexdigest()[:32]}"'
+
+
+def not_modified(event: dict, tag: str) -> bool:
+    """
+    Совпадает ли If-None-Match запроса с tag (сравнение слабое, как требует RFC 9110 для If-None-Match)
+    """
+    headers = event.get('headers') or {}
+    value = next((v for k, v in headers.items() if k.lower() == 'if-none-match'), None)
+    if not value:
+        return False
+    candidates = {candidate.strip().removeprefix('W/') for candidate in value.split(',')}
+    return '*' in candidates or tag.removeprefix('W/') in candidates
+
+
+def cache_headers(tag: str, degraded: bool = False) -> dict:
+    """
+    Заголовки кэширования ответа; деградированный ответ (без модели) не кэшируется и не получает ETag,
+    чтобы после восстановления модели клиент получил полноценный
+    """
+    if degraded:
+        return {'Cache-Control': 'no-store', 'Access-Control-Expose-Headers': 'Server-Timing'}
+    return {'ETag': tag, 'Cache-Control': RESPONSE_CACHE_CONTROL,
+            'Access-Control-Expose-Headers': 'ETag, Server-Timing'}
@@ -0,0 +1,115 @@
+import bisect
+from array import array
+
+
+def fold(value) -> str:
+    return ' '.join(str(value or '').lower().split())
+
+
+class RowTable:
+    """
+    Колоночное хранение строк корпуса вместо словаря на строку: по списку значений на колонку.
+    Колонки из interned (повторяющиеся значения вроде автора) хранятся кодами в array('I')
+    со справочником значений и списками строк на каждое значение (для фильтров поиска).
+    Словарь строки собирается по требованию в __getitem__
+    """
+
+    def __init__(self, columns: tuple[str, ...], interned: tuple[str, ...] = ()):
+        self.columns = tuple(columns)
+        self.interned = tuple(column for column in interned if column in self.columns)
+        self._values: dict[str, list] = {column: [] for column in self.columns if column not in self.interned}
+        self._codes: dict[str, array] = {column: array('I') for column in self.interned}
+        self._dictionary: dict[str, list] = {column: [] for column in self.interned}
+        self._lookup: dict[str, dict] = {column: {} for column in self.interned}
+        # по коду значения — возрастающие номера строк с ним; по значению без регистра и лишних пробелов — коды
+        self._postings: dict[str, list[array]] = {column: [] for column in self.interned}
+        self._folded: dict[str, dict[str, list[int]]] = {column: {} for column in self.interned}
+        # длина таблицы — по последней дописываемой колонке, чтобы читатель не увидел недописанную строку
+        self._last = self.columns[-1]
+
+    @classmethod
+    def from_columns(cls, columns: dict[str, list], interned: tuple[str, ...] = ()) -> 'RowTable':
+        table = cls(tuple(columns), interned)
+        for column, values in columns.items():
+            if column in table._codes:
+                codes = table._codes[column] = array('I', (table._code(column, value) for value in values))
+                postings = table._postings[column]
+                for index, code in enumerate(codes):
+                    postings[code].append(index)
+            else:
+                table._values[column] = list(values)
+        return table
+
+    def _code(self, column: str, value) -> int:
+        lookup = self._lookup[column]
+        code = lookup.get(value)
+        if code is None:
+            code = len(self._dictionary[column])
+            self._dictionary[column].append(value)
+            self._postings[column].append(array('I'))
+            self._folded[column].setdefault(fold(value), []).append(code)
+            lookup[value] = code
+        return code
+
+    def __len__(self) -> int:
+        last = self._last
+        return len(self._codes[last]) if last in self._codes else len(self._values[last])
+
+    def __getitem__(self, index: int) -> dict:
+        if index < 0:
+            index += len(self)
+        item = {}
+        for column in self.columns:
+            if column in self._codes:
+                item[column] = self._dictionary[column][self._codes[column][index]]
+            else:
+                item[column] = self._values[column][index]
+        return item
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    def _set(self, column: str, index: int | None, value) -> None:
+        if column in self._codes:
+            code = self._code(column, value)
+            codes, postings = self._codes[column], self._postings[column]
+            if index is None:
+                postings[code].append(len(codes))
+                codes.append(code)
+            elif codes[index] != code:
+                # копированием, а не на месте: читатель мог уже взять ссылку на старый список
+                old = codes[index]
+                postings[old] = array('I', (row for row in postings[old] if row != index))
+                rows = list(postings[code])
+                bisect.insort(rows, index)
+                postings[code] = array('I', rows)
+                codes[index] = code
+        elif index is None:
+            self._values[column].append(value)
+        else:
+            self._values[column][index] = value
+
+    def append(self, item: dict) -> None:
+        for column in self.columns:
+            self._set(column, None, item.get(column))
+
+    def __setitem__(self, index: int, item: dict) -> None:
+        for column in self.columns:
+            self._set(column, index, item.get(column))
+
+    def rows_with(self, column: str, value) -> array:
+        """
+        Возрастающие номера строк, у которых значение interned-колонки совпадает с value
+        без учёта регистра и лишних пробелов
+        """
+        codes = self._folded[column].get(fold(value), ())
+        if len(codes) == 1:
+            return self._postings[column][codes[0]]
+        return array('I', sorted(row for code in codes for row in self._postings[column][code]))
+
+    def column(self, name: str) -> list:
+        if name in self._codes:
+            dictionary = self._dictionary[name]
+            return [dictionary[code] for code in self._codes[name]]
+        return list(self._values[name])
@@ -0,0 +1,142 @@
+import json
+import logging
+import os
+from datetime import datetime
+from db import ydb_client
+from degraded import mark_degraded, track_degraded
+from metrics import stage
+from response_cache import cache_headers, cache_key, etag, not_modified
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+REPLICA_ID = os.getenv('REPLICA_ID', 'replica-search-all')
+BACKEND_VERSION = 'v1.0.0-python'
+
+SEARCH_KINDS = ('phrase', 'word')
+
+
+def search_all_handler(event, context):
+    """
+    Общий поиск по афоризмам и словам с одним эмбеддингом запроса
+    GET /search?text=...&kinds=phrase,word&limit=5
+    limit — сколько результатов каждого типа (1..100)
+    ETag по запросу и найденному, 304 и кэш ответов — как в search_phrase_handler,
+    ключ кэша — по поколениям индексов запрошенных типов
+    """
+    try:
+        logger.info(f"Ищем фразы и слова в реплике {REPLICA_ID}")
+
+        try:
+            params = event.get('queryStringParameters') or {}
+            query_text = params.get('text', '').strip()
+            kinds = [kind.strip() for kind in params.get('kinds', ','.join(SEARCH_KINDS)).split(',') if kind.strip()]
+            limit = int(params.get('limit', 5))
+
+            if not query_text or not kinds or any(kind not in SEARCH_KINDS for kind in kinds) or not 0 < limit <= 100:
+                logger.warning("Пустой текст, неизвестный тип поиска или limit вне 1..100")
+                return {
+                    'statusCode': 400,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*',
+                                'Access-Control-Allow-Methods': 'POST, OPTIONS',
+                                'Access-Control-Allow-Headers': 'Content-Type'},
+                    'body': json.dumps({'error': 'Text for search is required, kinds must be phrase and/or word, '
+                                                 'limit 1..100',
+                                        'backend_id': REPLICA_ID, 'backend_version': BACKEND_VERSION},
+                                       ensure_ascii=False)
+                }
+        except (TypeError, AttributeError, ValueError) as e:
+            return {
+                'statusCode': 400,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*',
+                            'Access-Control-Allow-Methods': 'POST, OPTIONS',
+                            'Access-Control-Allow-Headers': 'Content-Type'},
+                'body': json.dumps({'error': f'Invalid request format{e}', 'backend_id': REPLICA_ID,
+                                    'backend_version': BACKEND_VERSION}, ensure_ascii=False)
+            }
+
+        searchers = {'phrase': ydb_client.aforism_searcher, 'word': ydb_client.word_searcher}
+        key = cache_key(f"/search?kinds={','.join(kinds)}", query_text, limit,
+                        tuple(searchers[kind].index_generation for kind in kinds))
+        cached = ydb_client.response_cache.get(key)
+        degraded = []
+        if cached is None:
+            with track_degraded() as degraded:
+                found = _search(searchers, kinds, query_text, limit)
+            tag = etag(key, found, searchers[kinds[0]].model_id)
+            if degraded:
+                logger.warning(f"Деградированный ответ ({', '.join(degraded)}), в кэш ответов не кладём")
+            else:
+                ydb_client.response_cache.put(key, (found, tag))
+        else:
+            found, tag = cached
+            logger.info(f"Из кэша ответов: '{query_text}'")
+
+        if not degraded and not_modified(event, tag):
+            logger.info(f"Не изменилось (304): '{query_text}'")
+            return {
+                'statusCode': 304,
+                'headers': {'Access-Control-Allow-Origin': '*', 'Access-Control-Allow-Methods': 'POST, OPTIONS',
+                            'Access-Control-Allow-Headers': 'Content-Type', **cache_headers(tag)},
+                'body': ''
+            }
+
+        response = {
+            'query_text': query_text,
+            'backend_id': REPLICA_ID,
+            'backend_version': BACKEND_VERSION,
+            'timestamp': datetime.utcnow().isoformat(),
+            'degraded': bool(degraded)
+        }
+        if degraded:
+            response['degraded_reason'] = ', '.join(degraded)
+        for kind in kinds:
+            response[f'{kind}s'] = found[kind]
+
+        with stage('serialize'):
+            body = json.dumps(response, ensure_ascii=False)
+
+        return {
+            'statusCode': 200,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*',
+                        'Access-Control-Allow-Methods': 'POST, OPTIONS',
+                        'Access-Control-Allow-Headers': 'Content-Type', **cache_headers(tag, degraded=bool(degraded))},
+            'body': body
+        }
+
+    except Exception as e:
+        logger.error(f"Error in search_all: {str(e)}", exc_info=True)
+        return {
+            'statusCode': 500,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*',
+                        'Access-Control-Allow-Methods': 'POST, OPTIONS',
+                        'Access-Control-Allow-Headers': 'Content-Type'},
+            'body': json.dumps(
+                {'error': 'Internal server error', 'backend_id': REPLICA_ID, 'backend_version': BACKEND_VERSION,
+                 'details': str(e)}, ensure_ascii=False)
+        }
+
+
+def _search(searchers: dict, kinds: list[str], query_text: str, limit: int) -> dict[str, list[dict]]:
+    """
+    Результаты по типам: точные совпадения отдаются без модели; эмбеддинг считается один на все типы
+    и только если он нужен хоть одному
+    """
+    found = {}
+    for kind in kinds:
+        fast = searchers[kind].fast_path(query_text, limit=limit)
+        if fast is not None:
+            found[kind] = fast
+    query_vector = None
+    if len(found) < len(kinds):
+        query_vector = searchers[kinds[0]].get_query_embedding(query_text)
+        if query_vector is None:
+            logger.warning("Не удалось векторизовать запрос, ищем только по словам.")
+            mark_degraded('lexical')
+
+    for kind in kinds:
+        if kind not in found:
+            found[kind] = (searchers[kind].search_by_vector(query_vector, limit=limit, query_text=query_text)
+                           if query_vector is not None else searchers[kind].search_lexical(query_text, limit=limit))
+        logger.info(f"Найдено {len(found[kind])} похожих ({kind}): '{query_text}'")
+    return found
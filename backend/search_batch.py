@@ -0,0 +1,90 @@
+import json
+import logging
+import os
+import time
+from db import ydb_client
+from metrics import stage
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+REPLICA_ID = os.getenv('REPLICA_ID', 'replica-search-batch')
+BACKEND_VERSION = 'v1.0.0-python'
+BATCH_SEARCH_LIMIT = int(os.getenv('BATCH_SEARCH_LIMIT', '10000'))
+
+
+def search_batch_handler(event, context):
+    """
+    Пакетный поиск афоризмов или слов для множества текстов, ответ — JSON lines (по строке на запрос)
+    POST /phrase/search, POST /word/search
+    Body: { "texts": ["...", ...], "limit": 5 }
+    В режиме сервера (event['streaming']) строки отдаются по мере готовности
+    """
+    try:
+        kind = 'phrase' if event.get('path', '').startswith('/phrase') else 'word'
+        try:
+            if isinstance(event['body'], str):
+                body = json.loads(event['body'])
+            else:
+                body = event['body']
+
+            texts = [str(text).strip() for text in body['texts']]
+            limit = int(body.get('limit', 5))
+
+            if not texts or len(texts) > BATCH_SEARCH_LIMIT or not 0 < limit <= 100:
+                return {
+                    'statusCode': 400,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*',
+                                'Access-Control-Allow-Methods': 'POST, OPTIONS',
+                                'Access-Control-Allow-Headers': 'Content-Type'},
+                    'body': json.dumps({'error': f'From 1 to {BATCH_SEARCH_LIMIT} texts and limit 1..100 are required',
+                                        'backend_id': REPLICA_ID, 'backend_version': BACKEND_VERSION},
+                                       ensure_ascii=False)
+                }
+
+        except (json.JSONDecodeError, TypeError, KeyError, ValueError) as e:
+            return {
+                'statusCode': 400,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*',
+                            'Access-Control-Allow-Methods': 'POST, OPTIONS',
+                            'Access-Control-Allow-Headers': 'Content-Type'},
+                'body': json.dumps(
+                    {'error': f'Invalid request format: {e}', 'backend_id': REPLICA_ID,
+                     'backend_version': BACKEND_VERSION}, ensure_ascii=False)
+            }
+
+        searcher = ydb_client.aforism_searcher if kind == 'phrase' else ydb_client.word_searcher
+        logger.info(f"Пакетный поиск ({kind}): {len(texts)} запросов в реплике {REPLICA_ID}")
+
+        def lines():
+            started = time.perf_counter()
+            for i, (text, found) in enumerate(zip(texts, searcher.search_batch(texts, limit=limit))):
+                line = {'index': i, 'query_text': text, f'{kind}s': found or []}
+                if found is None:
+                    line['error'] = 'Embedding failed'
+                with stage('serialize'):
+                    encoded = json.dumps(line, ensure_ascii=False) + '\n'
+                yield encoded
+            elapsed = time.perf_counter() - started
+            logger.info(f"Пакетный поиск ({kind}): {len(texts)} запросов за {elapsed:.2f} с "
+                        f"({len(texts) / elapsed if elapsed else 0.0:.1f} запросов/с)")
+
+        return {
+            'statusCode': 200,
+            'headers': {'Content-Type': 'application/x-ndjson; charset=utf-8', 'Access-Control-Allow-Origin': '*',
+                        'Access-Control-Allow-Methods': 'POST, OPTIONS',
+                        'Access-Control-Allow-Headers': 'Content-Type'},
+            'body': lines() if event.get('streaming') else ''.join(lines())
+        }
+
+    except Exception as e:
+        logger.error(f"Error in search_batch: {str(e)}", exc_info=True)
+        return {
+            'statusCode': 500,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*',
+                        'Access-Control-Allow-Methods': 'POST, OPTIONS',
+                        'Access-Control-Allow-Headers': 'Content-Type'},
+            'body': json.dumps(
+                {'error': 'Internal server error', 'backend_id': REPLICA_ID, 'backend_version': BACKEND_VERSION,
+                 'details': str(e)}, ensure_ascii=False)
+        }
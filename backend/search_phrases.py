@@ -3,6 +3,10 @@ import logging
 import os
 from datetime import datetime
 from db import ydb_client
+from degraded import track_degraded
+from metrics import stage
+from response_cache import cache_headers, cache_key, etag, not_modified
+from row_table import fold
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -14,17 +18,22 @@ BACKEND_VERSION = 'v1.0.0-python'
 def search_phrase_handler(event, context):
     """
     Функция для поиска афоризмов
-    GET /phrase
-    Body: { "phrase": "...", "author": "...", "description": "..." }
+    GET /phrase?text=...&limit=5&author=...
+    author (необязательный, без учёта регистра) ограничивает поиск фразами этого автора
+    Ответ несёт ETag по запросу и найденным фразам, одинаковый у всех экземпляров с тем же корпусом.
+    Повторный запрос при том же поколении индекса отдаётся из кэша ответов вместе с ETag,
+    и If-None-Match с ним даёт 304 без поиска; на другом экземпляре 304 отдаётся после поиска, без тела
     """
     try:
         logger.info(f"Ищем в реплике {REPLICA_ID}")
 
         try:
             query_text = event.get('queryStringParameters', {}).get('text', '').strip()
+            limit = int(event.get('queryStringParameters', {}).get('limit', 5))
+            author = fold(event.get('queryStringParameters', {}).get('author'))
 
-            if not query_text:
-                logger.warning("Пустой текст")
+            if not query_text or not 0 < limit <= 100:
+                logger.warning("Пустой текст или limit вне 1..100")
                 return {
                     'statusCode': 400,
                     'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*',
@@ -34,7 +43,7 @@ def search_phrase_handler(event, context):
                                         'backend_version': BACKEND_VERSION}, ensure_ascii=False)
                 }
 
-        except (json.JSONDecodeError, TypeError, KeyError) as e:
+        except (json.JSONDecodeError, TypeError, KeyError, ValueError) as e:
             return {
                 'statusCode': 400,
                 'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*',
@@ -49,23 +58,55 @@ def search_phrase_handler(event, context):
                     ensure_ascii=False)
             }
 
-        phrases = ydb_client.aforism_searcher.search_similar_data(query_text, limit=5)
+        searcher = ydb_client.aforism_searcher
+        key = cache_key(f'/phrase?author={author}' if author else '/phrase', query_text, limit,
+                        searcher.index_generation)
+        cached = ydb_client.response_cache.get(key)
+        degraded = []
+        if cached is None:
+            with track_degraded() as degraded:
+                phrases = searcher.search_similar_data(query_text, limit=limit,
+                                                       filters={'author': author} if author else None)
+            tag = etag(key, phrases, searcher.model_id)
+            if degraded:
+                logger.warning(f"Деградированный ответ ({', '.join(degraded)}), в кэш ответов не кладём")
+            else:
+                ydb_client.response_cache.put(key, (phrases, tag))
+            logger.info(f"Найдено {len(phrases)} похожих фраз: '{query_text}'")
+            logger.info(f"Кэш эмбеддингов запросов: {ydb_client.query_cache.stats()}")
+        else:
+            phrases, tag = cached
+            logger.info(f"Из кэша ответов {len(phrases)} похожих фраз: '{query_text}'")
+
+        if not degraded and not_modified(event, tag):
+            logger.info(f"Не изменилось (304): '{query_text}'")
+            return {
+                'statusCode': 304,
+                'headers': {'Access-Control-Allow-Origin': '*', 'Access-Control-Allow-Methods': 'POST, OPTIONS',
+                            'Access-Control-Allow-Headers': 'Content-Type', **cache_headers(tag)},
+                'body': ''
+            }
 
-        logger.info(f"Найдено {len(phrases)} похожих фраз: '{query_text}'")
         response = {
             'query_text': query_text,
             'phrases': phrases,
             'backend_id': REPLICA_ID,
             'backend_version': BACKEND_VERSION,
-            'timestamp': datetime.utcnow().isoformat()
+            'timestamp': datetime.utcnow().isoformat(),
+            'degraded': bool(degraded)
         }
+        if degraded:
+            response['degraded_reason'] = ', '.join(degraded)
+
+        with stage('serialize'):
+            body = json.dumps(response, ensure_ascii=False)
 
         return {
             'statusCode': 200,
             'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*',
                         'Access-Control-Allow-Methods': 'POST, OPTIONS',
-                        'Access-Control-Allow-Headers': 'Content-Type'},
-            'body': json.dumps(response, ensure_ascii=False)
+                        'Access-Control-Allow-Headers': 'Content-Type', **cache_headers(tag, degraded=bool(degraded))},
+            'body': body
         }
 
     except Exception as e:
@@ -3,6 +3,9 @@ import logging
 import os
 from datetime import datetime
 from db import ydb_client
+from degraded import track_degraded
+from metrics import stage
+from response_cache import cache_headers, cache_key, etag, not_modified
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -12,14 +15,20 @@ BACKEND_VERSION = 'v1.0.0-python'
 
 
 def search_words_handler(event, context):
+    """
+    Функция для поиска слов
+    GET /word?text=...&limit=5
+    ETag по запросу и найденным словам, 304 и кэш ответов — как в search_phrase_handler
+    """
     try:
         logger.info(f"Ищем слова в реплике {REPLICA_ID}")
 
         try:
             query_text = event.get('queryStringParameters', {}).get('text', '').strip()
+            limit = int(event.get('queryStringParameters', {}).get('limit', 5))
 
-            if not query_text:
-                logger.warning("Пустой текст")
+            if not query_text or not 0 < limit <= 100:
+                logger.warning("Пустой текст или limit вне 1..100")
                 return {
                     'statusCode': 400,
                     'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*',
@@ -27,7 +36,7 @@ def search_words_handler(event, context):
                                 'Access-Control-Allow-Headers': 'Content-Type'}, 'body': json.dumps(
                         {'error': 'Text for search is required', 'backend_id': REPLICA_ID,
                          'backend_version': BACKEND_VERSION}, ensure_ascii=False)}
-        except (json.JSONDecodeError, TypeError, KeyError) as e:
+        except (json.JSONDecodeError, TypeError, KeyError, ValueError) as e:
             return {'statusCode': 400,
                     'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*',
                                 'Access-Control-Allow-Methods': 'POST, OPTIONS',
@@ -35,16 +44,46 @@ def search_words_handler(event, context):
                                 }, 'body': json.dumps({'error': 'Invalid request format', 'backend_id': REPLICA_ID,
                                                        'backend_version': BACKEND_VERSION}, ensure_ascii=False)}
 
-        words = ydb_client.word_searcher.search_similar_data(query_text, limit=5)
-        logger.info(f"Найдено {len(words)} похожих слов: '{query_text}'")
+        searcher = ydb_client.word_searcher
+        key = cache_key('/word', query_text, limit, searcher.index_generation)
+        cached = ydb_client.response_cache.get(key)
+        degraded = []
+        if cached is None:
+            with track_degraded() as degraded:
+                words = searcher.search_similar_data(query_text, limit=limit)
+            tag = etag(key, words, searcher.model_id)
+            if degraded:
+                logger.warning(f"Деградированный ответ ({', '.join(degraded)}), в кэш ответов не кладём")
+            else:
+                ydb_client.response_cache.put(key, (words, tag))
+            logger.info(f"Найдено {len(words)} похожих слов: '{query_text}'")
+            logger.info(f"Кэш эмбеддингов запросов: {ydb_client.query_cache.stats()}")
+        else:
+            words, tag = cached
+            logger.info(f"Из кэша ответов {len(words)} похожих слов: '{query_text}'")
+
+        if not degraded and not_modified(event, tag):
+            logger.info(f"Не изменилось (304): '{query_text}'")
+            return {
+                'statusCode': 304,
+                'headers': {'Access-Control-Allow-Origin': '*', 'Access-Control-Allow-Methods': 'POST, OPTIONS',
+                            'Access-Control-Allow-Headers': 'Content-Type', **cache_headers(tag)},
+                'body': ''
+            }
 
         response = {
             'query_text': query_text,
             'words': words,
             'backend_id': REPLICA_ID,
             'backend_version': BACKEND_VERSION,
-            'timestamp': datetime.utcnow().isoformat()
+            'timestamp': datetime.utcnow().isoformat(),
+            'degraded': bool(degraded)
         }
+        if degraded:
+            response['degraded_reason'] = ', '.join(degraded)
+
+        with stage('serialize'):
+            body = json.dumps(response, ensure_ascii=False)
 
         return {
             'statusCode': 200,
@@ -52,9 +91,10 @@ def search_words_handler(event, context):
                 'Content-Type': 'application/json',
                 'Access-Control-Allow-Origin': '*',
                 'Access-Control-Allow-Methods': 'POST, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type'
+                'Access-Control-Allow-Headers': 'Content-Type',
+                **cache_headers(tag, degraded=bool(degraded))
             },
-            'body': json.dumps(response, ensure_ascii=False)
+            'body': body
         }
     except Exception as e:
         logger.error(f"Error in search_words: {str(e)}", exc_info=True)
@@ -1,24 +1,769 @@
+import base64
+import hashlib
+import logging
+import os
+import threading
+import time
 from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from typing import NamedTuple
+from uuid import uuid4
+
+import numpy as np
+
+import sharded
+from ann_index import create_ann_index
+from degraded import mark_degraded
+from embeddings import CircuitOpenError, embed_in_batches
+from lexical_index import LEXICAL_FAST_PATH, LEXICAL_PREFIX_SCORE, LexicalIndex
+from metrics import stage
+from row_table import RowTable
+from snapshot import SNAPSHOT_PATH, load_snapshot, save_snapshot
+from vector_store import VECTOR_DTYPE, FullPrecision, VectorStore, score, score_matrix, spill
+
+logger = logging.getLogger('searcher')
+
+EMBEDDING_COLUMNS = ('embedding', 'embedding_model', 'content_hash')
+SYNC_INTERVAL = float(os.getenv('CORPUS_SYNC_INTERVAL', '5'))
+SYNC_OVERLAP_US = int(os.getenv('CORPUS_SYNC_OVERLAP_US', '5000000'))
+SYNC_IN_BACKGROUND = os.getenv('CORPUS_SYNC_BACKGROUND', '1') == '1'
+HYBRID_LEXICAL_WEIGHT = float(os.getenv('HYBRID_LEXICAL_WEIGHT', '0.5'))
+BATCH_SEARCH_CHUNK = int(os.getenv('BATCH_SEARCH_CHUNK', '256'))
+# при квантованном хранении лучшие limit * RESCORE_FACTOR кандидатов переоцениваются по точным float32-векторам
+RESCORE_FACTOR = int(os.getenv('RESCORE_FACTOR', '4'))
+
+
+def content_hash(text: str | None) -> str:
+    return hashlib.sha256((text or '').encode('utf-8')).hexdigest()
+
+
+def row_version() -> int:
+    """
+    Версия строки — время записи в микросекундах; по ней догружаются изменения после снимка
+    """
+    return time.time_ns() // 1000
+
+
+def encode_vector(vector) -> str:
+    """
+    Упаковывает вектор в base64 от float32 (little-endian) для хранения в Utf8-колонке
+    """
+    return base64.b64encode(np.asarray(vector, dtype='<f4').tobytes()).decode('ascii')
+
+
+def decode_vectors(values: list[str]) -> np.ndarray:
+    """
+    Декодирует пачку векторов одним буфером в матрицу float32
+    """
+    raw = b''.join(base64.b64decode(value) for value in values)
+    return np.frombuffer(raw, dtype='<f4').reshape(len(values), -1)
+
+
+class IndexState(NamedTuple):
+    """
+    Опубликованное состояние индекса. Читатели берут его одним обращением к Searcher._state,
+    поэтому никогда не видят строки от одной загрузки, а векторы от другой
+    """
+    data: RowTable
+    vectors: np.ndarray
+    ann_index: object
+    lexical: LexicalIndex | None = None
+    # масштабы строк для int8 и точные векторы для переоценки — только при квантованном хранении
+    scales: np.ndarray | None = None
+    full: FullPrecision | None = None
+    # как процессам шардированной оценки открыть буферы векторов (VectorStore.descriptor), если она включена
+    shards: tuple | None = None
 
 
 class Searcher(ABC):
-    def __init__(self, ydb_client):
-        self.vectors = None
+    table: str = None
+    columns: tuple[str, ...] = ()
+    similarity_threshold: float = 0.3
+    # поля лексического индекса с весами; по основному полю работает быстрый путь точного совпадения
+    lexical_fields: dict[str, float] = {}
+    primary_field: str = None
+    # колонки с повторяющимися значениями, которые хранятся кодами со справочником
+    interned_columns: tuple[str, ...] = ()
+
+    def __init__(self, ydb_client, embedding_provider, query_cache=None):
         self.model = None
-        self.data = None
         self.ydb_client = ydb_client
+        self.embedding_provider = embedding_provider
+        self.model_id = embedding_provider.model_id
+        self.query_cache = query_cache
+        self._store = None
+        self._full = None
+        self._positions = {}
+        self.ann_index = create_ann_index()
+        self.lexical = None
+        self.version = 0
+        self._corpus_version = None
+        # поколение опубликованного индекса: растёт при каждом его изменении; вместе с _instance
+        # (свой у каждого экземпляра) определяет содержимое индекса для ключей кэша ответов и ETag
+        self._instance = uuid4().hex[:12]
+        self._generation = 0
+        self._synced_at = 0.0
+        self._state = None
+        # писатели (загрузка, догрузка изменений, add_data) сериализуются; читатели блокировку не берут
+        self._lock = threading.RLock()
+        self._sync_guard = threading.Lock()
+        self._sync_thread = None
+
+    @property
+    def data(self) -> RowTable | None:
+        state = self._state
+        return state.data if state is not None else None
+
+    @property
+    def vectors(self) -> np.ndarray | None:
+        state = self._state
+        return state.vectors if state is not None else None
+
+    def _get_embeddings(self, texts: list[str]):
+        """
+        Возвращает матрицу эмбеддингов для текстов или None при ошибке
+        """
+        try:
+            with stage('embed'):
+                return self.embedding_provider.embed(texts)
+        except CircuitOpenError as e:
+            logger.warning(str(e))
+            return None
+        except Exception as e:
+            logger.error(f"Ошибка при получении эмбеддингов ({self.model_id}): {e}")
+            if getattr(e, 'response', None) is not None and e.response.content:
+                logger.error(f"Ответ API: {e.response.content.decode()}")
+            return None
+
+    def get_query_embedding(self, query_text: str):
+        """
+        Эмбеддинг запроса (вектор) через общий кэш; None, если векторизовать не удалось.
+        Если модель недоступна, годится и просроченный по TTL эмбеддинг из кэша — запрос помечается деградированным
+        """
+        if self.query_cache is not None:
+            vector = self.query_cache.get(self.model_id, query_text)
+            if vector is not None:
+                return vector
+
+        vectors = self._get_embeddings([query_text])
+        if vectors is None:
+            vector = self.query_cache.get_stale(self.model_id, query_text) if self.query_cache is not None else None
+            if vector is not None:
+                logger.warning("Модель недоступна, ищем по устаревшему эмбеддингу запроса из кэша.")
+                mark_degraded('stale_embedding')
+            return vector
+        vector = vectors[0]
+        if self.query_cache is not None:
+            self.query_cache.put(self.model_id, query_text, vector)
+        return vector
 
-    @abstractmethod
     def load_data_to_search(self):
         """
-        Загружает данные из БД и создает векторные эмбеддинги
+        Загружает индекс: из снимка (SNAPSHOT_PATH) плюс строки, изменённые после его версии,
+        либо целиком из БД вместе с сохранёнными эмбеддингами.
+        Заново векторизуются только строки с устаревшими моделью или хэшем описания.
+        Новое состояние публикуется целиком, читатели до этого продолжают искать по старому
         """
-        pass
+        with self._lock:
+            self._load()
+
+    def _load(self) -> None:
+        with stage('load'):
+            self._load_state()
+
+    def _load_state(self) -> None:
+        self.ydb_client.connect()
+
+        corpus_version = self.ydb_client.get_corpus_version(self.table)
+        snapshot = load_snapshot(SNAPSHOT_PATH, self.table, self.model_id)
+        if snapshot is not None:
+            rows, vectors, version = snapshot
+            data = RowTable.from_columns(rows, self.interned_columns)
+            # изменения после снимка читаются до публикации, чтобы читатели не увидели снимок без них
+            changes, matrix, changes_version, stale_count = self._read_rows(
+                since_version=max(0, version - SYNC_OVERLAP_US))
+            self._publish(data, *self._make_store(vectors, mapped=True), max(version, changes_version),
+                          changes=(changes, matrix))
+            logger.info(f"{self.table}: из снимка {len(data)} строк, изменений после него {len(changes)}, "
+                        f"заново векторизовано {stale_count}.")
+        else:
+            data, matrix, version, stale_count = self._read_rows()
+            self._publish(data, *self._make_store(matrix), version)
+            logger.info(f"{self.table}: загружено {len(data)} строк, заново векторизовано {stale_count}.")
+
+        self._corpus_version = corpus_version
+        self._synced_at = time.monotonic()
+        if not self._state.data:
+            logger.warning(f"{self.table}: нет строк с векторами, поиск не будет работать.")
+
+    def _apply_changes(self) -> tuple[list[dict], int]:
+        """
+        Догружает строки новее локальной версии (с запасом SYNC_OVERLAP_US на неупорядоченные по времени
+        коммиты разных реплик) и вставляет их в индекс по id
+        """
+        since = max(0, self.version - SYNC_OVERLAP_US)
+        changes, matrix, version, stale_count = self._read_rows(since_version=since)
+        for i, item in enumerate(changes):
+            self._index_item(item, matrix[i])
+        self.version = max(self.version, version)
+        return changes, stale_count
+
+    def sync_changes(self) -> None:
+        """
+        Сверяет версию корпуса в corpus_versions с локальной и при расхождении догружает
+        только новые строки, без полной перезагрузки
+        """
+        try:
+            with stage('load'):
+                corpus_version = self.ydb_client.get_corpus_version(self.table)
+                if corpus_version == self._corpus_version:
+                    return
+                with self._lock:
+                    changes, _ = self._apply_changes()
+                    self._corpus_version = corpus_version
+            logger.info(f"{self.table}: догружено {len(changes)} изменений, версия корпуса {corpus_version}")
+        except Exception as e:
+            logger.error(f"{self.table}: не удалось синхронизировать изменения: {e}")
+
+    def _schedule_sync(self) -> None:
+        """
+        Не чаще раза в SYNC_INTERVAL секунд запускает sync_changes — по умолчанию в фоновом потоке
+        (не больше одного одновременно), чтобы запрос не ждал чтения изменений
+        """
+        if time.monotonic() - self._synced_at < SYNC_INTERVAL:
+            return
+        with self._sync_guard:
+            if time.monotonic() - self._synced_at < SYNC_INTERVAL:
+                return
+            if self._sync_thread is not None and self._sync_thread.is_alive():
+                return
+            self._synced_at = time.monotonic()
+            if not SYNC_IN_BACKGROUND:
+                self.sync_changes()
+                return
+            self._sync_thread = threading.Thread(target=self.sync_changes, name=f'{self.table}-sync', daemon=True)
+            self._sync_thread.start()
+
+    def refresh(self, background: bool = True) -> threading.Thread | None:
+        """
+        Полная перезагрузка индекса; в фоне поиск до публикации нового состояния идёт по старому.
+        В отличие от догрузки изменений подхватывает новый снимок и заново строит ANN-индекс,
+        кластеры которого со временем расходятся с дописанными строками; сервер зовёт её раз в INDEX_REFRESH_INTERVAL
+        """
+        if not background:
+            self.load_data_to_search()
+            return None
+        thread = threading.Thread(target=self.load_data_to_search, name=f'{self.table}-refresh', daemon=True)
+        thread.start()
+        return thread
+
+    def _read_rows(self, since_version: int | None = None):
+        """
+        Читает строки из БД постранично (все или только с version > since_version).
+        Возвращает (строки, матрица их векторов, максимальная версия, сколько векторизовано заново)
+        """
+        data, matrices, backfills = RowTable(('id',) + self.columns, self.interned_columns), [], []
+        stale_count = 0
+        version = since_version or 0
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            for page in self.ydb_client.iter_pages(self.table, ('id',) + self.columns + EMBEDDING_COLUMNS
+                                                   + ('version',), since_version=since_version):
+                fresh, stale = [], []
+                for i in range(len(page['id'])):
+                    item = {column: page[column][i] for column in ('id',) + self.columns}
+                    if (page['embedding'][i] and page['embedding_model'][i] == self.model_id
+                            and page['content_hash'][i] == content_hash(item['description'])):
+                        fresh.append(i)
+                        data.append(item)
+                    else:
+                        stale.append(item)
+                    version = max(version, page['version'][i] or 0)
+
+                if fresh:
+                    matrices.append(decode_vectors([page['embedding'][i] for i in fresh]))
+                if stale:
+                    # векторизация идёт в фоне, пока читаются следующие страницы
+                    backfills.append(executor.submit(self._backfill_embeddings, stale))
+                    stale_count += len(stale)
+
+            for backfill in backfills:
+                embedded = backfill.result()
+                if embedded:
+                    for item, _ in embedded:
+                        data.append(item)
+                    matrices.append(np.vstack([vector for _, vector in embedded]))
+
+        matrix = np.concatenate(matrices) if matrices else np.empty((0, 0), dtype=np.float32)
+        return data, matrix, version, stale_count
+
+    def _make_store(self, matrix: np.ndarray, mapped: bool = False):
+        """
+        Хранилище для загруженной матрицы и источник точных векторов для переоценки.
+        При VECTOR_DTYPE=float32 матрица используется как есть (отображённая в память — без копирования).
+        При int8 в памяти остаются коды, а точные векторы — отображённая матрица снимка
+        или её spill-копия на диске (RESCORE_FACTOR=0 — без переоценки).
+        С шардированной оценкой буферы хранилища отображаются из файлов, общих с процессами пула
+        """
+        if not len(matrix):
+            return None, None
+        shared = sharded.enabled()
+        if VECTOR_DTYPE == 'float32':
+            if mapped:
+                return VectorStore.wrap(matrix, shared=shared), None
+            return VectorStore.from_rows(matrix, shared=shared), None
+        store = VectorStore.from_rows(matrix, dtype=VECTOR_DTYPE, shared=shared)
+        if RESCORE_FACTOR <= 0:
+            return store, None
+        return store, FullPrecision(matrix if mapped else spill(matrix, self.table), self.table)
+
+    def _publish(self, data: RowTable, store: VectorStore | None, full: FullPrecision | None, version: int,
+                 changes: tuple[list[dict], np.ndarray] | None = None) -> None:
+        """
+        Заменяет индекс новым и публикует его одним присваиванием _state. changes — (строки, векторы),
+        которые вставляются по id до публикации: читатели сразу видят загруженный корпус вместе с ними.
+        Файлы прежних хранилища и spill-копии удаляются после публикации
+        """
+        previous, previous_full = self._store, self._full
+        self._positions = {row_id: i for i, row_id in enumerate(data.column('id'))}
+        self._store = store
+        self._full = full
+        self.lexical = LexicalIndex.from_rows(data, self.lexical_fields, self.primary_field)
+        if changes is not None:
+            for item, vector in zip(*changes):
+                self._apply_item(data, item, vector)
+        self.ann_index = self._build_ann_index()
+        self.version = version
+        self._state = self._make_state(data)
+        self._generation += 1
+        if previous is not None and previous is not self._store:
+            previous.release()
+        if previous_full is not None and previous_full is not self._full:
+            previous_full.release()
+
+    def _make_state(self, data: RowTable) -> IndexState:
+        store = self._store
+        if store is None:
+            return IndexState(data, np.array([]), self.ann_index, self.lexical)
+        return IndexState(data, store.matrix, self.ann_index, self.lexical, store.scales, self._full,
+                          store.descriptor() if sharded.enabled() else None)
+
+    def _exact_vectors(self) -> np.ndarray:
+        """
+        float32-матрица всех векторов: матрица хранилища или, при квантовании, точные векторы
+        (если переоценка выключена — восстановленные из кодов)
+        """
+        store = self._store
+        if store is None:
+            return np.empty((0, 0), dtype=np.float32)
+        if not store.quantized:
+            return store.matrix
+        if self._full is not None:
+            return self._full.rows(np.arange(len(store)))
+        return store.dequantize()
+
+    def save_snapshot(self, directory: str) -> str:
+        """
+        Сохраняет текущий индекс в снимок для быстрого холодного старта
+        """
+        self._ensure_loaded()
+        with self._lock:
+            state, version, vectors = self._state, self.version, self._exact_vectors()
+        return save_snapshot(directory, self.table, self.model_id, version, ('id',) + self.columns,
+                             state.data, vectors)
+
+    def _index_item(self, item: dict, vector) -> None:
+        """
+        Добавляет (или заменяет по id) одну строку в загруженный индекс без перезагрузки корпуса.
+        Строки и векторы только дописываются, поэтому ранее опубликованное состояние остаётся согласованным
+        """
+        with self._lock:
+            if self._state is None:
+                return
+            data = self._state.data
+            position = self._apply_item(data, item, vector)
+            if position is None:
+                return
+
+            if self.ann_index is not None and self.ann_index.built:
+                self.ann_index.add(position, np.asarray(vector, dtype=np.float32))
+            else:
+                self.ann_index = self._build_ann_index()
+            self._state = self._make_state(data)
+            self._generation += 1
+
+    def _apply_item(self, data: RowTable, item: dict, vector) -> int | None:
+        """
+        Вставляет (или заменяет по id) строку в данные, хранилище векторов и лексический индекс, без ANN
+        и публикации. Возвращает позицию строки или None, если строка не изменилась
+        """
+        position = self._positions.get(item['id'])
+        if position is not None:
+            if data[position] == item and self._store.equals(position, vector):
+                return None
+            self._store.replace(position, vector)
+            data[position] = item
+        else:
+            if self._store is None:
+                self._store = VectorStore(len(vector), dtype=VECTOR_DTYPE, shared=sharded.enabled())
+                if self._store.quantized and RESCORE_FACTOR > 0:
+                    self._full = FullPrecision(name=self.table)
+            position = self._store.append(vector)
+            self._positions[item['id']] = position
+            data.append(item)
+        if self._full is not None:
+            self._full.set(position, vector)
+        self.lexical.add(position, item)
+        return position
+
+    def _build_ann_index(self):
+        """
+        Новый ANN-индекс (построенный, если строк уже не меньше min_rows) или None, если он выключен.
+        Всегда отдельный объект, чтобы не перестраивать индекс под опубликованным состоянием.
+        Строится по точным векторам: k-means по кодам int8 переполнил бы суммы
+        """
+        ann_index = create_ann_index()
+        if ann_index is not None and self._store is not None and len(self._store) >= ann_index.min_rows:
+            ann_index.build(self._exact_vectors())
+        return ann_index
+
+    def _backfill_embeddings(self, items: list[dict]) -> list[tuple[dict, np.ndarray]]:
+        """
+        Векторизует строки без актуального эмбеддинга и сохраняет результат в БД.
+        Строки из пачек, которые так и не удалось векторизовать, пропускаются до следующей загрузки
+        """
+        vectors, ok = embed_in_batches(self.embedding_provider, [item['description'] or '' for item in items])
+        embedded = [(item, vectors[i]) for i, item in enumerate(items) if ok[i]]
+        if len(embedded) < len(items):
+            logger.warning(f"{self.table}: не удалось векторизовать {len(items) - len(embedded)} строк, они пропущены.")
+        if not embedded:
+            return []
+
+        try:
+            self.ydb_client.upsert_rows(self.table, [
+                {'id': item['id'], **self._embedding_row(item['description'], vector)}
+                for item, vector in embedded
+            ])
+        except Exception as e:
+            logger.error(f"{self.table}: не удалось сохранить эмбеддинги: {e}")
+        return embedded
+
+    def _embedding_row(self, description: str | None, vector) -> dict:
+        return {
+            'embedding': encode_vector(vector),
+            'embedding_model': self.model_id,
+            'content_hash': content_hash(description),
+        }
+
+    def backfill_embeddings(self) -> int:
+        """
+        Досчитывает эмбеддинги для существующих строк; возвращает размер корпуса
+        """
+        self.load_data_to_search()
+        return len(self.data)
+
+    def _ensure_loaded(self) -> None:
+        """
+        Первая загрузка — single-flight: её выполняет один поток, остальные ждут его результата
+        """
+        if self._state is None:
+            with self._lock:
+                if self._state is None:
+                    self._load()
+        else:
+            self._schedule_sync()
+
+    @property
+    def index_generation(self) -> str:
+        """
+        Поколение индекса для ключей кэша ответов этого экземпляра. Меняется при каждом изменении опубликованного
+        состояния (загрузка, догрузка, своя запись), даже если версия корпуса в БД осталась прежней.
+        Растёт после публикации, поэтому ключ нового поколения не достанется результату старого состояния.
+        В ETag не входит: тот считается по найденным результатам и совпадает у всех экземпляров
+        """
+        self._ensure_loaded()
+        return f"{self._instance}:{self._generation}"
+
+    def _filter_rows(self, filters: dict[str, str] | None, state: IndexState) -> np.ndarray | None:
+        """
+        Возрастающие номера строк состояния, подходящих под все фильтры {колонка: значение}, или None без фильтров.
+        Фильтровать можно по interned-колонкам: для них RowTable ведёт списки строк на каждое значение,
+        поэтому стоимость пропорциональна числу подходящих строк, а не размеру корпуса
+        """
+        if not filters:
+            return None
+        rows = None
+        for column, value in filters.items():
+            if column not in self.interned_columns:
+                raise ValueError(f"Фильтр по колонке {column} не поддерживается")
+            matched = np.array(state.data.rows_with(column, value), dtype=np.intp)
+            rows = matched if rows is None else np.intersect1d(rows, matched, assume_unique=True)
+        # списки строк общие с более новыми состояниями: отбрасываем строки, которых в этом состоянии ещё нет
+        size = len(state.vectors) if state.vectors.size else len(state.data)
+        return rows[:np.searchsorted(rows, size)]
+
+    def fast_path(self, query_text: str, limit: int = 5, state: IndexState | None = None,
+                  filters: dict[str, str] | None = None) -> list[dict] | None:
+        """
+        Результаты без обращения к модели: строки, у которых основное поле совпадает с запросом
+        (LEXICAL_FAST_PATH=exact) или начинается с него (prefix). None, если таких нет или быстрый путь выключен
+        """
+        if state is None:
+            self._ensure_loaded()
+            state = self._state
+        return self._fast_path(state, query_text, limit, self._filter_rows(filters, state))
+
+    def _fast_path(self, state: IndexState, query_text: str, limit: int,
+                   allowed: np.ndarray | None) -> list[dict] | None:
+        if LEXICAL_FAST_PATH not in ('exact', 'prefix') or state.lexical is None:
+            return None
+
+        with stage('score'):
+            exact, prefixed = state.lexical.exact(query_text, prefix=LEXICAL_FAST_PATH == 'prefix')
+            size = len(state.data)
+            hits = [(i, 1.0) for i in exact if i < size] + [(i, LEXICAL_PREFIX_SCORE) for i in prefixed if i < size]
+            if allowed is not None and hits:
+                keep = np.isin([i for i, _ in hits], allowed)
+                hits = [hit for hit, ok in zip(hits, keep) if ok]
+        if not hits:
+            return None
+        with stage('build'):
+            return [self._to_result(state.data[i], score) for i, score in hits[:limit]]
+
+    def search_similar_data(self, query_text: str, limit: int = 5, filters: dict[str, str] | None = None):
+        """
+        Ищет похожие данные: точное совпадение — сразу из лексического индекса, иначе по векторам
+        с учётом лексических совпадений; если запрос не удалось векторизовать — только по словам.
+        filters ({колонка: значение}, например {'author': ...}) ограничивает поиск строками с этими значениями:
+        оцениваются только они, поэтому чем избирательнее фильтр, тем дешевле запрос.
+        Строки фильтра считаются один раз и общие для всех путей поиска
+        """
+        self._ensure_loaded()
+        state = self._state
+        if not state.data:
+            return []
+        allowed = self._filter_rows(filters, state)
+        if allowed is not None and not len(allowed):
+            return []
+
+        fast = self._fast_path(state, query_text, limit, allowed)
+        if fast is not None:
+            return fast
+
+        query_vector = self.get_query_embedding(query_text) if state.vectors.size else None
+        if query_vector is None:
+            logger.warning("Не удалось векторизовать запрос, ищем только по словам.")
+            if state.vectors.size:
+                mark_degraded('lexical')
+            return self._search_lexical(state, query_text, limit, allowed)
+        return self._search_by_vector(state, query_vector, limit, query_text, allowed)
+
+    def search_by_vector(self, query_vector, limit: int = 5, query_text: str | None = None,
+                         filters: dict[str, str] | None = None):
+        """
+        Ищет похожие данные по уже посчитанному эмбеддингу запроса; с query_text оценки
+        совпавших по словам строк поднимаются (гибридный поиск)
+        """
+        self._ensure_loaded()
+        state = self._state
+        return self._search_by_vector(state, query_vector, limit, query_text, self._filter_rows(filters, state))
+
+    def _search_by_vector(self, state: IndexState, query_vector, limit: int, query_text: str | None,
+                          rows: np.ndarray | None):
+        if not state.data or state.vectors.size == 0 or (rows is not None and not len(rows)):
+            return []
+
+        with stage('score'):
+            lexical = None
+            if query_text and HYBRID_LEXICAL_WEIGHT > 0 and state.lexical is not None:
+                lexical = state.lexical.search(query_text, len(state.vectors), rows)
+            indices, scores = self._top_k(query_vector, limit, rows=rows, state=state, lexical=lexical)
+        with stage('build'):
+            return [self._to_result(state.data[i], float(score)) for i, score in zip(indices, scores)]
+
+    def search_batch(self, query_texts: list[str], limit: int = 5, chunk_size: int = BATCH_SEARCH_CHUNK):
+        """
+        Пакетный поиск для офлайн-задач: все запросы векторизуются пачками (embed_in_batches, без кэша запросов),
+        затем оцениваются кусками по chunk_size одним произведением матриц (запросы x корпус),
+        top-k каждой строки — векторизованный argpartition. Только семантический поиск, без лексики и ANN.
+        Генератор: по мере готовности кусков отдаёт результаты по порядку запросов, None — если запрос
+        не удалось векторизовать
+        """
+        self._ensure_loaded()
+        state = self._state
+        if not query_texts:
+            return
+        if not state.data or state.vectors.size == 0:
+            yield from ([] for _ in query_texts)
+            return
+
+        with stage('embed'):
+            query_vectors, ok = embed_in_batches(self.embedding_provider, list(query_texts))
+        vectors, scales, full = state.vectors, state.scales, state.full
+        rescore = full is not None and RESCORE_FACTOR > 0
+        limit = max(0, min(limit, len(vectors)))
+        candidates = min(len(vectors), limit * RESCORE_FACTOR if rescore else limit)
+        for start in range(0, len(query_texts), chunk_size):
+            chunk_ok = ok[start:start + chunk_size]
+            if limit == 0 or not chunk_ok.any():
+                yield from ([] if is_ok else None for is_ok in chunk_ok)
+                continue
+
+            with stage('score'):
+                queries = query_vectors[start:start + chunk_size]
+                sharded_top = self._shard_top_k(state, queries, candidates)
+                if sharded_top is not None:
+                    top, top_scores = sharded_top
+                else:
+                    scores = score_matrix(vectors, scales, queries)
+                    top = np.argpartition(scores, -candidates, axis=1)[:, -candidates:]
+                    top_scores = np.take_along_axis(scores, top, axis=1)
+                if rescore:
+                    exact = full.rows(top.ravel()).reshape(len(top), candidates, -1)
+                    top_scores = np.einsum('qkd,qd->qk', exact, queries)
+                order = np.argsort(-top_scores, axis=1, kind='stable')[:, :limit]
+                top = np.take_along_axis(top, order, axis=1)
+                top_scores = np.take_along_axis(top_scores, order, axis=1)
+
+            for i, is_ok in enumerate(chunk_ok):
+                if not is_ok:
+                    yield None
+                    continue
+                yield [self._to_result(state.data[row], float(score)) for row, score in zip(top[i], top_scores[i])
+                       if score > self.similarity_threshold]
+
+    def search_lexical(self, query_text: str, limit: int = 5, filters: dict[str, str] | None = None):
+        """
+        Поиск только по лексическому индексу, без модели
+        """
+        self._ensure_loaded()
+        state = self._state
+        return self._search_lexical(state, query_text, limit, self._filter_rows(filters, state))
+
+    def _search_lexical(self, state: IndexState, query_text: str, limit: int, allowed: np.ndarray | None):
+        if not state.data or state.lexical is None or (allowed is not None and not len(allowed)):
+            return []
+
+        with stage('score'):
+            rows, scores = state.lexical.search(query_text, len(state.data), allowed)
+            hits = np.flatnonzero(scores > self.similarity_threshold)
+            if len(hits) > limit:
+                hits = hits[np.argpartition(scores[hits], -limit)[-limit:]]
+            hits = hits[np.argsort(-scores[hits], kind='stable')]
+        with stage('build'):
+            return [self._to_result(state.data[rows[i]], float(scores[i])) for i in hits]
+
+    def _top_k(self, query_vector, limit: int, rows=None, state: IndexState | None = None, lexical=None):
+        """
+        Индексы и оценки до limit лучших строк выше порога, по убыванию.
+        Векторы нормализованы, поэтому косинусная близость — это скалярное произведение.
+        rows ограничивает оценку подмножеством строк; без него кандидатов даёт ANN-индекс, если он построен,
+        или шардированный просмотр всей матрицы в пуле процессов, иначе вся матрица просматривается здесь.
+        lexical — (строки, оценки) лексического поиска: оценка s такой строки поднимается к 1
+        на HYBRID_LEXICAL_WEIGHT * lexical * (1 - s), а сами строки добавляются к кандидатам ANN
+        """
+        state = state or self._state
+        if limit <= 0:
+            return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.float32)
+
+        vectors = state.vectors
+        query = np.asarray(query_vector, dtype=np.float32)
+        if rows is None and state.ann_index is not None and state.ann_index.built:
+            rows = state.ann_index.candidates(query)
+            # индекс мог пополниться строками, которых ещё нет в этом состоянии
+            rows = rows[rows < len(vectors)]
+            if lexical is not None:
+                rows = np.union1d(rows, lexical[0])
+        elif rows is None:
+            k = limit * RESCORE_FACTOR if state.full is not None and RESCORE_FACTOR > 0 else limit
+            sharded_top = self._shard_top_k(state, query, k)
+            if sharded_top is not None:
+                # строка вне top-k шардов может подняться только лексическим бустом, поэтому лексические строки
+                # добавляются к кандидатам и результат совпадает с полным просмотром
+                rows = np.unique(sharded_top[0][0])
+                if lexical is not None:
+                    rows = np.union1d(rows, lexical[0])
+
+        scores = score(vectors, state.scales, query, rows)
+        boost = None
+        if lexical is not None and len(lexical[0]) and len(scores):
+            lexical_rows, lexical_scores = lexical
+            if rows is None:
+                positions = lexical_rows
+            else:
+                order = np.argsort(rows, kind='stable')
+                found = np.searchsorted(rows, lexical_rows, sorter=order).clip(max=len(rows) - 1)
+                positions = order[found]
+                matched = rows[positions] == lexical_rows
+                positions, lexical_scores = positions[matched], lexical_scores[matched]
+            boost = np.zeros(len(scores), dtype=np.float32)
+            boost[positions] = lexical_scores
+            scores = self._boost(scores, boost)
+
+        if state.full is not None and RESCORE_FACTOR > 0 and len(scores):
+            # приближённые оценки по кодам отбирают кандидатов, итоговые — по точным векторам
+            k = min(len(scores), limit * RESCORE_FACTOR)
+            candidates = np.argpartition(scores, -k)[-k:]
+            rows = candidates if rows is None else rows[candidates]
+            scores = state.full.rows(rows) @ query
+            if boost is not None:
+                scores = self._boost(scores, boost[candidates])
+
+        hits = np.flatnonzero(scores > self.similarity_threshold)
+        if len(hits) > limit:
+            hits = hits[np.argpartition(scores[hits], -limit)[-limit:]]
+        hits = hits[np.argsort(-scores[hits], kind='stable')]
+        return (hits if rows is None else rows[hits]), scores[hits]
+
+    @staticmethod
+    def _shard_top_k(state: IndexState, queries, k: int) -> tuple[np.ndarray, np.ndarray] | None:
+        """
+        Top-k полного просмотра по шардам в пуле процессов: (индексы, оценки) q x k
+        или None, если шардирование выключено, строк меньше двух шардов или пул не ответил
+        """
+        size = len(state.vectors)
+        if state.shards is None or size < 2 * sharded.SHARD_MIN_ROWS:
+            return None
+        try:
+            return sharded.get_pool().top_k(state.shards, size, queries, min(k, size))
+        except Exception as e:
+            logger.warning(f"Шардированная оценка не удалась, считаем в процессе: {e}")
+            return None
+
+    @staticmethod
+    def _boost(scores: np.ndarray, lexical: np.ndarray) -> np.ndarray:
+        return scores + HYBRID_LEXICAL_WEIGHT * lexical * (1 - scores)
+
+    def add_batch(self, items: list[dict]) -> list[dict]:
+        """
+        Добавляет пачку строк (словари с колонками self.columns): один пакетный вызов модели,
+        одна запись через BulkUpsert и одно обновление версии корпуса на всю пачку.
+        Возвращает добавленные строки с id
+        """
+        if not items:
+            return []
+        self.ydb_client.connect()
+
+        results = [{'id': str(uuid4()), **{column: item.get(column) for column in self.columns}} for item in items]
+        vectors, ok = embed_in_batches(self.embedding_provider, [item['description'] or '' for item in results])
+        version = row_version()
+        rows = [
+            dict(result, version=version,
+                 **(self._embedding_row(result['description'], vectors[i]) if ok[i]
+                    else dict.fromkeys(EMBEDDING_COLUMNS)))
+            for i, result in enumerate(results)
+        ]
+
+        self.ydb_client.bulk_upsert(self.table, rows, corpus_version=version)
+        logger.info(f"{self.table}: добавлено {len(rows)} строк, без вектора {int((~ok).sum())}")
+        for i, result in enumerate(results):
+            if ok[i]:
+                self._index_item(result, vectors[i])
+        return results
 
     @abstractmethod
-    def search_similar_data(self, query_text: str, limit: int):
+    def _to_result(self, item: dict, similarity: float) -> dict:
         """
-        Ищет похожие данные, используя векторы
+        Собирает элемент ответа для найденной строки
         """
         pass
 
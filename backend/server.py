@@ -0,0 +1,377 @@
+import json
+import logging
+import mimetypes
+import os
+import selectors
+import signal
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import metrics
+
+logger = logging.getLogger('server')
+
+FRONTEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'frontend')
+# простаивающее keep-alive соединение ждёт в селекторе, а не в потоке пула, поэтому таймаут может быть долгим
+KEEPALIVE_TIMEOUT = float(os.getenv('SERVER_KEEPALIVE_TIMEOUT', '15'))
+# сколько поток пула ждёт остаток начатого запроса (заголовки, тело) от медленного клиента
+REQUEST_TIMEOUT = float(os.getenv('SERVER_REQUEST_TIMEOUT', '5'))
+# полная перезагрузка загруженных индексов в фоне раз в столько секунд (0 — выключить): новый снимок, свежий ANN
+INDEX_REFRESH_INTERVAL = float(os.getenv('INDEX_REFRESH_INTERVAL', '3600'))
+CORS_HEADERS = {
+    'Access-Control-Allow-Origin': '*',
+    'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
+    'Access-Control-Allow-Headers': 'Content-Type',
+}
+
+
+def to_event(method: str, target: str, headers, body: bytes) -> dict:
+    """
+    HTTP-запрос в событие API Gateway, которое ожидает index.handler
+    """
+    url = urlsplit(target)
+    query = parse_qs(url.query, keep_blank_values=True)
+    return {
+        'httpMethod': method,
+        'path': url.path,
+        'headers': dict(headers.items()),
+        'queryStringParameters': {key: values[-1] for key, values in query.items()},
+        'multiValueQueryStringParameters': query,
+        'body': body.decode('utf-8') if body else None,
+        'isBase64Encoded': False,
+        # обработчик может вернуть тело итератором строк, сервер отдаст его chunked по мере готовности
+        'streaming': True,
+    }
+
+
+class RequestHandler(BaseHTTPRequestHandler):
+    """
+    Обработчик живёт столько же, сколько соединение: setup() при открытии, serve_one() на каждый пришедший
+    запрос (в потоке пула), finish() при закрытии. Между запросами соединение ждёт в селекторе сервера
+    """
+    protocol_version = 'HTTP/1.1'
+    timeout = REQUEST_TIMEOUT
+    # заголовки и тело пишутся отдельно: без TCP_NODELAY keep-alive упирается в Nagle + delayed ACK (~40 мс)
+    disable_nagle_algorithm = True
+    server_version = 'Aforisms'
+
+    def __init__(self, request, client_address, server):
+        # BaseRequestHandler.__init__ обслужил бы соединение целиком в одном потоке
+        self.request = request
+        self.client_address = client_address
+        self.server = server
+        self.setup()
+
+    def serve_one(self) -> bool:
+        """
+        Обрабатывает запрос, ради которого соединение стало читаемым, и уже присланные следом (pipelining).
+        True — соединение остаётся открытым для следующего запроса
+        """
+        self.close_connection = True
+        self.handle_one_request()
+        while not self.close_connection and self._buffered():
+            self.handle_one_request()
+        return not self.close_connection
+
+    def _buffered(self) -> bool:
+        """
+        Есть ли уже прочитанные в буфер rfile данные: селектор их не увидит, поэтому их надо обработать сейчас
+        """
+        self.connection.settimeout(0)
+        try:
+            return bool(self.rfile.peek(1))
+        except OSError:
+            return False
+        finally:
+            self.connection.settimeout(self.timeout)
+
+    def do_GET(self):
+        if urlsplit(self.path).path == '/metrics':
+            return self._send_metrics()
+        static = self._static_path()
+        if static is not None:
+            return self._send_static(static)
+        self._dispatch()
+
+    def do_POST(self):
+        self._dispatch()
+
+    def do_OPTIONS(self):
+        self._send(204, CORS_HEADERS, b'')
+
+    def _static_path(self) -> str | None:
+        path = urlsplit(self.path).path
+        name = 'index.html' if path == '/' else path.lstrip('/')
+        full = os.path.realpath(os.path.join(FRONTEND_DIR, name))
+        if not full.startswith(os.path.realpath(FRONTEND_DIR) + os.sep) or not os.path.isfile(full):
+            return None
+        return full
+
+    def _send_static(self, path: str) -> None:
+        with open(path, 'rb') as f:
+            body = f.read()
+        content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        if content_type.startswith('text/') or content_type.endswith(('javascript', 'json')):
+            content_type += '; charset=utf-8'
+        self._send(200, {'Content-Type': content_type}, body)
+
+    def _send_metrics(self) -> None:
+        report = metrics.report()
+        body = json.dumps(report or {'error': 'Histograms are disabled, set METRICS_HISTOGRAM=1'}, ensure_ascii=False)
+        self._send(200 if report else 404, {'Content-Type': 'application/json; charset=utf-8'}, body.encode('utf-8'))
+
+    def _dispatch(self) -> None:
+        started = time.perf_counter()
+        body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        event = to_event(self.command, self.path, self.headers, body)
+        try:
+            result = self.server.app(event, None)
+        except Exception as e:
+            logger.error(f"Ошибка обработчика {event['path']}: {e}", exc_info=True)
+            result = {'statusCode': 500, 'headers': {'Content-Type': 'application/json'},
+                      'body': json.dumps({'error': 'Internal server error'})}
+
+        payload = result.get('body') or ''
+        if isinstance(payload, (str, bytes)):
+            self._send(result.get('statusCode', 200), result.get('headers') or {},
+                       payload.encode('utf-8') if isinstance(payload, str) else payload)
+        else:
+            self._send_chunked(result.get('statusCode', 200), result.get('headers') or {}, payload,
+                               result.get('trailers'))
+        logger.info(f"{self.command} {event['path']} {result.get('statusCode')} "
+                    f"{(time.perf_counter() - started) * 1000:.1f} мс")
+
+    def _send(self, status: int, headers: dict, body: bytes) -> None:
+        self.send_response(status)
+        for name, value in headers.items():
+            if name.lower() not in ('content-length', 'connection'):
+                self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        if self.server.stopping:
+            self.send_header('Connection', 'close')
+            self.close_connection = True
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_chunked(self, status: int, headers: dict, chunks, trailers=None) -> None:
+        """
+        Тело по частям (chunked). trailers — функция, возвращающая заголовки-трейлеры после отдачи тела
+        """
+        self.send_response(status)
+        for name, value in headers.items():
+            if name.lower() not in ('content-length', 'connection', 'transfer-encoding'):
+                self.send_header(name, value)
+        self.send_header('Transfer-Encoding', 'chunked')
+        if self.server.stopping:
+            self.send_header('Connection', 'close')
+            self.close_connection = True
+        self.end_headers()
+        try:
+            for chunk in chunks:
+                data = chunk.encode('utf-8') if isinstance(chunk, str) else chunk
+                if data:
+                    self.wfile.write(b'%x\r\n%s\r\n' % (len(data), data))
+            fields = trailers() if trailers is not None else {}
+            trailer = ''.join(f"{name}: {value}\r\n" for name, value in fields.items())
+            self.wfile.write(b'0\r\n%s\r\n' % trailer.encode('latin-1'))
+        except Exception as e:
+            # заголовки уже отправлены: обрываем соединение, клиент увидит незавершённый ответ
+            logger.error(f"Ошибка при потоковой отдаче ответа: {e}", exc_info=True)
+            self.close_connection = True
+        finally:
+            close = getattr(chunks, 'close', None)
+            if close is not None:
+                close()
+
+    def log_message(self, format, *args):
+        pass
+
+
+class PooledHTTPServer(HTTPServer):
+    """
+    HTTP-сервер с фиксированным пулом потоков. Поток пула занят только пока обрабатывается запрос:
+    новое соединение и keep-alive соединение между запросами ждут в селекторе отдельного потока
+    и отдаются в пул, когда в них пришли данные, поэтому простаивающие вкладки браузера не занимают пул.
+    При остановке новые соединения не принимаются, простаивающие закрываются, открытые — после текущего
+    запроса, а запущенные запросы дорабатывают
+    """
+
+    def __init__(self, address, app, workers: int):
+        super().__init__(address, RequestHandler)
+        self.app = app
+        self.stopping = False
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='http')
+        self._connections: dict[socket.socket, RequestHandler] = {}
+        self._connections_lock = threading.Lock()
+        self._parking: list[RequestHandler] = []
+        self._selector = selectors.DefaultSelector()
+        self._wakeup, self._wakeup_sender = socket.socketpair()
+        self._wakeup.setblocking(False)
+        self._selector.register(self._wakeup, selectors.EVENT_READ)
+        self._idle_stopped = False
+        self._idle_thread = threading.Thread(target=self._watch_idle, name='http-idle', daemon=True)
+        self._idle_thread.start()
+
+    def process_request(self, request, client_address):
+        try:
+            handler = RequestHandler(request, client_address, self)
+        except Exception:
+            self.handle_error(request, client_address)
+            self.shutdown_request(request)
+            return
+        with self._connections_lock:
+            self._connections[request] = handler
+        self._park(handler)
+
+    def _park(self, handler: RequestHandler) -> None:
+        with self._connections_lock:
+            self._parking.append(handler)
+        self._wake()
+
+    def _wake(self) -> None:
+        try:
+            self._wakeup_sender.send(b'\0')
+        except OSError:
+            pass
+
+    def _serve(self, handler: RequestHandler) -> None:
+        try:
+            keep = handler.serve_one() and not self.stopping
+        except Exception:
+            self.handle_error(handler.request, handler.client_address)
+            keep = False
+        if keep:
+            self._park(handler)
+        else:
+            self._close(handler)
+
+    def _close(self, handler: RequestHandler) -> None:
+        with self._connections_lock:
+            self._connections.pop(handler.request, None)
+        try:
+            handler.finish()
+        except OSError:
+            pass
+        self.shutdown_request(handler.request)
+
+    def _watch_idle(self) -> None:
+        """
+        Поток селектора: отдаёт читаемые соединения в пул и закрывает простаивающие дольше KEEPALIVE_TIMEOUT
+        """
+        idle: dict[RequestHandler, float] = {}
+        while True:
+            for key, _ in self._selector.select(timeout=1.0):
+                if key.fileobj is self._wakeup:
+                    try:
+                        self._wakeup.recv(4096)
+                    except BlockingIOError:
+                        pass
+                    continue
+                handler = key.data
+                self._selector.unregister(key.fileobj)
+                idle.pop(handler, None)
+                try:
+                    self._executor.submit(self._serve, handler)
+                except RuntimeError:
+                    # пул уже остановлен
+                    self._close(handler)
+
+            now = time.monotonic()
+            with self._connections_lock:
+                parking, self._parking = self._parking, []
+            for handler in parking:
+                if self.stopping:
+                    self._close(handler)
+                    continue
+                self._selector.register(handler.connection, selectors.EVENT_READ, handler)
+                idle[handler] = now
+            for handler, since in list(idle.items()):
+                if self.stopping or now - since > KEEPALIVE_TIMEOUT:
+                    self._selector.unregister(handler.connection)
+                    del idle[handler]
+                    self._close(handler)
+            if self._idle_stopped:
+                return
+
+    def graceful_shutdown(self) -> None:
+        self.stopping = True
+        self.shutdown()
+        # простаивающие соединения закрываются сразу; ответы на текущие запросы допишутся с Connection: close
+        self._wake()
+        self._executor.shutdown(wait=True)
+        self._idle_stopped = True
+        self._wake()
+        self._idle_thread.join()
+        self._selector.close()
+        self._wakeup.close()
+        self._wakeup_sender.close()
+        self.server_close()
+
+
+def refresh_indexes(ydb_client, stop: threading.Event) -> None:
+    """
+    Раз в INDEX_REFRESH_INTERVAL секунд перезагружает уже загруженные индексы; поиск до публикации
+    нового состояния идёт по старому
+    """
+    while not stop.wait(INDEX_REFRESH_INTERVAL):
+        for searcher in (ydb_client.aforism_searcher, ydb_client.word_searcher):
+            if searcher.data is None:
+                continue
+            try:
+                searcher.refresh(background=False)
+            except Exception as e:
+                logger.error(f"{searcher.table}: не удалось перезагрузить индекс: {e}")
+
+
+def serve(host: str = '127.0.0.1', port: int = 8080, workers: int = 16, warmup: bool = True,
+          histogram: bool = False) -> None:
+    """
+    Запускает index.handler как постоянно работающий HTTP-сервис с тёплыми поисковиками и статикой frontend/.
+    С histogram (или METRICS_HISTOGRAM=1) длительности этапов копятся в гистограммах:
+    GET /metrics отдаёт p50/p95/p99 вместе с состоянием защиты модели эмбеддингов, при остановке они пишутся в лог
+    """
+    if histogram:
+        metrics.METRICS_HISTOGRAM = True
+    import sharded
+    from db import ydb_client
+    from index import handler
+
+    if warmup:
+        started = time.perf_counter()
+        ydb_client.connect()
+        for searcher in (ydb_client.aforism_searcher, ydb_client.word_searcher):
+            searcher.load_data_to_search()
+        pool = sharded.get_pool()
+        if pool is not None:
+            pool.warmup()
+        metrics.mark_warm()
+        logger.info(f"Индексы прогреты за {time.perf_counter() - started:.2f} с")
+
+    server = PooledHTTPServer((host, port), handler, workers)
+    stop = threading.Event()
+
+    def request_stop(signum, frame):
+        logger.info(f"Получен сигнал {signum}, останавливаемся")
+        stop.set()
+
+    signal.signal(signal.SIGINT, request_stop)
+    signal.signal(signal.SIGTERM, request_stop)
+
+    thread = threading.Thread(target=server.serve_forever, name='http-accept', daemon=True)
+    thread.start()
+    if INDEX_REFRESH_INTERVAL > 0:
+        threading.Thread(target=refresh_indexes, args=(ydb_client, stop), name='index-refresh', daemon=True).start()
+    logger.info(f"Сервер запущен на http://{host}:{port} ({workers} потоков)")
+    stop.wait()
+
+    server.graceful_shutdown()
+    report = metrics.report()
+    if report:
+        logger.info(f"Метрики: {json.dumps(report, ensure_ascii=False)}")
+    ydb_client.close()
+    sharded.shutdown()
+    logger.info("Сервер остановлен")
@@ -0,0 +1,156 @@
+import logging
+import os
+import threading
+
+import numpy as np
+
+from vector_store import score_matrix
+
+logger = logging.getLogger('sharded')
+
+# 0 — шардирование выключено; иначе число процессов, по которым делится полный просмотр матрицы
+SHARD_WORKERS = int(os.getenv('SHARD_WORKERS', '0'))
+# меньше строк на шард не делим: пересылка запроса и слияние дороже выигрыша
+SHARD_MIN_ROWS = int(os.getenv('SHARD_MIN_ROWS', '20000'))
+
+
+def enabled() -> bool:
+    return SHARD_WORKERS > 0
+
+
+def describe(array: np.ndarray | None):
+    """
+    Как рабочему процессу открыть тот же буфер без копирования: (путь, inode, смещение, dtype, форма)
+    файла, отображённого в память. inode защищает от подмены файла по тому же пути (новый снимок).
+    None, если буфер не отображён из файла
+    """
+    base = array
+    while base is not None and not isinstance(base, np.memmap):
+        base = base.base
+    if base is None or getattr(base, 'filename', None) is None:
+        return None
+    try:
+        stat = os.stat(base.filename)
+    except OSError:
+        return None
+    return base.filename, stat.st_ino, base.offset, base.dtype.str, base.shape
+
+
+# --- рабочий процесс ---
+
+_attached: dict[tuple, np.ndarray] = {}
+
+
+def _attach(descriptor) -> np.ndarray:
+    array = _attached.get(descriptor)
+    if array is not None:
+        return array
+    path, inode, offset, dtype, shape = descriptor
+    with open(path, 'rb') as file:
+        if os.fstat(file.fileno()).st_ino != inode:
+            raise FileNotFoundError(f"{path} заменён после публикации состояния")
+        array = np.memmap(file, dtype=dtype, mode='r', offset=offset, shape=shape)
+    # после роста матрицы старые буферы больше не запрашиваются: держим только последние отображения
+    while len(_attached) >= 4:
+        _attached.pop(next(iter(_attached)))
+    _attached[descriptor] = array
+    return array
+
+
+def _ping() -> int:
+    return os.getpid()
+
+
+def _score_shard(vectors_descriptor, scales_descriptor, start: int, stop: int, queries: np.ndarray, k: int):
+    vectors = _attach(vectors_descriptor)[start:stop]
+    scales = _attach(scales_descriptor)[start:stop] if scales_descriptor is not None else None
+    scores = score_matrix(vectors, scales, queries)
+    k = min(k, stop - start)
+    top = np.argpartition(scores, -k, axis=1)[:, -k:]
+    return top + start, np.take_along_axis(scores, top, axis=1)
+
+
+# --- родительский процесс ---
+
+class ShardPool:
+    """
+    Пул процессов для полного просмотра матрицы: строки [0, size) делятся на непрерывные шарды,
+    каждый процесс считает top-k своего шарда по общему отображённому буферу, результаты сливаются в родителе.
+    Запрос пересылает только векторы запросов и описание буфера, матрица не копируется
+    """
+
+    def __init__(self, workers: int):
+        from concurrent.futures import ProcessPoolExecutor
+        from multiprocessing import get_context
+
+        self.workers = workers
+        # spawn, а не fork: родитель многопоточный (пул HTTP, фоновая догрузка)
+        self._start = lambda: ProcessPoolExecutor(max_workers=workers, mp_context=get_context('spawn'))
+        self._executor = self._start()
+        logger.info(f"Пул шардированной оценки: {workers} процессов")
+
+    def shards(self, size: int) -> list[tuple[int, int]]:
+        count = max(1, min(self.workers, size // max(SHARD_MIN_ROWS, 1)))
+        bounds = np.linspace(0, size, count + 1).astype(int)
+        return list(zip(bounds[:-1].tolist(), bounds[1:].tolist()))
+
+    def top_k(self, descriptor: tuple, size: int, queries: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Для каждого запроса (q x dim) — k лучших строк среди первых size: (индексы q x k, оценки q x k)
+        по убыванию оценки. descriptor — (векторы, масштабы) из VectorStore.descriptor()
+        """
+        from concurrent.futures.process import BrokenProcessPool
+
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        futures = [self._executor.submit(_score_shard, *descriptor, start, stop, queries, k)
+                   for start, stop in self.shards(size)]
+        try:
+            parts = [future.result() for future in futures]
+        except BrokenProcessPool:
+            # процесс пула упал (например, OOM): следующий запрос пойдёт в новый пул
+            logger.warning("Пул шардированной оценки сломан, перезапускаем")
+            self._executor = self._start()
+            raise
+        indices = np.concatenate([part[0] for part in parts], axis=1)
+        scores = np.concatenate([part[1] for part in parts], axis=1)
+        k = min(k, indices.shape[1])
+        top = np.argpartition(scores, -k, axis=1)[:, -k:]
+        indices, scores = np.take_along_axis(indices, top, axis=1), np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(-scores, axis=1, kind='stable')
+        return np.take_along_axis(indices, order, axis=1), np.take_along_axis(scores, order, axis=1)
+
+    def warmup(self) -> None:
+        """
+        Запускает процессы заранее, чтобы первый запрос не платил за их старт и импорт numpy
+        """
+        for future in [self._executor.submit(_ping) for _ in range(self.workers)]:
+            future.result()
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=True)
+
+
+_pool: ShardPool | None = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> ShardPool | None:
+    """
+    Общий пул процессов или None, если SHARD_WORKERS=0
+    """
+    global _pool
+    if not enabled():
+        return None
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ShardPool(SHARD_WORKERS)
+    return _pool
+
+
+def shutdown() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown()
+            _pool = None
@@ -0,0 +1,138 @@
+import json
+import logging
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+logger = logging.getLogger('snapshot')
+
+SNAPSHOT_FORMAT = 1
+SNAPSHOT_PATH = os.getenv('SNAPSHOT_PATH')
+SNAPSHOT_CACHE_DIR = os.getenv('SNAPSHOT_CACHE_DIR', '/tmp/snapshots')
+
+# Снимок индекса таблицы — каталог из трёх файлов:
+#   meta.json    — заголовок: формат, таблица, модель, версия корпуса, число строк и размерность;
+#   rows.json    — колоночная таблица {колонка: [значения]} для id и текстов;
+#   vectors.npy  — матрица float32, открывается через np.load(mmap_mode='r') без чтения в память.
+
+
+def save_snapshot(directory: str, table: str, model_id: str, version: int, columns: tuple[str, ...],
+                  data, vectors: np.ndarray) -> str:
+    target = os.path.join(directory, table)
+    tmp = f"{target}.tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+
+    np.save(os.path.join(tmp, 'vectors.npy'), np.ascontiguousarray(vectors, dtype=np.float32))
+    with open(os.path.join(tmp, 'rows.json'), 'w', encoding='utf-8') as f:
+        json.dump({column: data.column(column) for column in columns}, f, ensure_ascii=False)
+    with open(os.path.join(tmp, 'meta.json'), 'w', encoding='utf-8') as f:
+        json.dump({
+            'format': SNAPSHOT_FORMAT,
+            'table': table,
+            'model_id': model_id,
+            'version': version,
+            'rows': len(data),
+            'dim': int(vectors.shape[1]) if len(data) else 0,
+        }, f)
+
+    shutil.rmtree(target, ignore_errors=True)
+    os.replace(tmp, target)
+    logger.info(f"Снимок {table} сохранён в {target}: {len(data)} строк, версия {version}")
+    return target
+
+
+def _s3_client():
+    import boto3
+
+    return boto3.client('s3', endpoint_url=os.getenv('S3_ENDPOINT', 'https://storage.yandexcloud.net'))
+
+
+def _resolve(location: str, table: str) -> str | None:
+    """
+    Локальный каталог снимка таблицы. location — локальный путь (в т.ч. внутри zip функции)
+    или s3://bucket/prefix в Object Storage. Снимок из S3 кэшируется в SNAPSHOT_CACHE_DIR и используется,
+    пока его meta.json совпадает с meta.json в S3; новый снимок скачивается во временный каталог
+    и подменяет кэш переименованием, так что прерванная загрузка не оставляет половину снимка
+    """
+    if not location.startswith('s3://'):
+        path = os.path.join(location, table)
+        return path if os.path.isdir(path) else None
+
+    local = os.path.join(SNAPSHOT_CACHE_DIR, table)
+    cached_meta = os.path.join(local, 'meta.json')
+    bucket, _, prefix = location[len('s3://'):].partition('/')
+    s3 = _s3_client()
+
+    def key(name: str) -> str:
+        return '/'.join(part for part in (prefix.strip('/'), table, name) if part)
+
+    try:
+        meta = s3.get_object(Bucket=bucket, Key=key('meta.json'))['Body'].read()
+    except Exception as e:
+        if not os.path.isfile(cached_meta):
+            raise
+        logger.warning(f"meta.json снимка {table} в S3 недоступен ({e}), открываем скачанную ранее копию")
+        return local
+    if os.path.isfile(cached_meta):
+        with open(cached_meta, 'rb') as f:
+            if f.read() == meta:
+                return local
+        logger.info(f"Снимок {table} в S3 обновился, скачиваем заново")
+
+    os.makedirs(SNAPSHOT_CACHE_DIR, exist_ok=True)
+    tmp = tempfile.mkdtemp(prefix=f"{table}.", suffix='.tmp', dir=SNAPSHOT_CACHE_DIR)
+    try:
+        for name in ('vectors.npy', 'rows.json'):
+            s3.download_file(bucket, key(name), os.path.join(tmp, name))
+    except Exception as e:
+        shutil.rmtree(tmp, ignore_errors=True)
+        if not os.path.isfile(cached_meta):
+            raise
+        logger.warning(f"Снимок {table} не скачан ({e}), открываем скачанную ранее копию")
+        return local
+    try:
+        with open(os.path.join(tmp, 'meta.json'), 'wb') as f:
+            f.write(meta)
+        stale = f"{tmp}.old"
+        if os.path.isdir(local):
+            os.rename(local, stale)
+        try:
+            os.rename(tmp, local)
+        except OSError:
+            # другой процесс успел положить свежий снимок раньше
+            logger.info(f"Снимок {table} уже скачан другим процессом")
+        shutil.rmtree(stale, ignore_errors=True)
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+    return local
+
+
+def load_snapshot(location: str | None, table: str, model_id: str):
+    """
+    Возвращает (rows, vectors, version) или None, если снимка нет или он построен другой моделью.
+    rows — колонки {колонка: [значения]} как в rows.json
+    """
+    if not location:
+        return None
+    try:
+        path = _resolve(location, table)
+        if path is None:
+            return None
+
+        with open(os.path.join(path, 'meta.json'), encoding='utf-8') as f:
+            meta = json.load(f)
+        if meta['format'] != SNAPSHOT_FORMAT or meta['model_id'] != model_id:
+            logger.warning(f"Снимок {table} не подходит: формат {meta['format']}, модель {meta['model_id']}")
+            return None
+
+        with open(os.path.join(path, 'rows.json'), encoding='utf-8') as f:
+            rows = json.load(f)
+        vectors = np.load(os.path.join(path, 'vectors.npy'), mmap_mode='r')
+        logger.info(f"Снимок {table} открыт: {meta['rows']} строк, версия {meta['version']}")
+        return rows, vectors, meta['version']
+    except Exception as e:
+        logger.error(f"Не удалось загрузить снимок {table} из {location}: {e}", exc_info=True)
+        return None
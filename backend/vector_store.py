@@ -0,0 +1,314 @@
+import atexit
+import os
+import uuid
+
+import numpy as np
+
+# int8 — компактное хранение; float16 не поддерживается: numpy переводит его во float32 программно,
+# и полный просмотр в 10-16 раз медленнее float32 при вдвое большем размере, чем у int8
+VECTOR_DTYPES = ('float32', 'int8')
+VECTOR_DTYPE = os.getenv('VECTOR_DTYPE', 'float32')
+VECTOR_SPILL_DIR = os.getenv('VECTOR_SPILL_DIR', '/tmp/vectors')
+# общие буферы для процессов шардированной оценки; /dev/shm — в памяти, без записи на диск
+VECTOR_SHARED_DIR = os.getenv('VECTOR_SHARED_DIR', '/dev/shm' if os.path.isdir('/dev/shm') else VECTOR_SPILL_DIR)
+# кусок помещается в кэш процессора: перевод int8 -> float32 кусками по 4096 строк почти вдвое быстрее, чем по 16384
+SCORE_CHUNK = 4096
+
+
+def quantize_int8(matrix) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Симметричное скалярное квантование по строкам: код = round(127 * x / max|x|), масштаб = max|x| / 127
+    """
+    matrix = np.asarray(matrix, dtype=np.float32)
+    rows = np.atleast_2d(matrix)
+    scales = np.abs(rows).max(axis=1) / 127
+    scales[scales == 0] = 1.0
+    codes = np.rint(rows / scales[:, None]).astype(np.int8)
+    if matrix.ndim == 1:
+        return codes[0], scales[0]
+    return codes, scales
+
+
+def dequantize(vectors: np.ndarray, scales: np.ndarray | None, rows=None) -> np.ndarray:
+    part = vectors if rows is None else vectors[rows]
+    part = part.astype(np.float32, copy=False)
+    if scales is not None:
+        part = part * (scales if rows is None else scales[rows])[:, None]
+    return part
+
+
+def score_matrix(vectors: np.ndarray, scales: np.ndarray | None, queries: np.ndarray,
+                 chunk: int = SCORE_CHUNK) -> np.ndarray:
+    """
+    Скалярные произведения запросов (q x dim) со всеми строками (-> q x n) в float32.
+    int8 переводится в float32 кусками по chunk строк, так что временная память не зависит от корпуса;
+    перевод идёт на каждом запросе, и просмотр в 2-3 раза медленнее, чем во float32
+    """
+    queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+    if vectors.dtype == np.float32:
+        return queries @ vectors.T
+    scores = np.empty((len(queries), len(vectors)), dtype=np.float32)
+    for start in range(0, len(vectors), chunk):
+        part = vectors[start:start + chunk].astype(np.float32)
+        scores[:, start:start + chunk] = queries @ part.T
+    if scales is not None:
+        scores *= scales[:len(vectors)]
+    return scores
+
+
+def score(vectors: np.ndarray, scales: np.ndarray | None, query, rows=None) -> np.ndarray:
+    """
+    Оценки одного запроса по всем строкам или по подмножеству rows
+    """
+    if rows is None:
+        return score_matrix(vectors, scales, query)[0]
+    return dequantize(vectors, scales, rows) @ np.asarray(query, dtype=np.float32)
+
+
+# файлы, созданные этим процессом (общие буферы и spill-копии): удаляются release_shared или при выходе
+_shared_files: set[str] = set()
+
+
+def spill(matrix: np.ndarray, name: str) -> np.ndarray:
+    """
+    Сохраняет float32-матрицу в свой файл в VECTOR_SPILL_DIR и открывает её через mmap для чтения и записи:
+    точные векторы для переоценки лежат в страничном кэше, а не в памяти процесса. Имя с pid и uuid,
+    поэтому поисковики и процессы с одной таблицей не пишут в общий файл. Копирует кусками: исходная
+    матрица может быть отображённой в память и не читается целиком
+    """
+    os.makedirs(VECTOR_SPILL_DIR, exist_ok=True)
+    path = os.path.abspath(os.path.join(VECTOR_SPILL_DIR, f"{name}-{os.getpid()}-{uuid.uuid4().hex}.npy"))
+    _shared_files.add(path)
+    copy = np.lib.format.open_memmap(path, mode='w+', dtype=np.float32, shape=matrix.shape)
+    for start in range(0, len(matrix), SCORE_CHUNK):
+        copy[start:start + SCORE_CHUNK] = matrix[start:start + SCORE_CHUNK]
+    copy.flush()
+    del copy
+    return np.load(path, mmap_mode='r+')
+
+
+def shared_empty(shape: tuple[int, ...], dtype) -> np.ndarray:
+    """
+    Неинициализированный массив, отображённый из файла в VECTOR_SHARED_DIR: другие процессы открывают
+    тот же буфер по пути и видят дописанные строки без копирования
+    """
+    os.makedirs(VECTOR_SHARED_DIR, exist_ok=True)
+    path = os.path.abspath(os.path.join(VECTOR_SHARED_DIR, f"vectors-{os.getpid()}-{uuid.uuid4().hex}.bin"))
+    _shared_files.add(path)
+    return np.memmap(path, dtype=dtype, mode='w+', shape=shape)
+
+
+def release_shared(array: np.ndarray | None) -> None:
+    """
+    Удаляет файл общего буфера или spill-копии, созданный этим процессом; чужие файлы (снимок) не трогает.
+    Уже открытые отображения остаются рабочими до их закрытия
+    """
+    path = getattr(array, 'filename', None)
+    if path in _shared_files:
+        _shared_files.discard(path)
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+
+
+@atexit.register
+def _release_all_shared() -> None:
+    for path in list(_shared_files):
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+    _shared_files.clear()
+
+
+class FullPrecision:
+    """
+    Точные float32-векторы для переоценки кандидатов при квантованном хранении, по позиции строки:
+    отображённая в память матрица (снимок или spill) и растущий буфер строк, дописанных после загрузки.
+    Замена строки пишется на место; матрица снимка при первой замене копируется в свой spill-файл,
+    чтобы не менять снимок
+    """
+
+    def __init__(self, matrix: np.ndarray | None = None, name: str = 'vectors'):
+        self.matrix = matrix
+        self.name = name
+        self._tail: VectorStore | None = None
+
+    @property
+    def _base(self) -> int:
+        return len(self.matrix) if self.matrix is not None else 0
+
+    def set(self, index: int, vector) -> None:
+        base = self._base
+        if index < base:
+            if not self.matrix.flags.writeable:
+                self.matrix = spill(self.matrix, self.name)
+            self.matrix[index] = vector
+            return
+        if self._tail is None:
+            self._tail = VectorStore(len(vector))
+        # позиции дописываются по порядку вместе с хранилищем кодов
+        if index - base < len(self._tail):
+            self._tail.replace(index - base, vector)
+        else:
+            self._tail.append(vector)
+
+    def rows(self, indices: np.ndarray) -> np.ndarray:
+        indices = np.asarray(indices, dtype=np.intp)
+        tail = self._tail.matrix if self._tail is not None else None
+        if tail is None:
+            return np.asarray(self.matrix[indices], dtype=np.float32)
+        base = self._base
+        result = np.empty((len(indices), tail.shape[1]), dtype=np.float32)
+        in_base = indices < base
+        if in_base.any():
+            result[in_base] = self.matrix[indices[in_base]]
+        result[~in_base] = tail[indices[~in_base] - base]
+        return result
+
+    @property
+    def dim(self) -> int:
+        if self.matrix is not None:
+            return self.matrix.shape[1]
+        return self._tail.dim
+
+    def release(self) -> None:
+        """
+        Удаляет spill-копию, когда источник заменён новым; матрица снимка остаётся на месте
+        """
+        release_shared(self.matrix)
+
+
+class VectorStore:
+    """
+    Растущая матрица векторов с предвыделенной ёмкостью: добавление строки
+    амортизированно O(1), без np.vstack на каждую вставку.
+    dtype int8 хранит векторы квантованными с масштабом на строку.
+    shared — буферы отображаются из файлов (shared_empty), чтобы их читали процессы шардированной оценки
+    """
+
+    def __init__(self, dim: int, capacity: int = 1024, dtype=np.float32, shared: bool = False):
+        if np.dtype(dtype).name not in VECTOR_DTYPES:
+            raise ValueError(f"Неподдерживаемый тип хранения векторов: {dtype} (допустимы {', '.join(VECTOR_DTYPES)})")
+        self.dim = dim
+        self.dtype = np.dtype(dtype)
+        self.shared = shared
+        self._buffer = self._allocate((max(capacity, 1), dim), self.dtype)
+        self._scales = self._allocate((max(capacity, 1),), np.float32) if self.dtype == np.int8 else None
+        self._size = 0
+
+    def _allocate(self, shape: tuple[int, ...], dtype) -> np.ndarray:
+        return shared_empty(shape, dtype) if self.shared else np.empty(shape, dtype=dtype)
+
+    @classmethod
+    def from_rows(cls, rows, dtype=np.float32, shared: bool = False) -> 'VectorStore':
+        """
+        Хранилище из готовой матрицы; квантование идёт кусками, поэтому исходная матрица
+        может быть отображённой в память и не читается в память целиком
+        """
+        rows = rows if isinstance(rows, np.ndarray) else np.asarray(rows, dtype=np.float32)
+        store = cls(rows.shape[1], capacity=len(rows) + max(1024, len(rows) // 8), dtype=dtype, shared=shared)
+        for start in range(0, len(rows), SCORE_CHUNK):
+            part = rows[start:start + SCORE_CHUNK]
+            store._write(slice(start, start + len(part)), part)
+        store._size = len(rows)
+        return store
+
+    @classmethod
+    def wrap(cls, matrix: np.ndarray, shared: bool = False) -> 'VectorStore':
+        """
+        Хранилище поверх готовой (например, отображённой в память) матрицы без копирования;
+        копия с запасом ёмкости делается только при первом изменении
+        """
+        store = cls.__new__(cls)
+        store.dim = matrix.shape[1]
+        store.dtype = matrix.dtype
+        store.shared = shared
+        store._buffer = matrix
+        store._scales = None
+        store._size = len(matrix)
+        return store
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def matrix(self) -> np.ndarray:
+        return self._buffer[:self._size]
+
+    @property
+    def scales(self) -> np.ndarray | None:
+        return self._scales[:self._size] if self._scales is not None else None
+
+    @property
+    def quantized(self) -> bool:
+        return self.dtype != np.float32
+
+    @property
+    def row_bytes(self) -> int:
+        return self.dim * self.dtype.itemsize + (4 if self._scales is not None else 0)
+
+    def dequantize(self) -> np.ndarray:
+        return dequantize(self.matrix, self.scales)
+
+    def descriptor(self) -> tuple | None:
+        """
+        (векторы, масштабы) для sharded.describe: как другим процессам открыть буферы хранилища.
+        None, если буферы в памяти процесса
+        """
+        from sharded import describe
+
+        vectors = describe(self._buffer)
+        scales = describe(self._scales) if self._scales is not None else None
+        if vectors is None or (self._scales is not None and scales is None):
+            return None
+        return vectors, scales
+
+    def release(self) -> None:
+        """
+        Удаляет файлы общих буферов, когда хранилище заменено новым: иначе каждая перезагрузка оставляла бы
+        в VECTOR_SHARED_DIR (в памяти) копию корпуса. Опубликованные ранее состояния и процессы пула,
+        уже отобразившие буферы, дочитывают их без ошибок
+        """
+        release_shared(self._buffer)
+        release_shared(self._scales)
+
+    def _encode(self, vectors) -> tuple[np.ndarray, np.ndarray | None]:
+        if self.dtype == np.int8:
+            return quantize_int8(vectors)
+        return np.asarray(vectors, dtype=np.float32).astype(self.dtype, copy=False), None
+
+    def _write(self, index, vectors) -> None:
+        codes, scales = self._encode(vectors)
+        self._buffer[index] = codes
+        if self._scales is not None:
+            self._scales[index] = scales
+
+    def equals(self, index: int, vector) -> bool:
+        codes, scales = self._encode(vector)
+        return (np.array_equal(self._buffer[index], codes)
+                and (scales is None or self._scales[index] == scales))
+
+    def _grow(self, capacity: int) -> None:
+        grown = self._allocate((max(capacity, 1), self.dim), self.dtype)
+        grown[:self._size] = self._buffer[:self._size]
+        release_shared(self._buffer)
+        self._buffer = grown
+        if self._scales is not None:
+            scales = self._allocate((len(grown),), np.float32)
+            scales[:self._size] = self._scales[:self._size]
+            release_shared(self._scales)
+            self._scales = scales
+
+    def append(self, vector) -> int:
+        if self._size == len(self._buffer) or not self._buffer.flags.writeable:
+            self._grow(max(len(self._buffer), 512) * 2)
+        self._write(self._size, vector)
+        self._size += 1
+        return self._size - 1
+
+    def replace(self, index: int, vector) -> None:
+        if not self._buffer.flags.writeable:
+            self._grow(len(self._buffer) * 2)
+        self._write(index, vector)
@@ -0,0 +1,71 @@
+"""
+Отчёт полнота/задержка IVF-индекса против точного поиска (Searcher._top_k).
+Корпус синтетический: нормализованные векторы вокруг случайных центров, как у кластеризованных эмбеддингов.
+
+python benchmarks/ann_recall.py --rows 200000 --probes 1,4,8,16,32
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+
+from ann_index import IVFIndex  # noqa: E402
+from embeddings import FakeEmbeddingProvider  # noqa: E402
+from searcher import IndexState  # noqa: E402
+from word_searcher import WordSearcher  # noqa: E402
+
+
+def make_corpus(rows: int, dim: int, clusters: int, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim)).astype(np.float32)
+    vectors = centers[rng.integers(0, clusters, rows)] + 0.6 * rng.standard_normal((rows, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def measure(searcher: WordSearcher, queries: np.ndarray, limit: int) -> tuple[list, float]:
+    started = time.perf_counter()
+    found = [searcher._top_k(query, limit)[0] for query in queries]
+    return found, (time.perf_counter() - started) / len(queries) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--dim', type=int, default=384)
+    parser.add_argument('--clusters', type=int, default=500)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--limit', type=int, default=5)
+    parser.add_argument('--lists', type=int, default=0)
+    parser.add_argument('--probes', default='1,2,4,8,16,32')
+    args = parser.parse_args()
+
+    vectors = make_corpus(args.rows, args.dim, args.clusters)
+    queries = make_corpus(args.queries, args.dim, args.clusters, seed=1)
+
+    searcher = WordSearcher(None, FakeEmbeddingProvider(args.dim))
+    searcher.similarity_threshold = -1.0
+    searcher._state = IndexState([], vectors, None)
+    exact, exact_ms = measure(searcher, queries, args.limit)
+    print(f"rows={args.rows} dim={args.dim} limit={args.limit}")
+    print(f"{'mode':<16}{'recall@k':>10}{'ms/query':>12}{'speedup':>10}")
+    print(f"{'exact':<16}{1.0:>10.3f}{exact_ms:>12.3f}{1.0:>10.1f}")
+
+    index = IVFIndex(n_lists=args.lists, min_rows=0)
+    started = time.perf_counter()
+    index.build(vectors)
+    print(f"IVF build: {time.perf_counter() - started:.2f} s, lists={len(index.centroids)}")
+
+    searcher._state = IndexState([], vectors, index)
+    for n_probe in (int(p) for p in args.probes.split(',')):
+        index.n_probe = n_probe
+        found, ann_ms = measure(searcher, queries, args.limit)
+        recall = np.mean([len(np.intersect1d(a, e)) / len(e) for a, e in zip(found, exact)])
+        print(f"{f'ivf probe={n_probe}':<16}{recall:>10.3f}{ann_ms:>12.3f}{exact_ms / ann_ms:>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+"""
+Пропускная способность пакетного поиска против тех же запросов по одному:
+search_batch (пачки в модель + одно произведение матриц на кусок запросов) против search_similar_data
+в цикле. Эмбеддинги — FakeEmbeddingProvider с задержкой на вызов, имитирующей сетевой API.
+Лексическое усиление выключено, чтобы оба режима ранжировали одинаково и результаты можно было сравнить.
+
+python benchmarks/batch_search.py --rows 20000 --queries 1000 --latency-ms 20
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+
+import searcher as searcher_module  # noqa: E402
+from db import InMemoryYDBClient  # noqa: E402
+from embeddings import FakeEmbeddingProvider  # noqa: E402
+from aforism_searcher import AforismSearcher  # noqa: E402
+
+
+class SlowFakeProvider(FakeEmbeddingProvider):
+    def __init__(self, latency: float, dim: int):
+        super().__init__(dim)
+        self.latency = latency
+        self.calls = 0
+
+    def embed(self, texts):
+        self.calls += 1
+        time.sleep(self.latency)
+        return super().embed(texts)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=20000)
+    parser.add_argument('--queries', type=int, default=1000)
+    parser.add_argument('--limit', type=int, default=5)
+    parser.add_argument('--dim', type=int, default=384)
+    parser.add_argument('--latency-ms', type=float, default=20.0)
+    args = parser.parse_args()
+
+    searcher_module.HYBRID_LEXICAL_WEIGHT = 0.0
+    rng = np.random.default_rng(0)
+    vocabulary = [f"слово{i}" for i in range(5000)]
+    client = InMemoryYDBClient()
+    client.tables['aforisms'] = {
+        str(i): {'id': str(i), 'phrase': f"фраза {i}", 'author': "Народ",
+                 'description': ' '.join(rng.choice(vocabulary, 8))}
+        for i in range(args.rows)
+    }
+    provider = SlowFakeProvider(0.0, args.dim)
+    searcher = AforismSearcher(client, provider)
+    started = time.perf_counter()
+    searcher.load_data_to_search()
+    print(f"rows={args.rows} queries={args.queries} limit={args.limit} dim={args.dim} "
+          f"(load {time.perf_counter() - started:.1f} s)")
+
+    texts = [' '.join(rng.choice(vocabulary, 4)) for _ in range(args.queries)]
+    provider.latency = args.latency_ms / 1000
+
+    provider.calls = 0
+    started = time.perf_counter()
+    one_by_one = [searcher.search_similar_data(text, args.limit) for text in texts]
+    single = time.perf_counter() - started
+    single_calls = provider.calls
+
+    provider.calls = 0
+    started = time.perf_counter()
+    batched = list(searcher.search_batch(texts, args.limit))
+    batch = time.perf_counter() - started
+
+    agree = np.mean([[r['id'] for r in a] == [r['id'] for r in b] for a, b in zip(one_by_one, batched)])
+    print(f"{'mode':<12}{'queries/s':>12}{'embed calls':>14}")
+    print(f"{'one-by-one':<12}{args.queries / single:>12.1f}{single_calls:>14}")
+    print(f"{'batch':<12}{args.queries / batch:>12.1f}{provider.calls:>14}")
+    print(f"speedup {single / batch:.1f}x, identical top-{args.limit}: {agree:.1%}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,291 @@
+"""
+Воспроизводимый офлайн-бенчмарк всего пути запроса: index.handler с синтетическими событиями API Gateway,
+InMemoryYDBClient вместо YDB и детерминированный FakeEmbeddingProvider с задержкой вместо HF API.
+
+Для каждого размера корпуса генерируется синтетический корпус по образцу aforisms.json / words.json
+(словарь — слова из этих файлов плюс сгенерированные, частоты по закону Ципфа, авторы с повторами),
+затем отдельный процесс замеряет холодный старт (импорт index + первый запрос), загрузку таблицы,
+p50/p99 поиска и добавления и пиковый RSS. Корпус хранится в БД в памяти (--source db) или в снимке
+(--source snapshot, для больших корпусов: JSON с эмбеддингами на 1M строк не поместится в память);
+auto — снимок начиная с 200k строк. Результаты пишутся в JSON, --compare сравнивает с прошлым прогоном.
+
+python benchmarks/handler_bench.py --rows 1000,10000,100000 --latency-ms 20 --output results.json
+python benchmarks/handler_bench.py --rows 1000000 --source snapshot --compare results.json
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+BACKEND = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend')
+CORPUS_VERSION = 1
+SNAPSHOT_FROM_ROWS = 200000
+SYLLABLES = ('ка', 'ло', 'ми', 'ра', 'ту', 'не', 'во', 'да', 'ши', 'ре', 'по', 'лу', 'зо', 'бе', 'ча', 'ки',
+             'ме', 'жи', 'со', 'на', 'го', 'ры', 'те', 'фа', 'ст', 'ль', 'ро', 'ве', 'ду', 'ни')
+KINDS = {
+    'phrase': {'table': 'aforisms', 'columns': ('phrase', 'author', 'description')},
+    'word': {'table': 'words', 'columns': ('word', 'description')},
+}
+
+
+def percentile(values: list[float], p: float) -> float:
+    values = sorted(values)
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, max(0, round(p / 100 * len(values)) - 1))]
+
+
+def summary(values: list[float]) -> dict:
+    return {'p50_ms': round(percentile(values, 50), 3), 'p99_ms': round(percentile(values, 99), 3),
+            'mean_ms': round(sum(values) / len(values), 3) if values else 0.0}
+
+
+# --- генерация корпуса (родительский процесс) ---
+
+def make_vocabulary(size: int, rng) -> list[str]:
+    import re
+
+    words = {}
+    for name in ('aforisms.json', 'words.json'):
+        path = os.path.join(BACKEND, '..', name)
+        if os.path.isfile(path):
+            with open(path, encoding='utf-8') as f:
+                for token in re.findall(r'\w+', f.read().lower()):
+                    if not token.isascii():
+                        words[token] = None
+    while len(words) < size:
+        words[''.join(rng.choice(SYLLABLES, rng.integers(2, 5)))] = None
+    return list(words)[:size]
+
+
+def generate(directory: str, kind: str, rows: int, source: str, dim: int, queries: int, adds: int,
+             seed: int) -> None:
+    """
+    Корпус в directory: memory_db.json (и снимок в snapshots/ для source=snapshot) и workload.json с запросами
+    """
+    import numpy as np
+
+    sys.path.insert(0, BACKEND)
+    from embeddings import FakeEmbeddingProvider
+    from row_table import RowTable
+    from searcher import content_hash
+    from snapshot import save_snapshot
+
+    spec = KINDS[kind]
+    rng = np.random.default_rng(seed)
+    vocabulary = make_vocabulary(max(2000, min(50000, rows // 5)), rng)
+    weights = 1 / (np.arange(len(vocabulary)) + 10.0)
+    weights /= weights.sum()
+
+    def texts(count: int, low: int, high: int) -> tuple[list[str], np.ndarray]:
+        lengths = rng.integers(low, high + 1, count)
+        tokens = rng.choice(len(vocabulary), (count, high), p=weights)
+        tokens[np.arange(high) >= lengths[:, None]] = -1
+        return [' '.join(vocabulary[t] for t in row[:n]).capitalize() for row, n in zip(tokens, lengths)], tokens
+
+    columns = {'id': [f"bench-{i:07d}" for i in range(rows)]}
+    if kind == 'phrase':
+        columns['phrase'] = texts(rows, 3, 7)[0]
+        authors = ['Народ'] + [f"{a.capitalize()} {b.capitalize()}"
+                               for a, b in zip(rng.choice(vocabulary, 2000), rng.choice(vocabulary, 2000))]
+        author_weights = 1 / (np.arange(len(authors)) + 1.0)
+        author_weights /= author_weights.sum()
+        columns['author'] = [authors[i] for i in rng.choice(len(authors), rows, p=author_weights)]
+    else:
+        columns['word'] = [vocabulary[i].capitalize() for i in rng.choice(len(vocabulary), rows, p=weights)]
+    columns['description'], description_tokens = texts(rows, 5, 15)
+
+    # векторы описаний — те же, что дал бы FakeEmbeddingProvider: сумма векторов токенов, нормированная
+    provider = FakeEmbeddingProvider(dim)
+    token_vectors = np.zeros((len(vocabulary) + 1, dim), dtype=np.float32)
+    for i, token in enumerate(vocabulary):
+        token_vectors[i] = provider._token_vector(token)
+    vectors = np.empty((rows, dim), dtype=np.float32)
+    for start in range(0, rows, 4096):
+        part = token_vectors[description_tokens[start:start + 4096]].sum(axis=1)
+        vectors[start:start + 4096] = part / np.linalg.norm(part, axis=1, keepdims=True)
+
+    os.makedirs(directory, exist_ok=True)
+    tables = {'aforisms': [], 'words': []}
+    if source == 'snapshot':
+        save_snapshot(os.path.join(directory, 'snapshots'), spec['table'], provider.model_id, CORPUS_VERSION,
+                      ('id',) + spec['columns'], RowTable.from_columns(columns), vectors)
+    else:
+        import base64
+
+        names = list(columns)
+        for i, values in enumerate(zip(*columns.values())):
+            row = dict(zip(names, values))
+            row.update(embedding=base64.b64encode(vectors[i].astype('<f4').tobytes()).decode('ascii'),
+                       embedding_model=provider.model_id, content_hash=content_hash(row['description']),
+                       version=CORPUS_VERSION)
+            tables[spec['table']].append(row)
+    with open(os.path.join(directory, 'memory_db.json'), 'w', encoding='utf-8') as f:
+        json.dump({'tables': tables, 'corpus_versions': {spec['table']: CORPUS_VERSION}}, f, ensure_ascii=False)
+
+    search_texts = texts(queries + 1, 2, 5)[0]
+    new_texts = texts(adds, 5, 12)[0]
+    if kind == 'phrase':
+        bodies = [{'phrase': text, 'author': 'Бенчмарк', 'description': text} for text in new_texts]
+    else:
+        bodies = [{'word': text.split()[0], 'description': text} for text in new_texts]
+    with open(os.path.join(directory, 'workload.json'), 'w', encoding='utf-8') as f:
+        json.dump({'queries': search_texts, 'adds': bodies}, f, ensure_ascii=False)
+
+
+# --- замер (дочерний процесс) ---
+
+def run_child(args) -> None:
+    started = time.perf_counter()
+    sys.path.insert(0, BACKEND)
+    import index
+
+    imported = time.perf_counter()
+    import logging
+    import resource
+
+    logging.disable(logging.INFO)
+    with open(os.path.join(args.child, 'workload.json'), encoding='utf-8') as f:
+        workload = json.load(f)
+
+    def search_event(text: str) -> dict:
+        return {'httpMethod': 'GET', 'path': f'/{args.kind}', 'queryStringParameters': {'text': text},
+                'headers': {}, 'body': None}
+
+    first = index.handler(search_event(workload['queries'][0]), None)
+    first_done = time.perf_counter()
+    assert first['statusCode'] == 200, first['body']
+    stages = {}
+    for part in first['headers']['Server-Timing'].split(', '):
+        name, _, value = part.partition(';dur=')
+        if value:
+            stages[name] = float(value)
+
+    searches = []
+    for text in workload['queries'][1:]:
+        began = time.perf_counter()
+        result = index.handler(search_event(text), None)
+        searches.append((time.perf_counter() - began) * 1000)
+        assert result['statusCode'] == 200, result['body']
+
+    adds = []
+    for body in workload['adds']:
+        began = time.perf_counter()
+        result = index.handler({'httpMethod': 'POST', 'path': f'/{args.kind}', 'headers': {},
+                                'queryStringParameters': {}, 'body': json.dumps(body, ensure_ascii=False)}, None)
+        adds.append((time.perf_counter() - began) * 1000)
+        assert result['statusCode'] == 201, result['body']
+
+    print(json.dumps({
+        'import_ms': round((imported - started) * 1000, 1),
+        'cold_start_ms': round((first_done - started) * 1000, 1),
+        'load_ms': round(stages.get('load', 0.0) + stages.get('connect', 0.0), 1),
+        'first_request_stages_ms': stages,
+        'search': summary(searches),
+        'add': summary(adds),
+        'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }))
+
+
+# --- прогон и сравнение ---
+
+def run(args, rows: int) -> dict:
+    source = args.source if args.source != 'auto' else ('snapshot' if rows >= SNAPSHOT_FROM_ROWS else 'db')
+    directory = os.path.join(args.work_dir, f"{args.kind}-{rows}-{source}-d{args.dim}-s{args.seed}"
+                                            f"-q{args.queries}-a{args.adds}")
+    if not os.path.isfile(os.path.join(directory, 'workload.json')):
+        started = time.perf_counter()
+        generate(directory, args.kind, rows, source, args.dim, args.queries, args.adds, args.seed)
+        print(f"  корпус {rows} строк сгенерирован за {time.perf_counter() - started:.1f} с", file=sys.stderr)
+
+    env = dict(os.environ, DB_BACKEND='memory', MEMORY_DB_PATH=os.path.join(directory, 'memory_db.json'),
+               EMBEDDING_PROVIDER='fake', FAKE_EMBEDDING_LATENCY_MS=str(args.latency_ms), METRICS_LOG='0')
+    env.pop('SNAPSHOT_PATH', None)
+    if source == 'snapshot':
+        env['SNAPSHOT_PATH'] = os.path.join(directory, 'snapshots')
+    with open(os.path.join(directory, 'child.log'), 'w') as log:
+        completed = subprocess.run([sys.executable, os.path.abspath(__file__), '--child', directory,
+                                    '--kind', args.kind], env=env, stdout=subprocess.PIPE, stderr=log, text=True)
+    if completed.returncode:
+        raise SystemExit(f"Прогон {rows} строк упал, см. {os.path.join(directory, 'child.log')}")
+    result = json.loads(completed.stdout.strip().splitlines()[-1])
+    return {'kind': args.kind, 'rows': rows, 'source': source, **result}
+
+
+def key(result: dict) -> tuple:
+    return result['kind'], result['rows'], result['source']
+
+
+def print_results(results: list[dict], previous: dict | None) -> None:
+    print(f"{'rows':>9} {'source':<9}{'cold ms':>10}{'load ms':>10}{'search p50':>12}{'p99':>9}"
+          f"{'add p50':>10}{'p99':>9}{'RSS MB':>9}")
+    for result in results:
+        print(f"{result['rows']:>9} {result['source']:<9}{result['cold_start_ms']:>10.1f}{result['load_ms']:>10.1f}"
+              f"{result['search']['p50_ms']:>12.2f}{result['search']['p99_ms']:>9.2f}"
+              f"{result['add']['p50_ms']:>10.2f}{result['add']['p99_ms']:>9.2f}{result['peak_rss_mb']:>9.1f}")
+        before = (previous or {}).get(key(result))
+        if before:
+            changes = []
+            for label, now, then in (('cold', result['cold_start_ms'], before['cold_start_ms']),
+                                     ('load', result['load_ms'], before['load_ms']),
+                                     ('search p50', result['search']['p50_ms'], before['search']['p50_ms']),
+                                     ('search p99', result['search']['p99_ms'], before['search']['p99_ms']),
+                                     ('add p50', result['add']['p50_ms'], before['add']['p50_ms']),
+                                     ('RSS', result['peak_rss_mb'], before['peak_rss_mb'])):
+                changes.append(f"{label} {(now - then) / then:+.0%}" if then else f"{label} n/a")
+            print(f"{'':>9} против прошлого прогона: {', '.join(changes)}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', default='1000,10000,100000', help="Размеры корпуса через запятую (до 1000000)")
+    parser.add_argument('--kind', choices=tuple(KINDS), default='phrase')
+    parser.add_argument('--source', choices=('auto', 'db', 'snapshot'), default='auto')
+    parser.add_argument('--latency-ms', type=float, default=0.0, help="Задержка fake-провайдера на вызов")
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--adds', type=int, default=50)
+    parser.add_argument('--dim', type=int, default=384)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--work-dir', default=os.path.join('/tmp', 'handler_bench'),
+                        help="Каталог для сгенерированных корпусов (переиспользуются между прогонами)")
+    parser.add_argument('--output', help="Куда сохранить результаты (JSON)")
+    parser.add_argument('--compare', help="JSON прошлого прогона для сравнения")
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        return run_child(args)
+
+    previous = None
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            previous = {key(result): result for result in json.load(f)['results']}
+
+    results = []
+    for rows in (int(value) for value in args.rows.split(',')):
+        print(f"{args.kind}: {rows} строк...", file=sys.stderr)
+        results.append(run(args, rows))
+    print_results(results, previous)
+
+    if args.output:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BACKEND, capture_output=True, text=True)
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({
+                'meta': {
+                    'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+                    'commit': commit.stdout.strip() or None,
+                    'python': platform.python_version(),
+                    'platform': platform.platform(),
+                    'cpus': os.cpu_count(),
+                    'args': {name: value for name, value in vars(args).items() if name not in ('child', 'compare')},
+                },
+                'results': results,
+            }, f, ensure_ascii=False, indent=2)
+        print(f"Результаты сохранены в {args.output}", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
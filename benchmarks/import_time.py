@@ -0,0 +1,75 @@
+"""
+Время холодного импорта index.handler: каждый замер — отдельный процесс `python -X importtime -c "import index"`
+из каталога backend, как в рантайме функции. Падает с кодом 1, если медиана превышает бюджет,
+и проверяет, что тяжёлые модули не импортируются на старте.
+
+python benchmarks/import_time.py --runs 10 --budget-ms 150
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend')
+HEAVY_MODULES = ('numpy', 'ydb', 'huggingface_hub', 'sklearn', 'sentence_transformers', 'grpc')
+
+PROBE = (
+    "import sys, time\n"
+    "started = time.perf_counter()\n"
+    "import index\n"
+    "elapsed = (time.perf_counter() - started) * 1000\n"
+    "heavy = [m for m in {heavy!r} if m in sys.modules]\n"
+    "print(f'{{elapsed:.3f}} {{\",\".join(heavy)}}')\n"
+).format(heavy=HEAVY_MODULES)
+
+
+def run_once() -> tuple[float, list[str], str]:
+    completed = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', PROBE],
+        cwd=BACKEND_DIR, capture_output=True, text=True, check=True,
+    )
+    elapsed, _, heavy = completed.stdout.strip().partition(' ')
+    return float(elapsed), [m for m in heavy.split(',') if m], completed.stderr
+
+
+def slowest_imports(importtime_log: str, top: int) -> list[tuple[int, str]]:
+    rows = []
+    for line in importtime_log.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = (part.strip() for part in line[len('import time:'):].split('|'))
+        rows.append((int(cumulative), name))
+    return sorted(rows, reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--budget-ms', type=float, default=150.0)
+    parser.add_argument('--top', type=int, default=10)
+    args = parser.parse_args()
+
+    results = [run_once() for _ in range(args.runs)]
+    timings = [elapsed for elapsed, _, _ in results]
+    heavy = sorted({module for _, modules, _ in results for module in modules})
+    median = statistics.median(timings)
+
+    print(f"import index: median {median:.1f} ms, min {min(timings):.1f} ms, max {max(timings):.1f} ms "
+          f"({args.runs} runs, budget {args.budget_ms:.0f} ms)")
+    print("Slowest imports (cumulative, us):")
+    for cumulative, name in slowest_imports(results[-1][2], args.top):
+        print(f"  {cumulative:>8}  {name}")
+
+    failed = False
+    if heavy:
+        print(f"FAIL: heavy modules imported at cold start: {', '.join(heavy)}")
+        failed = True
+    if median > args.budget_ms:
+        print(f"FAIL: median {median:.1f} ms exceeds budget {args.budget_ms:.0f} ms")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+"""
+Отчёт память/полнота по режимам хранения векторов (VECTOR_DTYPE) и метаданных строк.
+Векторы: байт на строку в памяти процесса и recall@k против точного float32-поиска,
+без переоценки и с переоценкой limit * RESCORE_FACTOR кандидатов по точным векторам (они лежат в mmap-файле).
+Метаданные: список словарей против RowTable с интернированными авторами (tracemalloc).
+
+python benchmarks/memory_report.py --rows 100000 --authors 3000
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+
+import searcher as searcher_module  # noqa: E402
+import vector_store  # noqa: E402
+from ann_recall import make_corpus  # noqa: E402
+from embeddings import FakeEmbeddingProvider  # noqa: E402
+from row_table import RowTable  # noqa: E402
+from searcher import IndexState  # noqa: E402
+from vector_store import FullPrecision, VectorStore  # noqa: E402
+from word_searcher import WordSearcher  # noqa: E402
+
+
+def measure(searcher: WordSearcher, state: IndexState, queries: np.ndarray, limit: int) -> tuple[list, float]:
+    started = time.perf_counter()
+    found = [searcher._top_k(query, limit, state=state)[0] for query in queries]
+    return found, (time.perf_counter() - started) * 1000 / len(queries)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--dim', type=int, default=384)
+    parser.add_argument('--clusters', type=int, default=200)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--limit', type=int, default=10)
+    parser.add_argument('--rescore-factor', type=int, default=4)
+    parser.add_argument('--authors', type=int, default=3000)
+    args = parser.parse_args()
+
+    vectors = make_corpus(args.rows, args.dim, args.clusters)
+    queries = make_corpus(args.queries, args.dim, args.clusters, seed=1)
+    searcher = WordSearcher(None, FakeEmbeddingProvider(args.dim))
+    searcher.similarity_threshold = -1.0
+    searcher_module.RESCORE_FACTOR = args.rescore_factor
+
+    exact, exact_ms = measure(searcher, IndexState([], vectors, None), queries, args.limit)
+    print(f"rows={args.rows} dim={args.dim} limit={args.limit} rescore_factor={args.rescore_factor}")
+    print(f"{'vectors':<18}{'bytes/row':>10}{'MB':>9}{f'recall@{args.limit}':>11}{'ms/query':>10}")
+    print(f"{'float64 (np.array)':<18}{args.dim * 8:>10}{args.rows * args.dim * 8 / 2 ** 20:>9.1f}{'-':>11}{'-':>10}")
+    print(f"{'float32':<18}{args.dim * 4:>10}{vectors.nbytes / 2 ** 20:>9.1f}{1.0:>11.3f}{exact_ms:>10.2f}")
+
+    with tempfile.TemporaryDirectory() as spill_dir:
+        vector_store.VECTOR_SPILL_DIR = spill_dir
+        full = FullPrecision(vector_store.spill(vectors, 'report'))
+        store = VectorStore.from_rows(vectors, dtype='int8')
+        for rescore in (False, True):
+            state = IndexState([], store.matrix, None, scales=store.scales, full=full if rescore else None)
+            found, ms = measure(searcher, state, queries, args.limit)
+            recall = np.mean([len(np.intersect1d(a, e)) / len(e) for a, e in zip(found, exact)])
+            name = 'int8+rescore' if rescore else 'int8'
+            print(f"{name:<18}{store.row_bytes:>10}{len(store) * store.row_bytes / 2 ** 20:>9.1f}"
+                  f"{recall:>11.3f}{ms:>10.2f}")
+    print("(+rescore: точные float32-векторы читаются из mmap-файла и не входят в память процесса)")
+
+    # метаданные строятся из JSON, как при загрузке снимка: у каждой строки своя копия строки автора
+    rng = np.random.default_rng(0)
+    text = json.dumps({
+        'id': [f"{i:08x}-0000-4000-8000-{i:012x}" for i in range(args.rows)],
+        'phrase': [f"фраза номер {i} о жизни и времени" for i in range(args.rows)],
+        'author': [f"Автор {i}" for i in rng.integers(0, args.authors, args.rows)],
+        'description': [f"описание {i}" for i in range(args.rows)],
+    }, ensure_ascii=False)
+
+    def as_dicts():
+        columns = json.loads(text)
+        return [dict(zip(columns, values)) for values in zip(*columns.values())]
+
+    print(f"\n{'metadata':<18}{'bytes/row':>10}{'MB':>9}")
+    for name, build in (('list[dict]', as_dicts),
+                        ('RowTable', lambda: RowTable.from_columns(json.loads(text), ('author',)))):
+        tracemalloc.start()
+        rows = build()
+        size = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        del rows
+        print(f"{name:<18}{size / args.rows:>10.0f}{size / 2 ** 20:>9.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""
+Масштабирование шардированной оценки (SHARD_WORKERS) по числу процессов.
+Корпус лежит в общих отображённых буферах VectorStore (shared=True); для каждого числа процессов
+замеряются задержка одиночного запроса (_top_k) и пропускная способность пакетного поиска по матрице,
+результаты сверяются с полным просмотром в одном процессе.
+Ускорение ограничено числом ядер: на машине с одним ядром ожидается только накладной расход пула.
+
+python benchmarks/shard_scaling.py --rows 400000 --workers 1 2 4 8
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+
+import sharded  # noqa: E402
+from ann_recall import make_corpus  # noqa: E402
+from embeddings import FakeEmbeddingProvider  # noqa: E402
+from searcher import IndexState  # noqa: E402
+from vector_store import VectorStore, score_matrix  # noqa: E402
+from word_searcher import WordSearcher  # noqa: E402
+
+
+def measure(searcher: WordSearcher, state: IndexState, queries: np.ndarray, limit: int, batch: int) -> dict:
+    started = time.perf_counter()
+    found = [searcher._top_k(query, limit, state=state)[0] for query in queries]
+    single_ms = (time.perf_counter() - started) * 1000 / len(queries)
+
+    started = time.perf_counter()
+    for start in range(0, len(queries), batch):
+        chunk = queries[start:start + batch]
+        if searcher._shard_top_k(state, chunk, limit) is None:
+            np.argpartition(score_matrix(state.vectors, state.scales, chunk), -limit, axis=1)
+    batch_qps = len(queries) / (time.perf_counter() - started)
+    return {'found': found, 'single_ms': single_ms, 'batch_qps': batch_qps}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=400000)
+    parser.add_argument('--dim', type=int, default=384)
+    parser.add_argument('--clusters', type=int, default=200)
+    parser.add_argument('--queries', type=int, default=100)
+    parser.add_argument('--limit', type=int, default=10)
+    parser.add_argument('--batch', type=int, default=32)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    args = parser.parse_args()
+
+    vectors = make_corpus(args.rows, args.dim, args.clusters)
+    queries = make_corpus(args.queries, args.dim, args.clusters, seed=1)
+    searcher = WordSearcher(None, FakeEmbeddingProvider(args.dim))
+    searcher.similarity_threshold = -1.0
+    store = VectorStore.from_rows(vectors, shared=True)
+    del vectors
+
+    local = measure(searcher, IndexState([], store.matrix, None), queries, args.limit, args.batch)
+    print(f"rows={args.rows} dim={args.dim} limit={args.limit} batch={args.batch} cpus={os.cpu_count()}")
+    print(f"{'workers':<10}{'ms/query':>10}{'speedup':>9}{'batch q/s':>11}{'speedup':>9}{'same':>6}")
+    print(f"{'local':<10}{local['single_ms']:>10.2f}{1.0:>9.2f}{local['batch_qps']:>11.1f}{1.0:>9.2f}{'-':>6}")
+
+    sharded.SHARD_MIN_ROWS = 1
+    for workers in args.workers:
+        sharded.SHARD_WORKERS = workers
+        sharded.get_pool().warmup()
+        state = IndexState([], store.matrix, None, shards=store.descriptor())
+        searcher._top_k(queries[0], args.limit, state=state)
+        result = measure(searcher, state, queries, args.limit, args.batch)
+        same = all(np.array_equal(a, b) for a, b in zip(result['found'], local['found']))
+        print(f"{workers:<10}{result['single_ms']:>10.2f}{local['single_ms'] / result['single_ms']:>9.2f}"
+              f"{result['batch_qps']:>11.1f}{result['batch_qps'] / local['batch_qps']:>9.2f}{str(same):>6}")
+        sharded.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -55,26 +55,19 @@ document.addEventListener('DOMContentLoaded', function() {
         const queryText = encodeURIComponent(text);
 
         try {
-            const [phraseResponse, wordResponse] = await Promise.all([
-                fetch(`/phrase?text=${queryText}`, {
-                    method: 'GET',
-                    headers: { 'Content-Type': 'application/json' }
-                }),
-                fetch(`/word?text=${queryText}`, {
-                    method: 'GET',
-                    headers: { 'Content-Type': 'application/json' }
-                })
-            ]);
-
-            if (!phraseResponse.ok || !wordResponse.ok) {
+            const searchResponse = await fetch(`/search?text=${queryText}&kinds=phrase,word`, {
+                method: 'GET',
+                headers: { 'Content-Type': 'application/json' }
+            });
+
+            if (!searchResponse.ok) {
                 throw new Error('Ошибка при поиске');
             }
 
-            const phraseData = await phraseResponse.json();
-            const wordData = await wordResponse.json();
+            const searchData = await searchResponse.json();
             const normalizedResults = [];
 
-            (phraseData.phrases || []).forEach(p => normalizedResults.push({
+            (searchData.phrases || []).forEach(p => normalizedResults.push({
                 type: 'aforism',
                 text: p.phrase,
                 subtext: `— ${p.author}`,
@@ -82,7 +75,7 @@ document.addEventListener('DOMContentLoaded', function() {
                 similarity: p.similarity_score
             }));
 
-            (wordData.words || []).forEach(w => normalizedResults.push({
+            (searchData.words || []).forEach(w => normalizedResults.push({
                 type: 'word',
                 text: w.word,
                 subtext: w.description,
@@ -91,8 +84,8 @@ document.addEventListener('DOMContentLoaded', function() {
             }));
 
             normalizedResults.sort((a, b) => b.similarity - a.similarity);
-            backendVersionEl.textContent = phraseData.backend_version || '-';
-            backendIdEl.textContent = phraseData.backend_id || '-';
+            backendVersionEl.textContent = searchData.backend_version || '-';
+            backendIdEl.textContent = searchData.backend_id || '-';
 
             displayResults(normalizedResults, text);
 
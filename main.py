@@ -1,5 +1,81 @@
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+
+
+def snapshot(args):
+    from db import ydb_client
+
+    for searcher in (ydb_client.aforism_searcher, ydb_client.word_searcher):
+        print(searcher.save_snapshot(args.output))
+    ydb_client.close()
+
+
+def import_data(args):
+    if args.db:
+        os.environ['DB_BACKEND'] = args.db
+    if args.provider:
+        os.environ['EMBEDDING_PROVIDER'] = args.provider
+
+    from db import ydb_client
+    from importer import import_file
+
+    for path in args.files:
+        table = args.table or ('words' if 'word' in os.path.basename(path) else 'aforisms')
+        stats = import_file(ydb_client, ydb_client.embedding_provider, path, table, batch_size=args.batch_size,
+                            checkpoint=args.checkpoint, resume=not args.restart)
+        print(f"{path} -> {table}: {stats['rows']} строк за {stats['seconds']:.1f} с "
+              f"({stats['rows_per_second']:.1f} строк/с, без вектора {stats['unembedded']})")
+    ydb_client.close()
+
+
+def serve(args):
+    if args.db:
+        os.environ['DB_BACKEND'] = args.db
+    if args.shards:
+        os.environ['SHARD_WORKERS'] = str(args.shards)
+
+    from server import serve as run_server
+
+    run_server(args.host, args.port, workers=args.workers, warmup=not args.no_warmup, histogram=args.histogram)
+
+
 def main():
-    print("Hello from aforisms!")
+    parser = argparse.ArgumentParser(description="Утилиты Aforisms")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    snapshot_parser = commands.add_parser('snapshot', help="Сохранить снимки индексов для быстрого холодного старта")
+    snapshot_parser.add_argument('output', nargs='?', default='snapshots', help="Каталог для снимков")
+    snapshot_parser.set_defaults(func=snapshot)
+
+    import_parser = commands.add_parser('import', help="Импортировать JSON/JSONL-файлы в YDB с эмбеддингами")
+    import_parser.add_argument('files', nargs='+', help="Файлы в формате aforisms.json / words.json или JSONL")
+    import_parser.add_argument('--table', choices=('aforisms', 'words'),
+                               help="Таблица; по умолчанию words, если в имени файла есть 'word', иначе aforisms")
+    import_parser.add_argument('--batch-size', type=int, default=1000, help="Строк в пачке векторизации и записи")
+    import_parser.add_argument('--checkpoint', help="Файл чекпоинта (по умолчанию <файл>.<таблица>.checkpoint)")
+    import_parser.add_argument('--restart', action='store_true', help="Игнорировать чекпоинт и начать сначала")
+    import_parser.add_argument('--db', choices=('ydb', 'memory'),
+                               help="ydb или заменитель в памяти (MEMORY_DB_PATH — файл для сохранения)")
+    import_parser.add_argument('--provider', choices=('hf', 'local', 'fake'), help="Провайдер эмбеддингов")
+    import_parser.set_defaults(func=import_data)
+
+    serve_parser = commands.add_parser('serve', help="Запустить постоянно работающий HTTP-сервер с тёплым индексом")
+    serve_parser.add_argument('--host', default='127.0.0.1')
+    serve_parser.add_argument('--port', type=int, default=8080)
+    serve_parser.add_argument('--workers', type=int, default=16, help="Потоков обработки запросов")
+    serve_parser.add_argument('--no-warmup', action='store_true', help="Не загружать индексы до первого запроса")
+    serve_parser.add_argument('--db', choices=('ydb', 'memory'), help="ydb или заменитель в памяти")
+    serve_parser.add_argument('--histogram', action='store_true',
+                              help="Копить гистограммы длительностей этапов (GET /metrics, лог при остановке)")
+    serve_parser.add_argument('--shards', type=int, default=0,
+                              help="Процессов для шардированной оценки полного просмотра (0 — выключено)")
+    serve_parser.set_defaults(func=serve)
+
+    args = parser.parse_args()
+    args.func(args)
 
 
 if __name__ == "__main__":
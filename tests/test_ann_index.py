@@ -0,0 +1,54 @@
+import numpy as np
+
+from ann_index import IVFIndex
+
+
+def normalized(rng, rows: int, dim: int = 16) -> np.ndarray:
+    vectors = rng.standard_normal((rows, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def test_added_rows_are_found_in_their_cluster():
+    rng = np.random.default_rng(0)
+    index = IVFIndex(n_lists=8, n_probe=1, min_rows=0)
+    index.build(normalized(rng, 200))
+    added = normalized(rng, 300)
+    for position, vector in enumerate(added, start=200):
+        index.add(position, vector)
+
+    assert len(index) == 500
+    for position, vector in enumerate(added, start=200):
+        assert position in index.candidates(vector)
+    # все строки ровно в одном списке
+    assert np.array_equal(np.sort(np.concatenate(index._lists)), np.arange(500))
+
+
+def test_replaced_row_moves_between_clusters():
+    rng = np.random.default_rng(1)
+    vectors = normalized(rng, 100)
+    index = IVFIndex(n_lists=4, n_probe=1, min_rows=0)
+    index.build(vectors)
+    for position in range(100, 140):
+        index.add(position, normalized(rng, 1)[0])
+
+    replacement = -vectors[5]
+    index.add(5, replacement)
+    index.add(120, vectors[5])
+
+    assert 5 in index.candidates(replacement)
+    assert 120 in index.candidates(vectors[5])
+    assert np.array_equal(np.sort(np.concatenate(index._lists)), np.arange(140))
+
+
+def test_append_grows_capacity_geometrically():
+    rng = np.random.default_rng(2)
+    index = IVFIndex(n_lists=1, min_rows=0)
+    index.build(normalized(rng, 10))
+    buffers = set()
+    for position, vector in enumerate(normalized(rng, 1000), start=10):
+        index.add(position, vector)
+        buffers.add(id(index._buffers[0]))
+
+    assert len(index._lists[0]) == 1010
+    # перевыделений — логарифм от числа вставок, а не по одному на вставку
+    assert len(buffers) <= 8
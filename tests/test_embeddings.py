@@ -0,0 +1,89 @@
+import time
+
+import numpy as np
+
+import embeddings
+import metrics
+from embeddings import (CircuitBreaker, EmbeddingProvider, FakeEmbeddingProvider, GuardedEmbeddingProvider,
+                        create_embedding_provider, embed_in_batches)
+
+
+class FailingProvider(EmbeddingProvider):
+    model_id = 'failing'
+
+    def __init__(self):
+        self.calls = 0
+
+    def embed(self, texts: list[str]) -> np.ndarray:
+        self.calls += 1
+        raise RuntimeError('model unavailable')
+
+
+class SlowProvider(FakeEmbeddingProvider):
+    def embed(self, texts: list[str]) -> np.ndarray:
+        time.sleep(0.2)
+        return super().embed(texts)
+
+
+def guarded(provider: EmbeddingProvider) -> GuardedEmbeddingProvider:
+    return GuardedEmbeddingProvider(provider, breaker=CircuitBreaker(failures=1, cooldown=60))
+
+
+def test_open_circuit_is_not_retried(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(embeddings.time, 'sleep', sleeps.append)
+    provider = FailingProvider()
+    wrapper = guarded(provider)
+    wrapper.breaker.record_failure()
+
+    vectors, ok = embed_in_batches(wrapper, ['текст'] * 10, batch_size=2, max_workers=1, retries=3)
+
+    assert vectors is None
+    assert not ok.any()
+    assert provider.calls == 0
+    assert sleeps == []
+
+
+def test_circuit_opened_mid_batch_stops_remaining_chunks(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(embeddings.time, 'sleep', sleeps.append)
+    provider = FailingProvider()
+
+    vectors, ok = embed_in_batches(guarded(provider), ['текст'] * 10, batch_size=2, max_workers=1, retries=3)
+
+    assert vectors is None
+    assert not ok.any()
+    # первая неудача размыкает цепь: ни повторов после неё, ни вызовов для остальных пачек
+    assert provider.calls == 1
+    assert len(sleeps) == 1
+
+
+def test_small_last_batch_is_not_limited_by_budget():
+    provider = GuardedEmbeddingProvider(SlowProvider(dim=8), budget_ms=50, hedge_percentile=0)
+
+    # последняя пачка из одного текста тоже офлайн: бюджет интерактивного запроса к ней не применяется
+    vectors, ok = embed_in_batches(provider, ['текст'] * 5, batch_size=4, max_workers=2, retries=0)
+
+    assert ok.all()
+    assert vectors.shape == (5, 8)
+    assert provider.breaker.state == 'closed'
+
+
+def test_only_remote_provider_is_guarded(monkeypatch):
+    monkeypatch.setattr(metrics, '_gauges', {})
+
+    assert isinstance(create_embedding_provider('fake'), FakeEmbeddingProvider)
+    assert metrics.report() == {}
+
+
+def test_breaker_state_and_hedges_are_reported(monkeypatch):
+    monkeypatch.setattr(metrics, '_gauges', {})
+    # пока задержек мало, дубль идёт через половину бюджета: 150 мс при ответе за 200 мс
+    provider = GuardedEmbeddingProvider(SlowProvider(dim=8), budget_ms=300)
+    metrics.register_gauge('embeddings', provider.stats)
+
+    provider.embed(['текст'])
+    provider.breaker.failures = 1
+    provider.breaker.record_failure()
+
+    assert metrics.report()['embeddings'] == {'breaker': 'open', 'hedged': 1}
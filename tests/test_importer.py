@@ -0,0 +1,87 @@
+import json
+
+import pytest
+
+from db import InMemoryYDBClient
+from embeddings import FakeEmbeddingProvider
+from importer import import_file, iter_records, map_record
+
+RECORDS = [
+    {'word_id': 12345, 'word': 'кот', 'word_description': 'домашнее животное', 'rank': 1.5},
+    {'word': 'дуб', 'word_description': 'дерево', 'rank': None, 'flag': True},
+    {'word': 'ель', 'word_description': '  хвойное дерево  ', 'rank': 100000},
+]
+
+
+@pytest.mark.parametrize('chunk_size', [1, 2, 3, 4, 7, 64, 1 << 16])
+def test_json_array_across_chunk_boundaries(tmp_path, chunk_size):
+    path = tmp_path / 'words.json'
+    path.write_text(json.dumps(RECORDS, ensure_ascii=False, indent=1), encoding='utf-8')
+
+    assert list(iter_records(str(path), chunk_size)) == RECORDS
+
+
+@pytest.mark.parametrize('chunk_size', [3, 1 << 16])
+def test_jsonl(tmp_path, chunk_size):
+    path = tmp_path / 'words.jsonl'
+    path.write_text('\n'.join(json.dumps(record, ensure_ascii=False) for record in RECORDS) + '\n\n',
+                    encoding='utf-8')
+
+    assert list(iter_records(str(path), chunk_size)) == RECORDS
+
+
+@pytest.mark.parametrize('text, chunk_size', [('[12345, 2]', 4), ('[1.5, 2]', 3), ('[{"word": "кот"}, "дуб"]', 5)])
+def test_non_object_records_are_rejected(tmp_path, text, chunk_size):
+    path = tmp_path / 'words.json'
+    path.write_text(text, encoding='utf-8')
+
+    with pytest.raises(ValueError, match='не объект JSON'):
+        list(iter_records(str(path), chunk_size))
+
+
+def test_scalar_split_at_chunk_boundary_is_read_whole(tmp_path):
+    path = tmp_path / 'words.json'
+    path.write_text('[12345, 2]', encoding='utf-8')
+
+    with pytest.raises(ValueError, match="'12345'"):
+        list(iter_records(str(path), 4))
+
+
+def test_map_record():
+    first, second = (map_record('words', record) for record in RECORDS[:2])
+
+    assert first == {'id': '12345', 'word': 'кот', 'description': 'домашнее животное'}
+    assert second['description'] == 'дерево'
+    # без исходного id — стабильный uuid5 от содержимого
+    assert second['id'] == map_record('words', dict(RECORDS[1]))['id']
+    assert map_record('aforisms', {'aforism': 'фраза'})['author'] == 'Народ'
+
+
+def test_interrupted_import_resumes_from_checkpoint(tmp_path):
+    path = tmp_path / 'words.json'
+    records = [{'word': f'слово{i}', 'word_description': f'описание {i}'} for i in range(10)]
+    path.write_text(json.dumps(records, ensure_ascii=False), encoding='utf-8')
+    client = InMemoryYDBClient()
+    provider = FakeEmbeddingProvider(dim=8)
+    writes = 0
+    bulk_upsert = client.bulk_upsert
+
+    def failing_bulk_upsert(*args, **kwargs):
+        nonlocal writes
+        writes += 1
+        if writes == 3:
+            raise ConnectionError('YDB недоступна')
+        bulk_upsert(*args, **kwargs)
+
+    client.bulk_upsert = failing_bulk_upsert
+    with pytest.raises(ConnectionError):
+        import_file(client, provider, str(path), 'words', batch_size=3)
+    assert len(client.tables['words']) == 6
+
+    client.bulk_upsert = bulk_upsert
+    stats = import_file(client, provider, str(path), 'words', batch_size=3)
+
+    assert stats['skipped'] == 6
+    assert stats['rows'] == 4
+    assert len(client.tables['words']) == 10
+    assert not (tmp_path / 'words.json.words.checkpoint').exists()
@@ -0,0 +1,76 @@
+import numpy as np
+import pytest
+
+from lexical_index import LEXICAL_PREFIX_SCORE, LexicalIndex, normalize, stem, tokenize
+from row_table import RowTable
+
+FIELDS = {'word': 1.0, 'description': 0.5}
+WORDS = [
+    ('кошка', 'домашнее животное'),
+    ('кошелёк', 'кошель для денег'),
+    ('программирование', 'написание программ'),
+    ('Ёлка', 'хвойное дерево'),
+]
+
+
+def make_index(words=WORDS) -> LexicalIndex:
+    data = RowTable(('word', 'description'))
+    for word, description in words:
+        data.append({'word': word, 'description': description})
+    return LexicalIndex.from_rows(data, FIELDS, 'word')
+
+
+def found(index: LexicalIndex, query: str) -> dict[int, float]:
+    rows, scores = index.search(query, len(index))
+    return dict(zip(rows.tolist(), np.round(scores, 3).tolist()))
+
+
+def test_normalize_and_stem():
+    assert normalize('Ёлка́,  КОТ!') == 'елка кот'
+    assert stem('кошками') == 'кошк'
+    assert stem('кот') == 'кот'
+    assert tokenize('Домашние кошки') == tokenize('домашняя кошка')
+
+
+def test_search_matches_word_forms():
+    # другие падежи находят ту же основу в основном поле (вес 1.0)
+    assert found(make_index(), 'кошки') == {0: 1.0}
+    assert found(make_index(), 'ёлки') == {3: 1.0}
+    # совпадение только в описании — с весом поля
+    assert found(make_index(), 'деревом') == {3: 0.5}
+
+
+def test_exact_and_prefix_fast_path():
+    index = make_index()
+
+    assert index.exact('  КОШКА ') == ([0], [])
+    assert index.exact('кош') == ([], [])
+    assert index.exact('кош', prefix=True) == ([], [1, 0])
+    # короче LEXICAL_PREFIX_MIN — без префиксного совпадения
+    assert index.exact('ко', prefix=True) == ([], [])
+
+    index.add(4, {'word': 'кошара', 'description': 'загон для овец'})
+    # добавленный ключ виден префиксному поиску сразу, в порядке сортировки ключей
+    assert index.exact('кош', prefix=True)[1] == [4, 1, 0]
+
+
+def test_unfinished_word_matches_by_prefix():
+    assert found(make_index(), 'программ') == {2: pytest.approx(LEXICAL_PREFIX_SCORE)}
+
+
+def test_typo_matches_fuzzily():
+    scores = found(make_index(), 'програмирование')
+
+    assert list(scores) == [2]
+    assert 0.5 <= scores[2] < 1.0
+
+
+def test_replaced_row_leaves_old_postings():
+    index = make_index()
+    index.add(0, {'word': 'собака', 'description': 'домашнее животное'})
+
+    assert found(index, 'кошка') == {}
+    assert index.exact('кошка') == ([], [])
+    assert index._postings['word'][stem('кошка')] == []
+    assert found(index, 'собаки') == {0: 1.0}
+    assert found(index, 'животное') == {0: 0.5}
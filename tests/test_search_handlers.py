@@ -0,0 +1,80 @@
+import json
+
+import pytest
+
+import search_all
+import search_words
+from db import InMemoryYDBClient
+from embeddings import FakeEmbeddingProvider
+
+WORDS = {
+    'кот': 'домашнее животное, ловит мышей',
+    'собака': 'домашнее животное, охраняет дом',
+    'дуб': 'дерево с крепкой древесиной',
+}
+
+
+def make_client() -> InMemoryYDBClient:
+    client = InMemoryYDBClient()
+    client._embedding_provider = FakeEmbeddingProvider(dim=32)
+    client.tables['words'] = {
+        f'id-{i}': {'id': f'id-{i}', 'word': word, 'description': description, 'version': 1}
+        for i, (word, description) in enumerate(WORDS.items())
+    }
+    client.corpus_versions['words'] = 1
+    return client
+
+
+def search(monkeypatch, client: InMemoryYDBClient, text: str, etag: str | None = None) -> dict:
+    monkeypatch.setattr(search_words, 'ydb_client', client)
+    event = {'queryStringParameters': {'text': text}, 'headers': {'If-None-Match': etag} if etag else {}}
+    return search_words.search_words_handler(event, None)
+
+
+@pytest.fixture
+def clients():
+    return make_client(), make_client()
+
+
+def test_etag_matches_across_instances(monkeypatch, clients):
+    first, second = clients
+    response = search(monkeypatch, first, 'домашнее животное')
+    assert response['statusCode'] == 200
+    tag = response['headers']['ETag']
+
+    # другой экземпляр (или тот же после перезапуска) с тем же корпусом
+    assert search(monkeypatch, second, 'домашнее животное', tag)['statusCode'] == 304
+    assert search(monkeypatch, first, 'домашнее животное', tag)['statusCode'] == 304
+
+
+def test_etag_changes_with_results(monkeypatch, clients):
+    first, _ = clients
+    tag = search(monkeypatch, first, 'домашнее животное')['headers']['ETag']
+
+    first.word_searcher.add_data('хомяк', 'домашнее животное, грызун')
+    response = search(monkeypatch, first, 'домашнее животное', tag)
+
+    assert response['statusCode'] == 200
+    assert response['headers']['ETag'] != tag
+    assert 'хомяк' in [word['word'] for word in json.loads(response['body'])['words']]
+
+
+def search_everything(monkeypatch, client: InMemoryYDBClient, params: dict) -> dict:
+    monkeypatch.setattr(search_all, 'ydb_client', client)
+    return search_all.search_all_handler({'queryStringParameters': params, 'headers': {}}, None)
+
+
+def test_search_all_limit(monkeypatch):
+    client = make_client()
+    params = {'text': 'домашнее животное', 'kinds': 'word'}
+
+    assert len(json.loads(search_everything(monkeypatch, client, {**params, 'limit': '1'})['body'])['words']) == 1
+    # другой limit — другой ключ кэша ответов, а не обрезанный ответ для limit=1
+    assert len(json.loads(search_everything(monkeypatch, client, {**params, 'limit': '2'})['body'])['words']) == 2
+
+
+@pytest.mark.parametrize('limit', ['0', '101', 'пять'])
+def test_search_all_rejects_bad_limit(monkeypatch, limit):
+    response = search_everything(monkeypatch, make_client(), {'text': 'кот', 'limit': limit})
+
+    assert response['statusCode'] == 400
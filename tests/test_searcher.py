@@ -0,0 +1,179 @@
+import os
+
+import pytest
+
+import searcher as searcher_module
+import sharded
+import vector_store
+from aforism_searcher import AforismSearcher
+from db import InMemoryYDBClient
+from degraded import track_degraded
+from embeddings import EmbeddingProvider, FakeEmbeddingProvider
+from searcher import row_version
+from word_searcher import WordSearcher
+
+WORDS = {
+    'кот': 'домашнее животное, ловит мышей',
+    'собака': 'домашнее животное, охраняет дом',
+    'дуб': 'дерево с крепкой древесиной',
+    'берёза': 'дерево с белой корой',
+}
+
+
+def make_searcher(words: dict[str, str] = WORDS) -> tuple[WordSearcher, InMemoryYDBClient]:
+    client = InMemoryYDBClient()
+    client.tables['words'] = {
+        f'id-{i}': {'id': f'id-{i}', 'word': word, 'description': description, 'version': 1}
+        for i, (word, description) in enumerate(words.items())
+    }
+    client.corpus_versions['words'] = 1
+    searcher = WordSearcher(client, FakeEmbeddingProvider(dim=32))
+    searcher.load_data_to_search()
+    return searcher, client
+
+
+def test_reload_releases_shared_buffers(monkeypatch, tmp_path):
+    monkeypatch.setattr(sharded, 'SHARD_WORKERS', 2)
+    monkeypatch.setattr(vector_store, 'VECTOR_SHARED_DIR', str(tmp_path))
+    searcher, _ = make_searcher()
+    files = len(os.listdir(tmp_path))
+    assert files > 0
+
+    for _ in range(4):
+        searcher.refresh(background=False)
+
+    assert len(os.listdir(tmp_path)) == files
+    assert searcher.search_lexical('дуб')[0]['word'] == 'дуб'
+
+
+def test_snapshot_load_publishes_changes_with_the_snapshot(monkeypatch, tmp_path):
+    searcher, client = make_searcher()
+    searcher.save_snapshot(str(tmp_path))
+    monkeypatch.setattr(searcher_module, 'SNAPSHOT_PATH', str(tmp_path))
+    version = row_version()
+    client.upsert_rows('words', [
+        {'id': 'id-0', 'word': 'кот', 'description': 'хищник семейства кошачьих', 'version': version},
+        {'id': 'id-new', 'word': 'ель', 'description': 'хвойное дерево', 'version': version},
+    ], corpus_version=version)
+
+    published = []
+    read_rows = searcher._read_rows
+
+    def spy(*args, **kwargs):
+        published.append(searcher._state)
+        return read_rows(*args, **kwargs)
+
+    monkeypatch.setattr(searcher, '_read_rows', spy)
+    previous = searcher._state
+    searcher.refresh(background=False)
+
+    # пока дочитываются изменения после снимка, читатели остаются на старом состоянии
+    assert published == [previous]
+    assert searcher.search_lexical('ель')[0]['word'] == 'ель'
+    assert searcher.search_lexical('кот')[0]['description'] == 'хищник семейства кошачьих'
+
+
+PHRASES = [
+    ('Любви все возрасты покорны', 'Пушкин', 'о любви'),
+    ('Я помню чудное мгновенье', 'Пушкин', 'о встрече и любви'),
+    ('Любовь и голод правят миром', 'Шиллер', 'о любви и голоде'),
+    ('Красота спасёт мир', 'Достоевский', 'о красоте'),
+]
+
+
+class UnavailableProvider(EmbeddingProvider):
+    model_id = 'fake-embeddings'
+
+    def embed(self, texts: list[str]):
+        raise ConnectionError('модель недоступна')
+
+
+@pytest.fixture
+def aforisms(monkeypatch) -> AforismSearcher:
+    monkeypatch.setenv('ANN_INDEX', 'ivf')
+    monkeypatch.setenv('ANN_MIN_ROWS', '40')
+    monkeypatch.setenv('IVF_LISTS', '4')
+    client = InMemoryYDBClient()
+    rows = PHRASES + [(f'Фраза номер {i} о жизни', f'Автор {i % 5}', 'о жизни') for i in range(40)]
+    client.tables['aforisms'] = {
+        f'id-{i}': {'id': f'id-{i}', 'phrase': phrase, 'author': author, 'description': description, 'version': 1}
+        for i, (phrase, author, description) in enumerate(rows)
+    }
+    client.corpus_versions['aforisms'] = 1
+    searcher = AforismSearcher(client, FakeEmbeddingProvider(dim=32))
+    searcher.load_data_to_search()
+    return searcher
+
+
+def authors(results: list[dict]) -> set[str]:
+    return {result['author'] for result in results}
+
+
+def test_author_filter_on_vector_and_ann_paths(aforisms):
+    assert aforisms.ann_index is not None and aforisms.ann_index.built
+    unfiltered = aforisms.search_similar_data('о любви', limit=10)
+    assert authors(unfiltered) >= {'Пушкин', 'Шиллер'}
+
+    found = aforisms.search_similar_data('о любви', limit=10, filters={'author': ' пушкин '})
+    assert authors(found) == {'Пушкин'}
+    assert {result['phrase'] for result in found} == {phrase for phrase, author, _ in PHRASES if author == 'Пушкин'}
+    assert aforisms.search_similar_data('о любви', filters={'author': 'Толстой'}) == []
+
+
+def test_author_filter_on_fast_path(aforisms):
+    assert aforisms.search_similar_data('Красота спасёт мир', filters={'author': 'достоевский'}) == \
+        [{'id': 'id-3', 'phrase': 'Красота спасёт мир', 'author': 'Достоевский', 'description': 'о красоте',
+          'similarity_score': 1.0}]
+    # точное совпадение другого автора не проходит фильтр
+    found = aforisms.search_similar_data('Красота спасёт мир', filters={'author': 'Пушкин'})
+    assert authors(found) <= {'Пушкин'}
+    assert 'id-3' not in {result['id'] for result in found}
+
+
+def test_author_filter_on_lexical_path(aforisms):
+    aforisms.embedding_provider = UnavailableProvider()
+
+    with track_degraded() as degraded:
+        found = aforisms.search_similar_data('любовь', limit=10, filters={'author': 'Шиллер'})
+
+    assert degraded == ['lexical']
+    assert [result['phrase'] for result in found] == ['Любовь и голод правят миром']
+
+
+def test_author_filter_sees_batch_added_and_replaced_rows(aforisms):
+    added = aforisms.add_batch([
+        {'phrase': 'Любовь долго терпит', 'author': 'Апостол Павел', 'description': 'о любви'},
+        {'phrase': 'Любить — значит жить', 'author': 'Пушкин', 'description': 'о любви'},
+    ])
+    found = aforisms.search_similar_data('о любви', limit=10, filters={'author': 'Апостол Павел'})
+    assert [result['id'] for result in found] == [added[0]['id']]
+    assert added[1]['id'] in {result['id'] for result in
+                              aforisms.search_similar_data('о любви', limit=10, filters={'author': 'Пушкин'})}
+
+    # та же строка по id с другим автором: списки строк обоих авторов обновлены
+    vector = FakeEmbeddingProvider(dim=32).embed(['о любви'])[0]
+    aforisms._index_item({**added[1], 'author': 'Лермонтов'}, vector)
+    data = aforisms.data
+    position = aforisms._positions[added[1]['id']]
+    assert position not in data.rows_with('author', 'Пушкин')
+    assert position in data.rows_with('author', 'Лермонтов')
+    assert authors(aforisms.search_similar_data('о любви', limit=10, filters={'author': 'Пушкин'})) == {'Пушкин'}
+    assert [result['id'] for result in
+            aforisms.search_similar_data('о любви', limit=10, filters={'author': 'Лермонтов'})] == [added[1]['id']]
+
+
+def test_filter_rows_computed_once_per_query(monkeypatch, aforisms):
+    calls = []
+    filter_rows = aforisms._filter_rows
+
+    def spy(*args):
+        calls.append(args)
+        return filter_rows(*args)
+
+    monkeypatch.setattr(aforisms, '_filter_rows', spy)
+    aforisms.search_similar_data('о любви', filters={'author': 'Пушкин'})
+    assert len(calls) == 1
+
+    aforisms.embedding_provider = UnavailableProvider()
+    aforisms.search_similar_data('о любви', filters={'author': 'Пушкин'})
+    assert len(calls) == 2
@@ -0,0 +1,90 @@
+import http.client
+import re
+import socket
+import threading
+import time
+
+import pytest
+
+import index
+from metrics import stage
+from server import PooledHTTPServer
+
+WORKERS = 2
+
+
+def app(event, context):
+    return {'statusCode': 200, 'headers': {'Content-Type': 'text/plain'}, 'body': event['path']}
+
+
+@pytest.fixture
+def server():
+    server = PooledHTTPServer(('127.0.0.1', 0), app, WORKERS)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.graceful_shutdown()
+    thread.join(timeout=5)
+
+
+def request(server, path: str, connection: http.client.HTTPConnection | None = None) -> str:
+    connection = connection or http.client.HTTPConnection(*server.server_address, timeout=3)
+    connection.request('GET', path)
+    return connection.getresponse().read().decode()
+
+
+def test_idle_connections_do_not_block_new_requests(server):
+    # keep-alive соединения после запроса и соединения, по которым ещё ничего не прислано
+    kept = [http.client.HTTPConnection(*server.server_address, timeout=3) for _ in range(WORKERS)]
+    for connection in kept:
+        assert request(server, '/warm', connection) == '/warm'
+    silent = [socket.create_connection(server.server_address, timeout=3) for _ in range(WORKERS)]
+
+    assert request(server, '/fresh') == '/fresh'
+    # простаивавшие соединения по-прежнему обслуживаются
+    for connection in kept:
+        assert request(server, '/again', connection) == '/again'
+
+    for connection in kept:
+        connection.close()
+    for sock in silent:
+        sock.close()
+
+
+def test_pipelined_requests_on_one_connection(server):
+    with socket.create_connection(server.server_address, timeout=3) as sock:
+        sock.sendall(b'GET /a HTTP/1.1\r\nHost: x\r\n\r\nGET /b HTTP/1.1\r\nHost: x\r\nConnection: close\r\n\r\n')
+        data = b''
+        while chunk := sock.recv(4096):
+            data += chunk
+    assert data.count(b'HTTP/1.1 200') == 2
+    assert data.endswith(b'/b')
+
+
+def test_streamed_body_is_timed_until_sent(monkeypatch):
+    def lines():
+        for i in range(3):
+            with stage('score'):
+                time.sleep(0.05)
+            yield f'{i}\n'
+
+    monkeypatch.setattr(index, 'get_result', lambda path, event, context: {
+        'statusCode': 200, 'headers': {'Content-Type': 'application/x-ndjson'}, 'body': lines()})
+    server = PooledHTTPServer(('127.0.0.1', 0), index.handler, WORKERS)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        with socket.create_connection(server.server_address, timeout=3) as sock:
+            sock.sendall(b'POST /word/search HTTP/1.1\r\nHost: x\r\nConnection: close\r\n\r\n')
+            data = b''
+            while chunk := sock.recv(4096):
+                data += chunk
+    finally:
+        server.graceful_shutdown()
+
+    head, _, body = data.decode().partition('\r\n\r\n')
+    assert 'Trailer: Server-Timing' in head
+    assert 'Server-Timing:' not in head
+    # замер включает этапы, выполненные при отдаче тела, и уходит трейлером после последней части
+    timing = re.search(r'0\r\nServer-Timing: (.*)\r\n\r\n$', body).group(1)
+    assert float(re.search(r'score;dur=([\d.]+)', timing).group(1)) >= 150
+    assert float(re.search(r'total;dur=([\d.]+)', timing).group(1)) >= 150
@@ -0,0 +1,74 @@
+import io
+import os
+import shutil
+
+import numpy as np
+import pytest
+
+import snapshot
+from row_table import RowTable
+from snapshot import load_snapshot, save_snapshot
+
+
+class DirectoryS3:
+    """
+    Клиент S3 поверх локального каталога: ключ bucket/prefix/table/name — файл remote/prefix/table/name
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        self.downloads = 0
+        self.fail_on = None
+
+    def get_object(self, Bucket: str, Key: str) -> dict:
+        with open(os.path.join(self.root, Key), 'rb') as f:
+            return {'Body': io.BytesIO(f.read())}
+
+    def download_file(self, bucket: str, key: str, filename: str) -> None:
+        if key.endswith(self.fail_on or '\0'):
+            raise ConnectionError('обрыв загрузки')
+        self.downloads += 1
+        shutil.copyfile(os.path.join(self.root, key), filename)
+
+
+@pytest.fixture
+def s3(monkeypatch, tmp_path):
+    client = DirectoryS3(str(tmp_path / 'remote'))
+    monkeypatch.setattr(snapshot, '_s3_client', lambda: client)
+    monkeypatch.setattr(snapshot, 'SNAPSHOT_CACHE_DIR', str(tmp_path / 'cache'))
+    return client
+
+
+def publish(s3: DirectoryS3, version: int, rows: int) -> None:
+    data = RowTable.from_columns({'id': [f'id-{i}' for i in range(rows)], 'word': [f'слово{i}' for i in range(rows)]})
+    save_snapshot(os.path.join(s3.root, 'prefix'), 'words', 'model', version, ('id', 'word'), data,
+                  np.ones((rows, 4), dtype=np.float32))
+
+
+def test_cached_snapshot_is_reused_until_remote_changes(s3):
+    publish(s3, version=1, rows=3)
+    assert load_snapshot('s3://bucket/prefix', 'words', 'model')[2] == 1
+    assert load_snapshot('s3://bucket/prefix', 'words', 'model')[2] == 1
+    assert s3.downloads == 2
+
+    publish(s3, version=2, rows=5)
+    rows, vectors, version = load_snapshot('s3://bucket/prefix', 'words', 'model')
+
+    assert version == 2
+    assert len(rows['id']) == 5
+    assert vectors.shape == (5, 4)
+    assert s3.downloads == 4
+
+
+def test_interrupted_download_keeps_previous_snapshot(s3, tmp_path):
+    publish(s3, version=1, rows=3)
+    load_snapshot('s3://bucket/prefix', 'words', 'model')
+
+    publish(s3, version=2, rows=5)
+    s3.fail_on = 'rows.json'
+    # открывается прежний снимок целиком, недостающее догрузится из YDB; временных каталогов не осталось
+    assert load_snapshot('s3://bucket/prefix', 'words', 'model')[2] == 1
+    assert os.listdir(tmp_path / 'cache') == ['words']
+
+    s3.fail_on = None
+    assert load_snapshot('s3://bucket/prefix', 'words', 'model')[2] == 2
@@ -0,0 +1,56 @@
+import os
+
+import numpy as np
+import pytest
+
+import vector_store
+from vector_store import FullPrecision, VectorStore
+
+
+def test_full_precision_rows_after_load(monkeypatch, tmp_path):
+    monkeypatch.setattr(vector_store, 'VECTOR_SPILL_DIR', str(tmp_path / 'spill'))
+    rng = np.random.default_rng(0)
+    snapshot = rng.random((100, 8), dtype=np.float32)
+    np.save(tmp_path / 'vectors.npy', snapshot)
+    full = FullPrecision(np.load(tmp_path / 'vectors.npy', mmap_mode='r'), 'words')
+    expected = snapshot.copy()
+
+    for position in range(100, 150):
+        vector = rng.random(8, dtype=np.float32)
+        full.set(position, vector)
+        expected = np.vstack([expected, vector])
+    for position in (3, 120):
+        expected[position] = rng.random(8, dtype=np.float32)
+        full.set(position, expected[position])
+
+    indices = rng.integers(0, 150, 64)
+    assert np.array_equal(full.rows(indices), expected[indices])
+    # замена строки снимка пишется в свою копию, сам снимок не меняется
+    assert np.array_equal(np.load(tmp_path / 'vectors.npy'), snapshot)
+
+
+def test_full_precision_without_matrix():
+    full = FullPrecision()
+    vectors = np.eye(4, dtype=np.float32)
+    for position, vector in enumerate(vectors):
+        full.set(position, vector)
+
+    assert full.dim == 4
+    assert np.array_equal(full.rows([2, 0]), vectors[[2, 0]])
+
+
+def test_spill_files_are_private_and_released(monkeypatch, tmp_path):
+    monkeypatch.setattr(vector_store, 'VECTOR_SPILL_DIR', str(tmp_path))
+    matrix = np.ones((10, 4), dtype=np.float32)
+    first = FullPrecision(vector_store.spill(matrix, 'words'), 'words')
+    second = FullPrecision(vector_store.spill(matrix, 'words'), 'words')
+    assert len(os.listdir(tmp_path)) == 2
+
+    first.release()
+    assert len(os.listdir(tmp_path)) == 1
+    assert np.array_equal(second.rows([0, 9]), matrix[[0, 9]])
+
+
+def test_float16_is_rejected():
+    with pytest.raises(ValueError):
+        VectorStore(4, dtype='float16')